@@ -17,18 +17,18 @@
 
 import collections
 import hashlib
-import json
 import zlib
 
 from rest_framework import serializers
 
 from ara.api import models
+from ara.utils import json
 
 # Constants used for defaults which rely on compression so we don't need to
 # reproduce this code elsewhere.
-EMPTY_DICT = zlib.compress(json.dumps({}).encode("utf8"))
-EMPTY_LIST = zlib.compress(json.dumps([]).encode("utf8"))
-EMPTY_STRING = zlib.compress(json.dumps("").encode("utf8"))
+EMPTY_DICT = zlib.compress(json.dumps({}))
+EMPTY_LIST = zlib.compress(json.dumps([]))
+EMPTY_STRING = zlib.compress(json.dumps(""))
 
 
 class CompressedTextField(serializers.CharField):
@@ -52,10 +52,10 @@ class CompressedObjectField(serializers.JSONField):
     """
 
     def to_representation(self, obj):
-        return json.loads(zlib.decompress(obj).decode("utf8"))
+        return json.loads(zlib.decompress(obj))
 
     def to_internal_value(self, data):
-        return zlib.compress(json.dumps(data).encode("utf8"))
+        return zlib.compress(json.dumps(data))
 
 
 class FileContentField(serializers.CharField):
@@ -76,6 +76,90 @@ class FileContentField(serializers.CharField):
         return content_file
 
 
+class ContentField(serializers.JSONField):
+    """
+    Serializes/compresses an object (i.e, list, dict) and stores it once in the
+    content table, no matter how many times it is received.
+    Contents that aren't stored yet are returned unsaved so that they are only
+    saved along with the objects that reference them, see serializers.save_contents.
+    Decompresses/deserializes an object before serving it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(ContentField, self).__init__(*args, **kwargs)
+        # Contents already looked up through this field, i.e. for the other results of a bulk request
+        self.contents = {}
+
+    def get_default(self):
+        # The default is an object, like the data received by the field, so it must be stored as well
+        return self.to_internal_value(super(ContentField, self).get_default())
+
+    def to_representation(self, obj):
+        return json.loads(zlib.decompress(obj.contents))
+
+    def to_internal_value(self, data):
+        contents = json.dumps(data)
+        sha1 = hashlib.sha1(contents).hexdigest()
+        if sha1 not in self.contents:
+            try:
+                self.contents[sha1] = models.Content.objects.get(sha1=sha1)
+            except models.Content.DoesNotExist:
+                # Only compress contents we don't already have
+                self.contents[sha1] = models.Content(sha1=sha1, contents=zlib.compress(contents))
+        return self.contents[sha1]
+
+
+class ContentSha1Field(serializers.CharField):
+    """
+    Refers to a content that is already stored by its sha1 so that it doesn't
+    need to be sent again.
+    The field is ignored if there is no content with this sha1.
+    Contents are models.Content (facts) unless another model, like models.FileContent, is given.
+    """
+
+    def __init__(self, model=None, **kwargs):
+        self.model = model or models.Content
+        super().__init__(**kwargs)
+
+    def to_representation(self, obj):
+        return obj.sha1
+
+    def to_internal_value(self, data):
+        try:
+            return self.model.objects.get(sha1=data)
+        except self.model.DoesNotExist:
+            raise serializers.SkipField()
+
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    A PrimaryKeyRelatedField that looks objects up in those retrieved beforehand for a whole list
+    of objects, with a single query, instead of with a query for each object.
+    See serializers.BulkResultSerializer.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # The objects retrieved beforehand by primary key, if any
+        self.objects = None
+
+    def prefetch(self, values):
+        # Values that aren't primary keys are left for to_internal_value to refuse
+        ids = {int(value) for value in values if isinstance(value, (int, str)) and str(value).isdigit()}
+        # Only the primary keys are needed to refer to the objects
+        self.objects = self.get_queryset().only("pk").in_bulk(ids)
+
+    def to_internal_value(self, data):
+        if self.objects is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool) or not isinstance(data, (int, str)) or not str(data).isdigit():
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return self.objects[int(data)]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+
+
 class CreatableSlugRelatedField(serializers.SlugRelatedField):
     """
     A SlugRelatedField that supports get_or_create.
@@ -0,0 +1,46 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_playbook_controller'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Content',
+            fields=[
+                ('id', models.BigAutoField(editable=False, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('sha1', models.CharField(max_length=40, unique=True)),
+                ('contents', models.BinaryField(max_length=4294967295)),
+            ],
+            options={
+                'db_table': 'contents',
+            },
+        ),
+        # The content of existing results is moved to the contents table by the next migration
+        migrations.RenameField(
+            model_name='result',
+            old_name='content',
+            new_name='legacy_content',
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='legacy_content',
+            field=models.BinaryField(max_length=4294967295, null=True),
+        ),
+        migrations.AddField(
+            model_name='result',
+            name='content',
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name='results',
+                to='api.Content',
+            ),
+        ),
+    ]
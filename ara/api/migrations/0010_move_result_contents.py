@@ -0,0 +1,65 @@
+import hashlib
+import zlib
+
+from django.db import migrations
+
+from ara.utils import json
+
+
+def encode(compressed):
+    """
+    Returns legacy compressed JSON encoded like new contents by ara.utils.json, without the spaces and
+    escaped characters of the json module, so that it has the same sha1 as identical contents sent later.
+    """
+    data = zlib.decompress(compressed)
+    try:
+        return json.dumps(json.loads(data))
+    except ValueError:
+        # i.e, NaN which isn't valid JSON, keep it as it was encoded
+        return data
+
+
+def move_result_contents(apps, schema_editor):
+    """
+    Stores the content of existing results once in the contents table.
+    The sha1 is computed over the content encoded like new contents, see encode().
+    """
+    Content = apps.get_model('api', 'Content')
+    Result = apps.get_model('api', 'Result')
+
+    contents = {}
+    results = Result.objects.order_by('id').values_list('id', 'legacy_content')
+    pending = {}
+    for index, (result_id, compressed) in enumerate(results.iterator(chunk_size=1000)):
+        data = encode(compressed)
+        sha1 = hashlib.sha1(data).hexdigest()
+        if sha1 not in contents:
+            content, created = Content.objects.get_or_create(sha1=sha1, defaults={'contents': zlib.compress(data)})
+            contents[sha1] = content.id
+        pending.setdefault(contents[sha1], []).append(result_id)
+
+        # Update results in batches, one query for each distinct content
+        if (index + 1) % 1000 == 0:
+            for content_id, result_ids in pending.items():
+                Result.objects.filter(id__in=result_ids).update(content_id=content_id)
+            pending = {}
+
+    for content_id, result_ids in pending.items():
+        Result.objects.filter(id__in=result_ids).update(content_id=content_id)
+
+
+def restore_result_contents(apps, schema_editor):
+    Result = apps.get_model('api', 'Result')
+    for result in Result.objects.select_related('content').only('id', 'content__contents').iterator(chunk_size=1000):
+        Result.objects.filter(id=result.id).update(legacy_content=result.content.contents)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_content'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_result_contents, restore_result_contents),
+    ]
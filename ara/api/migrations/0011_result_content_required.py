@@ -0,0 +1,25 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_move_result_contents'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='result',
+            name='legacy_content',
+        ),
+        migrations.AlterField(
+            model_name='result',
+            name='content',
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name='results',
+                to='api.Content',
+            ),
+        ),
+    ]
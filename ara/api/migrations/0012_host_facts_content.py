@@ -0,0 +1,33 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_result_content_required'),
+    ]
+
+    operations = [
+        # The facts of existing hosts are moved to the contents table by the next migration
+        migrations.RenameField(
+            model_name='host',
+            old_name='facts',
+            new_name='legacy_facts',
+        ),
+        migrations.AlterField(
+            model_name='host',
+            name='legacy_facts',
+            field=models.BinaryField(max_length=4294967295, null=True),
+        ),
+        migrations.AddField(
+            model_name='host',
+            name='facts',
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name='hosts',
+                to='api.Content',
+            ),
+        ),
+    ]
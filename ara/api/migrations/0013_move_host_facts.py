@@ -0,0 +1,65 @@
+import hashlib
+import zlib
+
+from django.db import migrations
+
+from ara.utils import json
+
+
+def encode(compressed):
+    """
+    Returns legacy compressed JSON encoded like new contents by ara.utils.json, without the spaces and
+    escaped characters of the json module, so that it has the same sha1 as identical contents sent later.
+    """
+    data = zlib.decompress(compressed)
+    try:
+        return json.dumps(json.loads(data))
+    except ValueError:
+        # i.e, NaN which isn't valid JSON, keep it as it was encoded
+        return data
+
+
+def move_host_facts(apps, schema_editor):
+    """
+    Stores the facts of existing hosts once in the contents table.
+    The sha1 is computed over the facts encoded like new contents, see encode().
+    """
+    Content = apps.get_model('api', 'Content')
+    Host = apps.get_model('api', 'Host')
+
+    contents = {}
+    hosts = Host.objects.order_by('id').values_list('id', 'legacy_facts')
+    pending = {}
+    for index, (host_id, compressed) in enumerate(hosts.iterator(chunk_size=1000)):
+        data = encode(compressed)
+        sha1 = hashlib.sha1(data).hexdigest()
+        if sha1 not in contents:
+            content, created = Content.objects.get_or_create(sha1=sha1, defaults={'contents': zlib.compress(data)})
+            contents[sha1] = content.id
+        pending.setdefault(contents[sha1], []).append(host_id)
+
+        # Update hosts in batches, one query for each distinct content
+        if (index + 1) % 1000 == 0:
+            for content_id, host_ids in pending.items():
+                Host.objects.filter(id__in=host_ids).update(facts_id=content_id)
+            pending = {}
+
+    for content_id, host_ids in pending.items():
+        Host.objects.filter(id__in=host_ids).update(facts_id=content_id)
+
+
+def restore_host_facts(apps, schema_editor):
+    Host = apps.get_model('api', 'Host')
+    for host in Host.objects.select_related('facts').only('id', 'facts__contents').iterator(chunk_size=1000):
+        Host.objects.filter(id=host.id).update(legacy_facts=host.facts.contents)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_host_facts_content'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_host_facts, restore_host_facts),
+    ]
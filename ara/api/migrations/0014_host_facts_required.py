@@ -0,0 +1,25 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_move_host_facts'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='host',
+            name='legacy_facts',
+        ),
+        migrations.AlterField(
+            model_name='host',
+            name='facts',
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name='hosts',
+                to='api.Content',
+            ),
+        ),
+    ]
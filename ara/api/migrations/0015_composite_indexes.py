@@ -0,0 +1,47 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_host_facts_required'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='play',
+            index=models.Index(fields=['status', 'updated'], name='plays_status_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playbook',
+            index=models.Index(fields=['started'], name='playbooks_started_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playbook',
+            index=models.Index(fields=['status', 'updated'], name='playbooks_status_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['playbook', 'status'], name='results_playbook_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['playbook', 'started'], name='results_playbook_started_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['host', 'started'], name='results_host_started_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['task', 'status'], name='results_task_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'updated'], name='tasks_status_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['playbook', 'status'], name='tasks_playbook_status_idx'),
+        ),
+    ]
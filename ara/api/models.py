@@ -15,7 +15,8 @@
 #  You should have received a copy of the GNU General Public License
 #  along with ARA.  If not, see <http://www.gnu.org/licenses/>.
 
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 
@@ -44,13 +45,39 @@ class Duration(Base):
     ended = models.DateTimeField(blank=True, null=True)
     duration = models.DurationField(blank=True, null=True)
 
-    def save(self, *args, **kwargs):
+    def compute_duration(self):
         # Compute duration based on available timestamps
         if self.ended is not None:
             self.duration = self.ended - self.started
+
+    def save(self, *args, **kwargs):
+        self.compute_duration()
         return super(Duration, self).save(*args, **kwargs)
 
 
+class ItemCountQuerySet(models.QuerySet):
+    """
+    QuerySet for models that report how many objects of other types are related to them.
+    """
+
+    ITEMS = ["plays", "tasks", "results", "hosts", "files", "records"]
+
+    def with_item_counts(self):
+        """
+        Annotates each object with <item>_count, i.e. plays_count, computed by a subquery for each
+        relation so that a page of objects is counted in the same query that retrieves it.
+        """
+        counts = {}
+        for item in self.ITEMS:
+            if not hasattr(self.model, item):
+                continue
+            relation = self.model._meta.get_field(item)
+            related = relation.related_model.objects.filter(**{relation.field.name: models.OuterRef("pk")})
+            count = related.order_by().values(relation.field.name).annotate(count=models.Count("pk")).values("count")
+            counts["%s_count" % item] = Coalesce(models.Subquery(count, output_field=models.IntegerField()), 0)
+        return self.annotate(**counts)
+
+
 class Label(Base):
     """
     A label is a generic container meant to group or correlate different
@@ -81,6 +108,11 @@ class Playbook(Duration):
 
     class Meta:
         db_table = "playbooks"
+        indexes = [
+            # ara playbook list/prune, ara expire
+            models.Index(fields=["started"], name="playbooks_started_idx"),
+            models.Index(fields=["status", "updated"], name="playbooks_status_updated_idx"),
+        ]
 
     # A playbook in ARA can be running (in progress), completed (succeeded) or failed.
     UNKNOWN = "unknown"
@@ -104,6 +136,8 @@ class Playbook(Duration):
     labels = models.ManyToManyField(Label)
     controller = models.CharField(max_length=255, default="localhost")
 
+    objects = ItemCountQuerySet.as_manager()
+
     def __str__(self):
         return "<Playbook %s>" % self.id
 
@@ -125,6 +159,81 @@ class FileContent(Base):
         return "<FileContent %s:%s>" % (self.id, self.sha1)
 
 
+class ContentQuerySet(models.QuerySet):
+    """
+    QuerySet for contents, which are shared and therefore not deleted along with the objects that reference them.
+    """
+
+    def referenced_by(self, instance):
+        """
+        Returns the ids of the contents referenced by a result or by the results of a playbook,
+        play, task, file or host as well as by the hosts of a playbook or a host.
+        """
+        if isinstance(instance, Result):
+            return {instance.content_id}
+
+        if isinstance(instance, File):
+            # Results refer to the file of their task through the task
+            results = Result.objects.filter(task__file=instance).order_by()
+        else:
+            results = Result.objects.filter(**{instance._meta.model_name: instance}).order_by()
+        ids = set(results.values_list("content_id", flat=True).distinct())
+        if isinstance(instance, Host):
+            ids.add(instance.facts_id)
+        elif isinstance(instance, Playbook):
+            ids.update(instance.hosts.order_by().values_list("facts_id", flat=True).distinct())
+        return ids
+
+    def delete_orphans(self, ids, batch_size=500):
+        """
+        Deletes the contents among the given ids that are no longer referenced by results or hosts,
+        i.e. once the objects returned by referenced_by() have been deleted.
+        Contents that were referenced again in the meantime (i.e, by a result being created
+        concurrently) are protected and skipped.
+        Returns the number of contents deleted.
+        """
+        ids = sorted(ids)
+        deleted = 0
+        for index in range(0, len(ids), batch_size):
+            end = index + batch_size
+            try:
+                deleted += self._delete_orphans(ids[index:end])
+            except (models.ProtectedError, IntegrityError):
+                # Find out which contents were referenced again by deleting them one at a time
+                for content_id in ids[index:end]:
+                    try:
+                        deleted += self._delete_orphans([content_id])
+                    except (models.ProtectedError, IntegrityError):
+                        continue
+        return deleted
+
+    def _delete_orphans(self, ids):
+        # The contents are deleted in a savepoint so that a failure doesn't roll back the whole transaction
+        with transaction.atomic():
+            orphans = self.filter(id__in=ids, results__isnull=True, hosts__isnull=True)
+            # Only retrieve the ids, there is no need for the contents to delete them
+            return orphans.only("id").delete()[1].get(self.model._meta.label, 0)
+
+
+class Content(Base):
+    """
+    A uniquely stored and compressed object, such as the content of a result
+    or the facts of a host.
+    Results that have the same content (i.e, the same task skipped on many
+    hosts) and hosts that have the same facts reference the same content.
+    """
+
+    class Meta:
+        db_table = "contents"
+
+    sha1 = models.CharField(max_length=40, unique=True)
+    contents = models.BinaryField(max_length=(2 ** 32) - 1)
+    objects = ContentQuerySet.as_manager()
+
+    def __str__(self):
+        return "<Content %s:%s>" % (self.id, self.sha1)
+
+
 class File(Base):
     """
     Data about Ansible files (playbooks, tasks, role files, var files, etc).
@@ -170,6 +279,10 @@ class Play(Duration):
 
     class Meta:
         db_table = "plays"
+        indexes = [
+            # ara expire
+            models.Index(fields=["status", "updated"], name="plays_status_updated_idx"),
+        ]
 
     # A play in ARA can be running (in progress) or completed (regardless of success or failure)
     UNKNOWN = "unknown"
@@ -183,6 +296,8 @@ class Play(Duration):
     status = models.CharField(max_length=25, choices=STATUS, default=UNKNOWN)
     playbook = models.ForeignKey(Playbook, on_delete=models.CASCADE, related_name="plays")
 
+    objects = ItemCountQuerySet.as_manager()
+
     def __str__(self):
         return "<Play %s:%s>" % (self.id, self.name)
 
@@ -192,6 +307,11 @@ class Task(Duration):
 
     class Meta:
         db_table = "tasks"
+        indexes = [
+            # ara expire, tasks of a playbook by status
+            models.Index(fields=["status", "updated"], name="tasks_status_updated_idx"),
+            models.Index(fields=["playbook", "status"], name="tasks_playbook_status_idx"),
+        ]
 
     # A task in ARA can be running (in progress) or completed (regardless of success or failure)
     # Actual task statuses (such as failed, skipped, etc.) are actually in the Results table.
@@ -212,6 +332,8 @@ class Task(Duration):
     file = models.ForeignKey(File, on_delete=models.CASCADE, related_name="tasks")
     playbook = models.ForeignKey(Playbook, on_delete=models.CASCADE, related_name="tasks")
 
+    objects = ItemCountQuerySet.as_manager()
+
     def __str__(self):
         return "<Task %s:%s>" % (self.name, self.id)
 
@@ -226,7 +348,7 @@ class Host(Base):
         unique_together = ("name", "playbook")
 
     name = models.CharField(max_length=255)
-    facts = models.BinaryField(max_length=(2 ** 32) - 1)
+    facts = models.ForeignKey(Content, on_delete=models.PROTECT, related_name="hosts")
 
     changed = models.IntegerField(default=0)
     failed = models.IntegerField(default=0)
@@ -248,6 +370,13 @@ class Result(Duration):
 
     class Meta:
         db_table = "results"
+        indexes = [
+            # Results of a playbook, a host or a task by status or by date as in the playbook and host pages
+            models.Index(fields=["playbook", "status"], name="results_playbook_status_idx"),
+            models.Index(fields=["playbook", "started"], name="results_playbook_started_idx"),
+            models.Index(fields=["host", "started"], name="results_host_started_idx"),
+            models.Index(fields=["task", "status"], name="results_task_status_idx"),
+        ]
 
     # Ansible statuses
     OK = "ok"
@@ -271,8 +400,7 @@ class Result(Duration):
     changed = models.BooleanField(default=False)
     ignore_errors = models.BooleanField(default=False)
 
-    # todo use a single Content table
-    content = models.BinaryField(max_length=(2 ** 32) - 1)
+    content = models.ForeignKey(Content, on_delete=models.PROTECT, related_name="results")
     host = models.ForeignKey(Host, on_delete=models.CASCADE, related_name="results")
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="results")
     play = models.ForeignKey(Play, on_delete=models.CASCADE, related_name="results")
@@ -0,0 +1,110 @@
+# Copyright (c) 2020 The ARA Records Ansible authors
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from collections import OrderedDict
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+# Orderings that can be used with cursors, the id breaks ties between objects that started at the same time
+CURSOR_ORDERINGS = {
+    "-id": ("-id",),
+    "id": ("id",),
+    "-started": ("-started", "-id"),
+    "started": ("started", "id"),
+}
+
+
+def with_count(request, count_query_param="count"):
+    """
+    The total number of objects is counted unless ?count=false is given.
+    Counting is a full scan of the matching rows which can take longer than retrieving the page itself.
+    """
+    return request.query_params.get(count_query_param, "true").lower() not in ["false", "0", "no"]
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Paginates by position rather than by offset: a page is retrieved with a
+    "WHERE id < <last id of the previous page>" instead of skipping over the
+    objects of the previous pages so that a page deep in a large table is
+    as fast to retrieve as the first one.
+    The next and previous links are opaque cursors that stay valid as objects are created.
+    """
+
+    page_size_query_param = "limit"
+    ordering = "-id"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = queryset.count() if with_count(request) else None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        order = request.query_params.get("order")
+        if order is None:
+            return (self.ordering,)
+
+        fields = [field.name for field in queryset.model._meta.get_fields()]
+        if order not in CURSOR_ORDERINGS or order.lstrip("-") not in fields:
+            orderings = [ordering for ordering in CURSOR_ORDERINGS if ordering.lstrip("-") in fields]
+            raise ValidationError({"order": "Cursors can only be ordered by %s" % ", ".join(orderings)})
+        return CURSOR_ORDERINGS[order]
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("count", self.count),
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+
+class LimitOffsetOrKeysetPagination(LimitOffsetPagination):
+    """
+    Paginates with limit and offset by default and with cursors when the
+    cursor argument is given, ?cursor= for the first page. See KeysetPagination.
+    With ?count=false, the total number of objects isn't counted and is returned as null.
+    """
+
+    cursor_query_param = "cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+
+        if with_count(request):
+            return super().paginate_queryset(queryset, request, view)
+
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        self.request = request
+        self.count = None
+
+        # Retrieve one more object than requested to find out if there is a next page without counting
+        results = list(queryset[self.offset : self.offset + self.limit + 1])
+        self.has_next = len(results) > self.limit
+        return results[: self.limit]
+
+    def get_next_link(self):
+        if self.count is not None:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
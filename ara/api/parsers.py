@@ -0,0 +1,22 @@
+# Copyright (c) 2020 The ARA Records Ansible authors
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+from ara.api.renderers import JSONRenderer
+from ara.utils import json
+
+
+class JSONParser(parsers.JSONParser):
+    """
+    Parses JSON with the JSON backend of ara, see ara.utils.json.
+    """
+
+    renderer_class = JSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return json.loads(stream.read())
+        except ValueError as e:
+            raise ParseError("JSON parse error - %s" % str(e))
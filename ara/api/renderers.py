@@ -0,0 +1,23 @@
+# Copyright (c) 2020 The ARA Records Ansible authors
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from rest_framework import renderers
+
+from ara.utils import json
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """
+    Renders JSON with the JSON backend of ara, see ara.utils.json.
+    Responses are compact unless they are rendered with an indentation (i.e, for the browsable API)
+    and they are encoded as UTF-8 instead of escaping non-ASCII characters.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        data = json.dumps(data, default=self.encoder_class().default, indent=bool(indent))
+        # Like DRF, escape \u2028 and \u2029 to ensure we output JSON that is a strict javascript subset
+        return data.replace("\u2028".encode("utf8"), b"\\u2028").replace("\u2029".encode("utf8"), b"\\u2029")
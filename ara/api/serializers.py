@@ -15,6 +15,9 @@
 #  You should have received a copy of the GNU General Public License
 #  along with ARA.  If not, see <http://www.gnu.org/licenses/>.
 
+import functools
+
+from django.db import IntegrityError, models as django_models, transaction
 from rest_framework import serializers
 
 from ara.api import fields as ara_fields, models
@@ -56,8 +59,13 @@ class ItemCountSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def get_items(obj):
-        types = ["plays", "tasks", "results", "hosts", "files", "records"]
-        items = {item: getattr(obj, item).count() for item in types if hasattr(obj, item)}
+        items = {}
+        for item in models.ItemCountQuerySet.ITEMS:
+            if not hasattr(obj, item):
+                continue
+            # Objects from ItemCountQuerySet.with_item_counts() are already counted, others are counted one by one
+            count = getattr(obj, "%s_count" % item, None)
+            items[item] = count if count is not None else getattr(obj, item).count()
         return items
 
 
@@ -165,7 +173,7 @@ class DetailedHostSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
     playbook = SimplePlaybookSerializer(read_only=True)
-    facts = ara_fields.CompressedObjectField(read_only=True)
+    facts = ara_fields.ContentField(read_only=True)
 
 
 class DetailedResultSerializer(ResultStatusSerializer):
@@ -177,7 +185,7 @@ class DetailedResultSerializer(ResultStatusSerializer):
     play = SimplePlaySerializer(read_only=True)
     task = SimpleTaskSerializer(read_only=True)
     host = SimpleHostSerializer(read_only=True)
-    content = ara_fields.CompressedObjectField(read_only=True)
+    content = ara_fields.ContentField(read_only=True)
 
 
 class DetailedFileSerializer(FileSha1Serializer):
@@ -308,12 +316,73 @@ class TaskSerializer(serializers.ModelSerializer):
     tags = ara_fields.CompressedObjectField(default=ara_fields.EMPTY_LIST, help_text="A list containing Ansible tags")
 
 
-class HostSerializer(serializers.ModelSerializer):
+def save_content(content):
+    """
+    Saves a content that ContentField returned unsaved, unless it has been stored concurrently.
+    """
+    if content.pk is not None:
+        return content
+    try:
+        with transaction.atomic():
+            return models.Content.objects.create(sha1=content.sha1, contents=content.contents)
+    except IntegrityError:
+        return models.Content.objects.get(sha1=content.sha1)
+
+
+def save_contents(validated_data):
+    """
+    Saves the contents that ContentFields returned unsaved in a list of validated data.
+    This is done when the objects that reference the contents are saved, in the same
+    transaction, so that requests that fail don't leave contents behind.
+    """
+    saved = {}
+    for data in validated_data:
+        for key, value in data.items():
+            if isinstance(value, models.Content) and value.pk is None:
+                if value.sha1 not in saved:
+                    saved[value.sha1] = save_content(value)
+                data[key] = saved[value.sha1]
+
+
+class ContentSerializerMixin(object):
+    """
+    Saves the contents of the ContentFields of a serializer with the object, see save_contents.
+    Contents that are replaced by an update, i.e. the empty facts of a host once its facts are
+    sent, are deleted if nothing else references them.
+    """
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            save_contents([validated_data])
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        replaced = {
+            getattr(instance, "%s_id" % name)
+            for name, value in validated_data.items()
+            if isinstance(value, models.Content) and getattr(instance, "%s_id" % name) != value.pk
+        }
+        with transaction.atomic():
+            save_contents([validated_data])
+            instance = super().update(instance, validated_data)
+            models.Content.objects.delete_orphans(replaced)
+        return instance
+
+
+class HostSerializer(ContentSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = models.Host
         fields = "__all__"
 
-    facts = ara_fields.CompressedObjectField(default=ara_fields.EMPTY_DICT)
+    facts = ara_fields.ContentField(default=dict)
+    facts_sha1 = ara_fields.ContentSha1Field(
+        source="facts",
+        required=False,
+        help_text=(
+            "sha1 of facts the server already has, the response includes the sha1 of the facts of the host "
+            "but not the facts themselves"
+        ),
+    )
 
     def get_unique_together_validators(self):
         """
@@ -324,19 +393,135 @@ class HostSerializer(serializers.ModelSerializer):
         """
         return []
 
+    def to_representation(self, instance):
+        # Facts referred to by their sha1 are left out of the response: the client has them and is
+        # only interested in whether the sha1 was found.
+        initial_data = getattr(self, "initial_data", {})
+        if "facts_sha1" in initial_data and "facts" not in initial_data:
+            self.fields.pop("facts", None)
+        return super().to_representation(instance)
+
     def create(self, validated_data):
-        host, created = models.Host.objects.get_or_create(
-            name=validated_data["name"], playbook=validated_data["playbook"], defaults=validated_data
-        )
+        with transaction.atomic():
+            save_contents([validated_data])
+            host, created = models.Host.objects.get_or_create(
+                name=validated_data["name"], playbook=validated_data["playbook"], defaults=validated_data
+            )
         return host
 
 
-class ResultSerializer(serializers.ModelSerializer):
+def get_or_create_hosts(playbook, names):
+    """
+    Gets or creates the hosts of a playbook by name with a single bulk insert.
+    Returns the hosts by name.
+    """
+    names = set(names)
+    existing = set(models.Host.objects.filter(playbook=playbook, name__in=names).values_list("name", flat=True))
+    if names - existing:
+        facts = save_content(ara_fields.ContentField().to_internal_value({}))
+        hosts = [models.Host(name=name, playbook=playbook, facts=facts) for name in sorted(names - existing)]
+        # Hosts created concurrently, i.e. by a result, are kept as-is
+        models.Host.objects.bulk_create(hosts, ignore_conflicts=True)
+    return {host.name: host for host in models.Host.objects.filter(playbook=playbook, name__in=names)}
+
+
+class BulkHostSerializer(serializers.Serializer):
+    """
+    Gets or creates the hosts of a playbook by name in a single bulk insert and
+    returns their ids, i.e. for the hosts of a play when it starts.
+    """
+
+    playbook = serializers.PrimaryKeyRelatedField(queryset=models.Playbook.objects.all())
+    hosts = serializers.ListField(child=serializers.CharField(max_length=255), help_text="A list of host names")
+
+    def create(self, validated_data):
+        hosts = get_or_create_hosts(validated_data["playbook"], validated_data["hosts"])
+        return {name: host.id for name, host in hosts.items()}
+
+
+class FileContentSha1Serializer(serializers.Serializer):
+    """
+    Finds out which of the given file content sha1s are already stored so that
+    the contents of files that didn't change aren't sent again.
+    """
+
+    sha1 = serializers.ListField(child=serializers.CharField(max_length=40), help_text="A list of sha1s")
+
+    def create(self, validated_data):
+        sha1s = set(validated_data["sha1"])
+        return sorted(models.FileContent.objects.filter(sha1__in=sha1s).values_list("sha1", flat=True))
+
+
+class HostStatsSerializer(serializers.Serializer):
+    """
+    Updates the statistics of the hosts of a playbook with a single bulk update,
+    i.e. at the end of the playbook.
+    """
+
+    # Ansible's stats.summarize() names the number of failures "failures"
+    STATS = dict(changed="changed", failures="failed", ok="ok", skipped="skipped", unreachable="unreachable")
+
+    playbook = serializers.PrimaryKeyRelatedField(queryset=models.Playbook.objects.all())
+    stats = serializers.DictField(
+        child=serializers.DictField(child=serializers.IntegerField(min_value=0)),
+        help_text="The statistics of each host by name, as returned by Ansible's stats.summarize()",
+    )
+
+    def create(self, validated_data):
+        stats = validated_data["stats"]
+        hosts = get_or_create_hosts(validated_data["playbook"], stats.keys())
+        for name, host in hosts.items():
+            for key, field in self.STATS.items():
+                setattr(host, field, stats[name].get(key, 0))
+
+        # The hosts are read beforehand so that the transaction starts by writing, see HostViewSet.bulk
+        with transaction.atomic():
+            models.Host.objects.bulk_update(hosts.values(), self.STATS.values())
+        return {name: host.id for name, host in hosts.items()}
+
+
+class BulkResultSerializer(serializers.ListSerializer):
+    """
+    Creates many results at once with a single bulk insert instead of saving
+    them one at a time. The playbooks, plays, tasks and hosts of the results
+    are retrieved with a query for each model rather than for each result.
+    """
+
+    def to_internal_value(self, data):
+        items = [item for item in data if isinstance(item, dict)] if isinstance(data, list) else []
+        prefetched = [
+            (name, field)
+            for name, field in self.child.fields.items()
+            if isinstance(field, ara_fields.PrefetchedPrimaryKeyRelatedField)
+        ]
+        for name, field in prefetched:
+            field.prefetch(item.get(name) for item in items)
+        try:
+            return super().to_internal_value(data)
+        finally:
+            for name, field in prefetched:
+                field.objects = None
+
+    def create(self, validated_data):
+        save_contents(validated_data)
+        results = [models.Result(**attrs) for attrs in validated_data]
+        # bulk_create doesn't call save() so durations need to be computed here
+        for result in results:
+            result.compute_duration()
+        return models.Result.objects.bulk_create(results)
+
+
+class ResultSerializer(ContentSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = models.Result
         fields = "__all__"
+        list_serializer_class = BulkResultSerializer
 
-    content = ara_fields.CompressedObjectField(default=ara_fields.EMPTY_DICT)
+    content = ara_fields.ContentField(default=dict)
+    playbook = ara_fields.PrefetchedPrimaryKeyRelatedField(queryset=models.Playbook.objects.all())
+    play = ara_fields.PrefetchedPrimaryKeyRelatedField(queryset=models.Play.objects.all())
+    task = ara_fields.PrefetchedPrimaryKeyRelatedField(queryset=models.Task.objects.all())
+    host = ara_fields.PrefetchedPrimaryKeyRelatedField(queryset=models.Host.objects.all())
 
 
 class FileSerializer(FileSha1Serializer):
@@ -344,7 +529,20 @@ class FileSerializer(FileSha1Serializer):
         model = models.File
         fields = "__all__"
 
-    content = ara_fields.FileContentField()
+    content = ara_fields.FileContentField(required=False)
+    content_sha1 = ara_fields.ContentSha1Field(
+        model=models.FileContent,
+        source="content",
+        required=False,
+        write_only=True,
+        help_text="sha1 of a file content the server already has, instead of sending the content",
+    )
+
+    def validate(self, data):
+        # content_sha1 is ignored when the server doesn't have it, the content must be sent then
+        if not self.partial and "content" not in data:
+            raise serializers.ValidationError({"content": "This field is required."})
+        return data
 
     def get_unique_together_validators(self):
         """
@@ -373,3 +571,84 @@ class RecordSerializer(serializers.ModelSerializer):
     value = ara_fields.CompressedObjectField(
         default=ara_fields.EMPTY_STRING, help_text="A string, list, dict, json or other formatted data"
     )
+
+
+@functools.lru_cache(maxsize=None)
+def serializer_fields(serializer_class):
+    """
+    Returns the fields of a serializer with the model attribute each of them reads,
+    i.e. {"content": "content", "sha1": "*", ...} for DetailedFileSerializer.
+    """
+    return {name: field.source.split(".")[0] for name, field in serializer_class().fields.items()}
+
+
+def requested_fields(serializer_class, fields=None, exclude=None, expand=None):
+    """
+    Returns the names of the fields of a serializer that are selected by a list of fields to return and/or
+    a list of fields to leave out, or None if every field is returned. Expanded fields are always returned.
+    """
+    if not fields and not exclude:
+        return None
+    names = set(serializer_fields(serializer_class))
+    if fields:
+        names &= set(fields)
+    names -= set(exclude or [])
+    return names | set(expand or [])
+
+
+def select_fields(serializer, fields=None, expand=None):
+    """
+    Keeps only the given fields of a serializer, or of each object of a list serializer, and
+    embeds the related objects to expand, given as {name: serializer_class}, instead of their id.
+    """
+    target = getattr(serializer, "child", serializer)
+    for name, serializer_class in (expand or {}).items():
+        target.fields[name] = serializer_class(read_only=True)
+    if fields is not None:
+        for name in list(target.fields):
+            if name not in fields:
+                target.fields.pop(name)
+    return serializer
+
+
+def optimize_queryset(queryset, serializer_class, fields=None, expand=None):
+    """
+    Adapts a queryset to what a serializer returns of its objects, or to the given subset of its fields:
+    - compressed columns that aren't returned (i.e, Record.value for ListRecordSerializer) are deferred so
+      they aren't read from the database only to be discarded
+    - compressed contents that are returned (i.e, Result.content) are joined rather than queried one by one
+    - items are counted, labels, files and the sha1 of file contents are retrieved for every object at once
+    - related objects to expand, given as {name: serializer_class}, are retrieved with a query for each
+      relation, optimized for their own serializer
+    """
+    model = queryset.model
+    if getattr(getattr(serializer_class, "Meta", None), "model", None) is not model:
+        return queryset
+
+    all_fields = serializer_fields(serializer_class)
+    names = set(all_fields) if fields is None else set(fields) & set(all_fields)
+    sources = {all_fields[name] for name in names}
+
+    deferred = []
+    for field in model._meta.concrete_fields:
+        if isinstance(field, django_models.BinaryField) and field.name not in sources:
+            deferred.append(field.name)
+        elif field.is_relation and field.name in sources and hasattr(field.related_model, "contents"):
+            queryset = queryset.select_related(field.name)
+
+    if "items" in names and issubclass(serializer_class, ItemCountSerializer):
+        queryset = queryset.with_item_counts()
+    if "labels" in names and model is models.Playbook:
+        queryset = queryset.prefetch_related("labels")
+    if "path" in names and issubclass(serializer_class, TaskPathSerializer):
+        queryset = queryset.select_related("file")
+    if "sha1" in names and issubclass(serializer_class, FileSha1Serializer) and "content" not in sources:
+        queryset = queryset.select_related("content")
+        deferred.append("content__contents")
+
+    for name, expanded in (expand or {}).items():
+        related = model._meta.get_field(name).related_model
+        related_queryset = optimize_queryset(related.objects.all(), expanded)
+        queryset = queryset.prefetch_related(django_models.Prefetch(name, queryset=related_queryset))
+
+    return queryset.defer(*deferred) if deferred else queryset
@@ -27,6 +27,7 @@ except ImportError:
 
 from ara.api import models
 from ara.api.tests import utils
+from ara.utils import json
 
 logging.getLogger("factory").setLevel(logging.INFO)
 
@@ -60,6 +61,15 @@ class FileContentFactory(DjangoModelFactory):
     contents = utils.compressed_str(FILE_CONTENTS)
 
 
+class ContentFactory(DjangoModelFactory):
+    class Meta:
+        model = models.Content
+        django_get_or_create = ("sha1",)
+
+    sha1 = utils.sha1(json.dumps(RESULT_CONTENTS))
+    contents = utils.compressed_obj(RESULT_CONTENTS)
+
+
 class FileFactory(DjangoModelFactory):
     class Meta:
         model = models.File
@@ -105,7 +115,9 @@ class HostFactory(DjangoModelFactory):
     class Meta:
         model = models.Host
 
-    facts = utils.compressed_obj(HOST_FACTS)
+    facts = factory.SubFactory(
+        ContentFactory, sha1=utils.sha1(json.dumps(HOST_FACTS)), contents=utils.compressed_obj(HOST_FACTS)
+    )
     name = "hostname"
     playbook = factory.SubFactory(PlaybookFactory)
     changed = 0
@@ -119,7 +131,7 @@ class ResultFactory(DjangoModelFactory):
     class Meta:
         model = models.Result
 
-    content = utils.compressed_obj(RESULT_CONTENTS)
+    content = factory.SubFactory(ContentFactory)
     status = "ok"
     host = factory.SubFactory(HostFactory)
     task = factory.SubFactory(TaskFactory)
@@ -0,0 +1,226 @@
+#  Copyright (c) 2020 Red Hat, Inc.
+#
+#  This file is part of ARA Records Ansible.
+#
+#  ARA is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  ARA is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with ARA.  If not, see <http://www.gnu.org/licenses/>.
+
+import copy
+import importlib.util
+import json as stdlib_json
+import os
+import unittest
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ara.clients.utils import RawJSON
+from ara.setup import callback_plugins
+from ara.utils import json
+
+# The callback plugin is not part of a package and needs Ansible, which the server doesn't
+try:
+    from ansible.parsing.ajson import AnsibleJSONEncoder
+    from ansible.utils.unsafe_proxy import AnsibleUnsafeBytes, AnsibleUnsafeText
+    from ansible.vars.clean import module_response_deepcopy, strip_internal_keys
+except ImportError:
+    ara_default = None
+else:
+    spec = importlib.util.spec_from_file_location("ara_default", os.path.join(callback_plugins, "ara_default.py"))
+    ara_default = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(ara_default)
+
+
+def legacy_sanitize_result(result, ignored_facts=()):
+    # How results were serialized before sanitize_result: a copy without the internal keys,
+    # the ignored facts replaced and a round-trip through JSON to convert Ansible types
+    results = strip_internal_keys(module_response_deepcopy(result))
+    if "ansible_facts" in results:
+        for fact in ignored_facts:
+            if fact in results["ansible_facts"]:
+                results["ansible_facts"][fact] = ara_default.IGNORED_FACT
+    try:
+        jsonified = stdlib_json.dumps(results, cls=AnsibleJSONEncoder, ensure_ascii=False, sort_keys=True)
+    except TypeError:
+        jsonified = stdlib_json.dumps(results, cls=AnsibleJSONEncoder, ensure_ascii=False, sort_keys=False)
+    return json.loads(jsonified)
+
+
+@unittest.skipIf(ara_default is None, "Ansible is not installed")
+class SanitizeResultTestCase(SimpleTestCase):
+    def assertSanitized(self, result, ignored_facts=()):
+        expected = legacy_sanitize_result(result, ignored_facts)
+        sanitized = ara_default.sanitize_result(result, ignored_facts)
+        # Keys are sorted already so the JSON is the same without sort_keys
+        self.assertEqual(json.dumps(expected, sort_keys=True), json.dumps(sanitized))
+        return sanitized
+
+    def test_internal_keys(self):
+        result = {
+            "changed": True,
+            "_ansible_no_log": False,
+            "_ansible_verbose_always": True,
+            "invocation": {"module_args": {"_raw_params": "uptime", "_ansible_check_mode": False}},
+        }
+        sanitized = self.assertSanitized(result)
+        # Like before, the arguments of the module are kept but not the internal ones
+        self.assertEqual({"changed": True, "invocation": {"module_args": {"_raw_params": "uptime"}}}, sanitized)
+
+    def test_loop_results(self):
+        result = {
+            "changed": False,
+            "msg": "All items completed",
+            "results": [
+                {"item": item, "_ansible_item_label": item, "stdout": "ok", "nested": [{"_ansible_parsed": True}]}
+                for item in ["one", "two"]
+            ],
+        }
+        sanitized = self.assertSanitized(result)
+        self.assertEqual([{"item": "one", "nested": [{}], "stdout": "ok"}], sanitized["results"][:1])
+
+    def test_ignored_facts(self):
+        result = {
+            "ansible_facts": {"ansible_env": {"SECRET": "value"}, "ansible_hostname": "host"},
+            "ansible_env": "not a fact",
+            "_ansible_no_log": False,
+        }
+        sanitized = self.assertSanitized(result, ignored_facts=["ansible_env", "ansible_missing"])
+        self.assertEqual(ara_default.IGNORED_FACT, sanitized["ansible_facts"]["ansible_env"])
+        self.assertEqual("not a fact", sanitized["ansible_env"])
+
+    def test_ansible_types(self):
+        result = {
+            "stdout": AnsibleUnsafeText("é"),
+            "content": AnsibleUnsafeBytes(b"unsafe"),
+            "tuple": (1, 2),
+            "mixed": {1: "int", "str": "str"},
+        }
+        sanitized = self.assertSanitized(result)
+        self.assertEqual({"__ansible_unsafe": "unsafe"}, sanitized["content"])
+
+        # Bytes that aren't valid UTF-8, which couldn't be encoded before, are decoded with replacement characters
+        sanitized = ara_default.sanitize_result({"stdout": b"invalid \xff"})
+        self.assertEqual(b'{"stdout":"invalid \xef\xbf\xbd"}', json.dumps(sanitized))
+
+    def test_result_not_modified(self):
+        result = {
+            "_ansible_no_log": False,
+            "ansible_facts": {"ansible_env": {"HOME": "/root"}},
+            "results": [{"_ansible_item_label": "item", "item": "item"}],
+        }
+        original = copy.deepcopy(result)
+        sanitized = ara_default.sanitize_result(result, ignored_facts=["ansible_env"])
+        self.assertEqual(original, result)
+        # Nothing is shared with the result either
+        sanitized["results"][0]["item"] = "modified"
+        self.assertEqual("item", result["results"][0]["item"])
+
+
+@unittest.skipIf(ara_default is None, "Ansible is not installed")
+class KeepResultContentTestCase(SimpleTestCase):
+    def setUp(self):
+        self.callback = ara_default.CallbackModule()
+        # The defaults of the result_content options, see set_options
+        self.callback.result_content_statuses = ["changed", "failed", "ignored", "ok", "skipped", "unreachable"]
+        self.callback.result_content_actions = []
+        self.callback.result_content_ignored_actions = []
+        self.callback.ignored_result_content = RawJSON(json.dumps(ara_default.IGNORED_RESULT_CONTENT))
+
+    def keep(self, action="ansible.builtin.command", status="ok", changed=False, ignore_errors=False):
+        return self.callback._keep_result_content(action, status, changed, ignore_errors)
+
+    def handle_result(self, action, status="ok", result=None):
+        """
+        Returns the payload and the facts the callback loads for a result of a task with the given action.
+        """
+        self.callback.playbook = dict(id=1)
+        self.callback.task_cache["uuid"] = ara_default.CachedTask(2, 3, action, "2020-01-01T00:00:00+00:00")
+        result = dict(
+            host="host",
+            task="uuid",
+            result=result or dict(changed=False, msg="content"),
+            status=status,
+            ended="2020-01-01T00:00:01+00:00",
+            ignore_errors=False,
+        )
+        with mock.patch.object(self.callback, "_load_result") as load_result:
+            self.callback._handle_result(result)
+        hostname, payload, facts = load_result.call_args[0]
+        return payload, facts
+
+    def test_statuses(self):
+        self.assertTrue(self.keep())
+        self.callback.result_content_statuses = ["failed", "changed"]
+        self.assertFalse(self.keep(status="ok"))
+        self.assertFalse(self.keep(status="skipped"))
+        self.assertTrue(self.keep(status="failed"))
+        # Results that are ok but changed have the changed status
+        self.assertTrue(self.keep(status="ok", changed=True))
+
+    def test_ignore_errors(self):
+        # Failed results whose errors are ignored have the ignored status
+        self.callback.result_content_statuses = ["failed"]
+        self.assertTrue(self.keep(status="failed"))
+        self.assertFalse(self.keep(status="failed", ignore_errors=True))
+        self.callback.result_content_statuses = ["ignored"]
+        self.assertTrue(self.keep(status="failed", ignore_errors=True))
+        self.assertFalse(self.keep(status="failed"))
+
+    def test_actions(self):
+        # Actions match by their short name or by their full name
+        self.callback.result_content_actions = ["command", "ansible.builtin.shell"]
+        self.assertTrue(self.keep(action="command"))
+        self.assertTrue(self.keep(action="ansible.builtin.command"))
+        self.assertTrue(self.keep(action="ansible.builtin.shell"))
+        self.assertFalse(self.keep(action="shell"))
+        self.assertFalse(self.keep(action="ansible.builtin.debug"))
+        # The statuses apply as well
+        self.callback.result_content_statuses = ["failed"]
+        self.assertFalse(self.keep(action="command"))
+
+    def test_ignored_actions(self):
+        self.callback.result_content_ignored_actions = ["debug"]
+        self.assertFalse(self.keep(action="debug"))
+        self.assertFalse(self.keep(action="ansible.builtin.debug"))
+        self.assertTrue(self.keep(action="command"))
+        # Ignored actions are ignored even if they are part of the actions whose content is saved
+        self.callback.result_content_actions = ["debug", "command"]
+        self.assertFalse(self.keep(action="debug"))
+        self.assertTrue(self.keep(action="command"))
+
+    def test_ignored_content_is_shared(self):
+        self.callback.result_content_statuses = ["failed"]
+        first, facts = self.handle_result("ansible.builtin.command")
+        second, facts = self.handle_result("ansible.builtin.shell", result=dict(changed=False, msg="other"))
+        self.assertIsNone(facts)
+        # Every result whose content isn't saved refers to the same content
+        self.assertIs(self.callback.ignored_result_content, first["content"])
+        self.assertIs(self.callback.ignored_result_content, second["content"])
+        self.assertEqual(ara_default.IGNORED_RESULT_CONTENT, json.loads(first["content"]))
+
+        payload, facts = self.handle_result("ansible.builtin.command", status="failed")
+        self.assertEqual({"changed": False, "msg": "content"}, json.loads(payload["content"]))
+
+    def test_gathered_facts(self):
+        # Facts are saved even when the content of the results of the tasks that gather them isn't
+        self.callback.result_content_ignored_actions = ["setup", "gather_facts"]
+        result = dict(ansible_facts=dict(ansible_hostname="host"), _ansible_no_log=False)
+        for action in ["setup", "ansible.builtin.setup", "ansible.builtin.gather_facts"]:
+            payload, facts = self.handle_result(action, result=result)
+            self.assertIs(self.callback.ignored_result_content, payload["content"])
+            self.assertEqual({"ansible_facts": {"ansible_hostname": "host"}}, json.loads(facts))
+
+        # When the content is saved, the facts are the content of the result
+        self.callback.result_content_ignored_actions = []
+        payload, facts = self.handle_result("ansible.builtin.setup", result=result)
+        self.assertIs(payload["content"], facts)
@@ -0,0 +1,134 @@
+#  Copyright (c) 2018 Red Hat, Inc.
+#
+#  This file is part of ARA Records Ansible.
+#
+#  ARA is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  ARA is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with ARA.  If not, see <http://www.gnu.org/licenses/>.
+
+import subprocess
+import sys
+import textwrap
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from requests.auth import HTTPBasicAuth
+
+from ara.api import models, views
+from ara.api.tests import factories
+from ara.clients.direct import AraDirectClient
+from ara.clients.utils import RawJSON, active_client
+
+
+class DirectClientTestCase(TestCase):
+    def setUp(self):
+        self.direct_client = AraDirectClient(run_sql_migrations=False)
+
+    def test_active_client(self):
+        self.assertIs(active_client(), self.direct_client)
+
+    def test_post_and_get(self):
+        playbook = self.direct_client.post(
+            "/api/v1/playbooks",
+            ansible_version="2.9.7",
+            arguments=factories.PLAYBOOK_ARGUMENTS,
+            status="running",
+            path="/path/playbook.yml",
+        )
+        self.assertIsInstance(playbook, dict)
+        self.assertEqual(1, models.Playbook.objects.count())
+
+        detail = self.direct_client.get("/api/v1/playbooks/%s" % playbook["id"])
+        self.assertEqual(detail["arguments"], factories.PLAYBOOK_ARGUMENTS)
+        self.assertEqual(detail["labels"], [])
+
+    def test_get_with_query(self):
+        factories.PlaybookFactory(status="failed")
+        factories.PlaybookFactory(status="completed")
+
+        # Query arguments can be provided in the URL or as keyword arguments
+        playbooks = self.direct_client.get("/api/v1/playbooks?status=failed")
+        self.assertEqual(1, playbooks["count"])
+        playbooks = self.direct_client.get("/api/v1/playbooks", status=["failed", "completed"])
+        self.assertEqual(2, playbooks["count"])
+        self.assertIsInstance(playbooks["results"], list)
+
+    def test_patch_and_delete(self):
+        playbook = factories.PlaybookFactory()
+        updated = self.direct_client.patch("/api/v1/playbooks/%s" % playbook.id, status="completed", labels=["direct"])
+        self.assertEqual(updated["status"], "completed")
+        self.assertEqual(models.Playbook.objects.get(id=playbook.id).status, "completed")
+
+        response = self.direct_client.delete("/api/v1/playbooks/%s" % playbook.id)
+        self.assertEqual(204, response.status_code)
+        self.assertEqual(0, models.Playbook.objects.count())
+
+    def test_bulk_results(self):
+        host = factories.HostFactory()
+        task = factories.TaskFactory()
+        result = {"status": "ok", "host": host.id, "task": task.id, "play": task.play.id, "playbook": task.playbook.id}
+        response = self.direct_client.post("/api/v1/results/bulk", results=[result, result])
+        self.assertEqual(2, response["count"])
+
+    def test_raw_json_content(self):
+        host = factories.HostFactory()
+        task = factories.TaskFactory()
+        content = RawJSON(b'{"msg":"raw"}')
+        result = {"status": "ok", "host": host.id, "task": task.id, "play": task.play.id, "playbook": task.playbook.id}
+        self.direct_client.post("/api/v1/results", content=content, **result)
+        self.direct_client.post("/api/v1/results/bulk", results=[dict(result, content=content)])
+        for result in self.direct_client.get("/api/v1/results")["results"]:
+            self.assertEqual({"msg": "raw"}, self.direct_client.get("/api/v1/results/%s" % result["id"])["content"])
+
+    def test_validation_error(self):
+        response = self.direct_client.post("/api/v1/playbooks", status="invalid")
+        self.assertIn("status", response)
+        self.assertEqual(0, models.Playbook.objects.count())
+
+    def test_server_error(self):
+        # Unhandled exceptions are logged as server errors instead of being raised to the caller
+        with mock.patch.object(views.PlaybookViewSet, "list", side_effect=RuntimeError("boom")):
+            with self.assertLogs("ara.clients.direct", "ERROR") as logs, self.assertLogs("django.request", "ERROR"):
+                response = self.direct_client.get("/api/v1/playbooks")
+        self.assertIsNone(response)
+        self.assertIn("Failed to get on /api/v1/playbooks", logs.output[0])
+
+    def test_not_found(self):
+        with self.assertLogs("ara.clients.direct", "ERROR"):
+            self.assertIsNone(self.direct_client.get("/api/v1/unknown"))
+
+    @override_settings(WRITE_LOGIN_REQUIRED=True)
+    def test_authentication(self):
+        User.objects.create_user("direct", "direct@example.org", "password")
+
+        self.direct_client.post("/api/v1/labels", name="anonymous")
+        self.assertEqual(0, models.Label.objects.count())
+
+        client = AraDirectClient(auth=HTTPBasicAuth("direct", "password"), run_sql_migrations=False)
+        client.post("/api/v1/labels", name="authenticated")
+        self.assertEqual(1, models.Label.objects.count())
+
+    def test_requests_not_imported(self):
+        # The direct client doesn't need requests, unlike the other clients.
+        # Note: Django REST framework imports requests, if it is installed, once the API is loaded.
+        code = textwrap.dedent(
+            """
+            import sys
+            from ara.clients.utils import get_client
+
+            get_client(client="direct", username="direct", password="password", run_sql_migrations=False)
+            sys.exit("requests" in sys.modules)
+            """
+        )
+        process = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.assertEqual(0, process.returncode, process.stdout.decode("utf8"))
@@ -17,6 +17,8 @@
 
 import datetime
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 
 from ara.api import models, serializers
@@ -68,6 +70,35 @@ class FileTestCase(APITestCase):
         self.assertEqual(201, request.status_code)
         self.assertEqual(1, models.File.objects.count())
 
+    def test_get_known_file_content_sha1(self):
+        file_content = factories.FileContentFactory()
+        unknown = utils.sha1("unknown")
+        request = self.client.post(
+            "/api/v1/files/sha1", {"sha1": [unknown, file_content.sha1, file_content.sha1]}, format="json"
+        )
+        self.assertEqual(200, request.status_code)
+        self.assertEqual([file_content.sha1], request.data["sha1"])
+
+    def test_create_file_with_known_content_sha1(self):
+        file_content = factories.FileContentFactory()
+        playbook = factories.PlaybookFactory()
+        request = self.client.post(
+            "/api/v1/files", {"path": "/path/playbook.yml", "content_sha1": file_content.sha1, "playbook": playbook.id}
+        )
+        self.assertEqual(201, request.status_code)
+        self.assertEqual(file_content.sha1, request.data["sha1"])
+        self.assertEqual(1, models.FileContent.objects.count())
+
+    def test_create_file_with_unknown_content_sha1(self):
+        playbook = factories.PlaybookFactory()
+        request = self.client.post(
+            "/api/v1/files",
+            {"path": "/path/playbook.yml", "content_sha1": utils.sha1("unknown"), "playbook": playbook.id},
+        )
+        self.assertEqual(400, request.status_code)
+        self.assertIn("content", request.data)
+        self.assertEqual(0, models.File.objects.count())
+
     def test_post_same_file_for_a_playbook(self):
         playbook = factories.PlaybookFactory()
         self.assertEqual(0, models.File.objects.count())
@@ -93,6 +124,18 @@ class FileTestCase(APITestCase):
         self.assertEqual(1, len(request.data["results"]))
         self.assertEqual(file.path, request.data["results"][0]["path"])
 
+    def test_get_files_without_contents(self):
+        for index in range(3):
+            factories.FileFactory(path="/path/%s.yml" % index)
+
+        # The sha1 of the contents are joined to the files but not the contents themselves
+        with CaptureQueriesContext(connection) as queries:
+            request = self.client.get("/api/v1/files")
+        self.assertEqual(2, len(queries))
+        self.assertNotIn('"file_contents"."contents"', queries[-1]["sql"])
+        self.assertEqual(3, len(request.data["results"]))
+        self.assertIn("sha1", request.data["results"][0])
+
     def test_get_file(self):
         file = factories.FileFactory()
         request = self.client.get("/api/v1/files/%s" % file.id)
@@ -128,6 +171,15 @@ class FileTestCase(APITestCase):
         self.assertEqual(204, request.status_code)
         self.assertEqual(0, models.File.objects.all().count())
 
+    def test_delete_file_with_contents(self):
+        task = factories.TaskFactory()
+        result = factories.ResultFactory(task=task, play=task.play, playbook=task.playbook)
+
+        # Deleting a file deletes its tasks and their results, along with the content of the results
+        self.client.delete("/api/v1/files/%s" % task.file.id)
+        self.assertFalse(models.Result.objects.filter(id=result.id).exists())
+        self.assertFalse(models.Content.objects.filter(id=result.content.id).exists())
+
     def test_get_file_by_date(self):
         file = factories.FileFactory()
 
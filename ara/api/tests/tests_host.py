@@ -21,6 +21,7 @@ from rest_framework.test import APITestCase
 
 from ara.api import models, serializers
 from ara.api.tests import factories, utils
+from ara.utils import json
 
 
 class HostTestCase(APITestCase):
@@ -45,12 +46,42 @@ class HostTestCase(APITestCase):
         serializer.is_valid()
         host = serializer.save()
         host.refresh_from_db()
-        self.assertEqual(host.facts, utils.compressed_obj(factories.HOST_FACTS))
+        self.assertEqual(host.facts.contents, utils.compressed_obj(factories.HOST_FACTS))
 
     def test_host_serializer_decompress_facts(self):
-        host = factories.HostFactory(facts=utils.compressed_obj(factories.HOST_FACTS))
+        host = factories.HostFactory()
         serializer = serializers.HostSerializer(instance=host)
         self.assertEqual(serializer.data["facts"], factories.HOST_FACTS)
+        self.assertEqual(serializer.data["facts_sha1"], utils.sha1(json.dumps(factories.HOST_FACTS)))
+
+    def test_hosts_share_identical_facts(self):
+        first = factories.HostFactory(name="first")
+        request = self.client.post(
+            "/api/v1/hosts", {"name": "second", "playbook": first.playbook.id, "facts": factories.HOST_FACTS}
+        )
+        self.assertEqual(201, request.status_code)
+        self.assertEqual(first.facts, models.Host.objects.get(name="second").facts)
+
+    def test_patch_host_facts_sha1(self):
+        known = factories.HostFactory(name="known")
+        host = factories.HostFactory(name="new", facts=factories.ContentFactory())
+        sha1 = utils.sha1(json.dumps(factories.HOST_FACTS))
+
+        request = self.client.patch("/api/v1/hosts/%s" % host.id, {"facts_sha1": sha1})
+        self.assertEqual(200, request.status_code)
+        self.assertEqual(sha1, request.data["facts_sha1"])
+        # The facts aren't sent back, the client already has them
+        self.assertNotIn("facts", request.data)
+        host.refresh_from_db()
+        self.assertEqual(known.facts, host.facts)
+
+    def test_patch_host_unknown_facts_sha1(self):
+        host = factories.HostFactory()
+        request = self.client.patch("/api/v1/hosts/%s" % host.id, {"facts_sha1": utils.sha1("unknown")})
+        self.assertEqual(200, request.status_code)
+        # The facts are left as-is, the client finds out it must send them
+        self.assertEqual(utils.sha1(json.dumps(factories.HOST_FACTS)), request.data["facts_sha1"])
+        self.assertNotIn("facts", request.data)
 
     def test_get_no_hosts(self):
         request = self.client.get("/api/v1/hosts")
@@ -69,6 +100,24 @@ class HostTestCase(APITestCase):
         self.assertEqual(204, request.status_code)
         self.assertEqual(0, models.Host.objects.all().count())
 
+    def test_patch_host_facts_replaces_contents(self):
+        host = factories.HostFactory()
+        previous = host.facts
+        request = self.client.patch("/api/v1/hosts/%s" % host.id, {"facts": {"updated": True}})
+        self.assertEqual(200, request.status_code)
+        # The facts that were replaced are deleted since no other host references them
+        self.assertFalse(models.Content.objects.filter(id=previous.id).exists())
+
+    def test_delete_host_with_contents(self):
+        host = factories.HostFactory()
+        other = factories.HostFactory(name="other")
+        result = factories.ResultFactory(host=host)
+
+        # Facts shared with another host are kept, the content of the results of the host is deleted with it
+        self.client.delete("/api/v1/hosts/%s" % host.id)
+        self.assertTrue(models.Content.objects.filter(id=other.facts.id).exists())
+        self.assertFalse(models.Content.objects.filter(id=result.content.id).exists())
+
     def test_create_host(self):
         playbook = factories.PlaybookFactory()
         self.assertEqual(0, models.Host.objects.count())
@@ -87,6 +136,56 @@ class HostTestCase(APITestCase):
         self.assertEqual(201, request.status_code)
         self.assertEqual(1, models.Host.objects.count())
 
+    def test_bulk_create_hosts(self):
+        playbook = factories.PlaybookFactory()
+        existing = factories.HostFactory(name="existing", playbook=playbook)
+        request = self.client.post(
+            "/api/v1/hosts/bulk", {"playbook": playbook.id, "hosts": ["existing", "new", "other", "new"]}
+        )
+        self.assertEqual(200, request.status_code)
+        self.assertEqual(3, request.data["count"])
+        self.assertEqual(3, models.Host.objects.count())
+        new = models.Host.objects.get(name="new")
+        self.assertEqual(existing.id, request.data["hosts"]["existing"])
+        self.assertEqual(new.id, request.data["hosts"]["new"])
+        self.assertEqual({}, serializers.DetailedHostSerializer(instance=new).data["facts"])
+
+        # Hosts are only created once
+        request = self.client.post("/api/v1/hosts/bulk", {"playbook": playbook.id, "hosts": ["new"]})
+        self.assertEqual({"new": new.id}, request.data["hosts"])
+        self.assertEqual(3, models.Host.objects.count())
+
+    def test_bulk_create_hosts_with_unknown_playbook(self):
+        request = self.client.post("/api/v1/hosts/bulk", {"playbook": 1, "hosts": ["host"]})
+        self.assertEqual(400, request.status_code)
+        self.assertEqual(0, models.Host.objects.count())
+
+    def test_update_host_stats(self):
+        playbook = factories.PlaybookFactory()
+        existing = factories.HostFactory(name="existing", playbook=playbook)
+        stats = {
+            "existing": {"changed": 1, "failures": 2, "ok": 3, "skipped": 4, "unreachable": 5, "rescued": 0},
+            "new": {"changed": 0, "failures": 0, "ok": 1, "skipped": 0, "unreachable": 1, "rescued": 0},
+        }
+        request = self.client.post("/api/v1/hosts/stats", {"playbook": playbook.id, "stats": stats})
+        self.assertEqual(200, request.status_code)
+        self.assertEqual(2, request.data["count"])
+        self.assertEqual(existing.id, request.data["hosts"]["existing"])
+
+        existing.refresh_from_db()
+        self.assertEqual(
+            (1, 2, 3, 4, 5),
+            (existing.changed, existing.failed, existing.ok, existing.skipped, existing.unreachable),
+        )
+        new = models.Host.objects.get(name="new", playbook=playbook)
+        self.assertEqual((1, 1), (new.ok, new.unreachable))
+
+    def test_update_host_stats_with_invalid_stats(self):
+        host = factories.HostFactory()
+        stats = {host.name: {"ok": -1}}
+        request = self.client.post("/api/v1/hosts/stats", {"playbook": host.playbook.id, "stats": stats})
+        self.assertEqual(400, request.status_code)
+
     def test_partial_update_host(self):
         host = factories.HostFactory()
         self.assertNotEqual("foo", host.name)
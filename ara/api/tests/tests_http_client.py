@@ -0,0 +1,79 @@
+#  Copyright (c) 2018 Red Hat, Inc.
+#
+#  This file is part of ARA Records Ansible.
+#
+#  ARA is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  ARA is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with ARA.  If not, see <http://www.gnu.org/licenses/>.
+
+from django.test import LiveServerTestCase
+
+from ara.api import models
+from ara.api.tests import factories
+from ara.clients.http import AraHttpClient
+from ara.clients.utils import RawJSON, encode_json, get_client
+
+
+class HttpClientTestCase(LiveServerTestCase):
+    def test_connection_pool_settings(self):
+        client = get_client(client="http", endpoint=self.live_server_url, pool_maxsize=16, pool_block=True)
+        adapter = client.client.http.get_adapter(self.live_server_url)
+        self.assertEqual(16, adapter.poolmanager.connection_pool_kw["maxsize"])
+        self.assertTrue(adapter.poolmanager.connection_pool_kw["block"])
+        self.assertEqual("keep-alive", client.client.http.headers["Connection"])
+
+    def test_keep_alive_disabled(self):
+        client = get_client(client="http", endpoint=self.live_server_url, keep_alive=False)
+        self.assertEqual("close", client.client.http.headers["Connection"])
+
+    def test_stats(self):
+        factories.PlaybookFactory()
+        client = AraHttpClient(endpoint=self.live_server_url, pool_maxsize=1)
+        playbooks = client.get("/api/v1/playbooks")
+        self.assertEqual(1, playbooks["count"])
+        client.get("/api/v1/playbooks")
+
+        self.assertEqual(dict(requests=2, in_flight=0, max_in_flight=1, pool_exhausted=0), client.stats)
+
+    def test_compression(self):
+        client = AraHttpClient(endpoint=self.live_server_url, compression="gzip", compression_threshold=256)
+        self.assertNotIn("headers", client.client._encode(dict(name="small")))
+        self.assertEqual({"Content-Encoding": "gzip"}, client.client._encode(dict(name="x" * 256))["headers"])
+
+        arguments = dict(factories.PLAYBOOK_ARGUMENTS, padding="x" * 1024)
+        playbook = client.post(
+            "/api/v1/playbooks", ansible_version="2.9.7", arguments=arguments, status="running", path="/playbook.yml"
+        )
+        self.assertEqual(arguments, playbook["arguments"])
+        self.assertEqual(1, models.Playbook.objects.count())
+
+    def test_encode_json(self):
+        # RawJSON is inserted as-is, including in nested objects, and strings that look like its markers aren't
+        payload = dict(name="\x00ara-raw", content=RawJSON(b'{"b":1}'), results=[dict(content=RawJSON(b"[1]"))])
+        self.assertEqual(
+            b'{"name":"\\u0000ara-raw","content":{"b":1},"results":[{"content":[1]}]}', encode_json(payload)
+        )
+
+    def test_raw_json_content(self):
+        host = factories.HostFactory()
+        task = factories.TaskFactory()
+        client = AraHttpClient(endpoint=self.live_server_url)
+        result = client.post(
+            "/api/v1/results",
+            status="ok",
+            host=host.id,
+            task=task.id,
+            play=task.play.id,
+            playbook=task.playbook.id,
+            content=RawJSON(b'{"msg":"raw"}'),
+        )
+        self.assertEqual({"msg": "raw"}, client.get("/api/v1/results/%s" % result["id"])["content"])
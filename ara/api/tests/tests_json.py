@@ -0,0 +1,96 @@
+#  Copyright (c) 2018 Red Hat, Inc.
+#
+#  This file is part of ARA Records Ansible.
+#
+#  ARA is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  ARA is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with ARA.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import math
+from unittest import mock
+
+from django.test import SimpleTestCase
+from rest_framework.test import APITestCase
+
+from ara.api.tests import factories
+from ara.utils import json
+
+DATA = {
+    "text": "é",
+    1: (True, None, 1.5),
+    "bytes": b"unsafe",
+    "set": {"item"},
+    "date": datetime.date(2020, 1, 2),
+}
+ENCODED = b'{"text":"\xc3\xa9","1":[true,null,1.5],"bytes":"unsafe","set":["item"],"date":"2020-01-02"}'
+
+
+class JSONTestCase(SimpleTestCase):
+    def test_dumps(self):
+        self.assertEqual(ENCODED, json.dumps(DATA))
+        self.assertEqual(
+            b'{\n  "a": 1,\n  "b": [\n    2\n  ]\n}', json.dumps({"b": [2], "a": 1}, indent=True, sort_keys=True)
+        )
+
+    def test_dumps_without_orjson(self):
+        # The standard library produces the same output
+        with mock.patch.object(json, "orjson", None):
+            self.assertEqual(ENCODED, json.dumps(DATA))
+            self.assertEqual(
+                b'{\n  "a": 1,\n  "b": [\n    2\n  ]\n}', json.dumps({"b": [2], "a": 1}, indent=True, sort_keys=True)
+            )
+
+    def test_dumps_numbers(self):
+        # Both backends format floats and large integers the same way and encode NaN and infinite floats as null
+        data = [1e16, 1.5e-7, 0.00001, 0.0001, 0.1, float("nan"), float("-inf"), 2 ** 64, -(2 ** 63)]
+        encoded = b"[1e+16,1.5e-07,1e-05,0.0001,0.1,null,null,18446744073709551616,-9223372036854775808]"
+        self.assertEqual(encoded, json.dumps(data))
+        self.assertEqual(b'{"a":null}', json.dumps({"a": object()}, default=lambda value: float("nan")))
+        with mock.patch.object(json, "orjson", None):
+            self.assertEqual(encoded, json.dumps(data))
+            self.assertEqual(b'{"a":null}', json.dumps({"a": object()}, default=lambda value: float("nan")))
+
+    def test_dumps_default(self):
+        self.assertEqual(b'{"a":"custom"}', json.dumps({"a": object()}, default=lambda value: "custom"))
+        with self.assertRaises(TypeError):
+            json.dumps({"a": object()})
+
+    def test_loads(self):
+        self.assertEqual({"a": ["é"]}, json.loads('{"a": ["é"]}'))
+        self.assertEqual({"a": ["é"]}, json.loads('{"a": ["é"]}'.encode("utf8")))
+        with self.assertRaises(ValueError):
+            json.loads(b"{")
+
+    def test_loads_numbers(self):
+        # Integers that don't fit in 64 bits aren't decoded as floats
+        encoded = b'[18446744073709551616,-9223372036854775809,18446744073709551615,1e+16,"0000000000000000000"]'
+        decoded = [2 ** 64, -(2 ** 63) - 1, 2 ** 64 - 1, 1e16, "0000000000000000000"]
+        self.assertEqual(decoded, json.loads(encoded))
+        self.assertEqual(decoded, json.loads(encoded.decode("utf8")))
+        self.assertIsInstance(json.loads(b"[18446744073709551616]")[0], int)
+        # Legacy contents encoded by the standard library can have NaN
+        self.assertTrue(math.isnan(json.loads(b"[NaN]")[0]))
+
+
+class JSONRendererTestCase(APITestCase):
+    def test_render(self):
+        factories.PlaybookFactory(name="line\u2028separator")
+        response = self.client.get("/api/v1/playbooks")
+        self.assertEqual("application/json", response["Content-Type"])
+        self.assertIn(b'"name":"line\\u2028separator"', response.content)
+        self.assertEqual(1, json.loads(response.content)["count"])
+
+    def test_parse_error(self):
+        response = self.client.post("/api/v1/playbooks", data=b"{", content_type="application/json")
+        self.assertEqual(400, response.status_code)
+        self.assertIn("JSON parse error", response.data["detail"])
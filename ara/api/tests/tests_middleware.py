@@ -0,0 +1,81 @@
+#  Copyright (c) 2018 Red Hat, Inc.
+#
+#  This file is part of ARA Records Ansible.
+#
+#  ARA is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  ARA is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with ARA.  If not, see <http://www.gnu.org/licenses/>.
+
+import gzip
+import json
+import zlib
+
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from ara.api import models
+from ara.api.tests import factories, utils
+
+
+class RequestDecompressionMiddlewareTestCase(APITestCase):
+    def _post_playbook(self, data, encoding):
+        return self.client.post(
+            "/api/v1/playbooks", data, content_type="application/json", HTTP_CONTENT_ENCODING=encoding
+        )
+
+    def _playbook(self):
+        body = dict(
+            ansible_version="2.9.7", arguments=factories.PLAYBOOK_ARGUMENTS, status="running", path="/playbook.yml"
+        )
+        return json.dumps(body).encode("utf8")
+
+    def test_gzip(self):
+        request = self._post_playbook(gzip.compress(self._playbook()), "gzip")
+        self.assertEqual(201, request.status_code)
+        self.assertEqual(utils.compressed_obj(factories.PLAYBOOK_ARGUMENTS), models.Playbook.objects.get().arguments)
+
+    def test_deflate(self):
+        request = self._post_playbook(zlib.compress(self._playbook()), "deflate")
+        self.assertEqual(201, request.status_code)
+        self.assertEqual(1, models.Playbook.objects.count())
+
+    def test_identity(self):
+        request = self._post_playbook(self._playbook(), "identity")
+        self.assertEqual(201, request.status_code)
+
+    def test_invalid_body(self):
+        request = self._post_playbook(self._playbook(), "gzip")
+        self.assertEqual(400, request.status_code)
+        self.assertEqual(0, models.Playbook.objects.count())
+
+    def test_truncated_body(self):
+        request = self._post_playbook(gzip.compress(self._playbook())[:-10], "gzip")
+        self.assertEqual(400, request.status_code)
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_body_too_large(self):
+        # A body that is small once compressed is refused if it exceeds the limit once decompressed
+        data = json.dumps(dict(ansible_version="2.9.7", status="running", path="/" * 64 * 1024)).encode("utf8")
+        compressed = gzip.compress(data)
+        self.assertLess(len(compressed), 1024)
+        request = self._post_playbook(compressed, "gzip")
+        self.assertEqual(413, request.status_code)
+        self.assertEqual(0, models.Playbook.objects.count())
+
+    def test_only_api_writes(self):
+        # Only the bodies of requests that write to the API are decompressed
+        request = self.client.get("/api/v1/playbooks", HTTP_CONTENT_ENCODING="gzip")
+        self.assertEqual(200, request.status_code)
+
+    def test_unsupported_encoding(self):
+        request = self._post_playbook(self._playbook(), "br")
+        self.assertEqual(415, request.status_code)
@@ -0,0 +1,87 @@
+#  Copyright (c) 2018 Red Hat, Inc.
+#
+#  This file is part of ARA Records Ansible.
+#
+#  ARA is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  ARA is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with ARA.  If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from ara.api import models, views
+from ara.api.tests import factories
+from ara.clients.direct import migrations_applied
+from ara.clients.offline import AraOfflineClient, SingleWriter
+
+
+class MigrationsTestCase(TestCase):
+    def test_migrations_applied(self):
+        self.assertTrue(migrations_applied())
+
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM django_migrations WHERE app = 'api' AND name LIKE '0014_%'")
+        self.assertFalse(migrations_applied())
+
+
+class SingleWriterTestCase(TransactionTestCase):
+    def _create_playbook(self, path, fail=False):
+        playbook = factories.PlaybookFactory(path=path)
+        if fail:
+            raise ValueError("failed after creating %s" % path)
+        return playbook.id
+
+    def _post_playbook(self, client, path):
+        return client.post("/api/v1/playbooks", ansible_version="2.9.7", status="running", path=path)
+
+    def test_single_writer(self):
+        client = AraOfflineClient(run_sql_migrations=False, transaction_size=10, transaction_timeout=60000)
+        self.addCleanup(client.close)
+
+        def perform_create(viewset, serializer):
+            serializer.save()
+            raise RuntimeError("failed after creating a playbook")
+
+        self.assertIsInstance(self._post_playbook(client, "/first.yml")["id"], int)
+        # The request fails with a server error and only what it did is rolled back
+        with mock.patch.object(views.PlaybookViewSet, "perform_create", perform_create):
+            with self.assertLogs("django.request", "ERROR"):
+                response = self._post_playbook(client.client, "/failed.yml")
+        self.assertEqual(500, response.status_code)
+        self._post_playbook(client, "/second.yml")
+
+        client.commit()
+        self.assertEqual(["/first.yml", "/second.yml"], sorted(models.Playbook.objects.values_list("path", flat=True)))
+
+    def test_exception(self):
+        writer = SingleWriter(size=10, timeout=60000)
+        self.addCleanup(writer.close)
+
+        # The error is raised to the caller and what the function did is rolled back
+        with self.assertRaisesRegex(ValueError, "/failed.yml"):
+            writer.submit(self._create_playbook, "/failed.yml", fail=True)
+        self.assertIsInstance(writer.submit(self._create_playbook, "/first.yml"), int)
+
+        writer.commit()
+        self.assertEqual(["/first.yml"], list(models.Playbook.objects.values_list("path", flat=True)))
+
+    def test_close(self):
+        writer = SingleWriter(size=10, timeout=60000)
+        writer.submit(self._create_playbook, "/first.yml")
+        writer.close()
+        self.assertEqual(1, models.Playbook.objects.count())
+
+        # Requests submitted once the writer is closed are handled by the caller
+        writer.submit(self._create_playbook, "/second.yml")
+        self.assertEqual(2, models.Playbook.objects.count())
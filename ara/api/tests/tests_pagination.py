@@ -0,0 +1,99 @@
+#  Copyright (c) 2018 Red Hat, Inc.
+#
+#  This file is part of ARA Records Ansible.
+#
+#  ARA is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  ARA is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with ARA.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from ara.api.tests import factories
+
+
+class PaginationTestCase(APITestCase):
+    def walk(self, url):
+        ids = []
+        while url is not None:
+            request = self.client.get(url)
+            self.assertEqual(200, request.status_code)
+            ids.extend(result["id"] for result in request.data["results"])
+            url = request.data["next"]
+        return ids
+
+    def test_limit_offset_is_the_default(self):
+        factories.PlaybookFactory()
+        request = self.client.get("/api/v1/playbooks")
+        self.assertEqual(["count", "next", "previous", "results"], list(request.data.keys()))
+        self.assertEqual(1, request.data["count"])
+
+    def test_limit_offset_without_count(self):
+        for _ in range(5):
+            factories.PlaybookFactory()
+        request = self.client.get("/api/v1/playbooks?limit=2&offset=2&count=false")
+        self.assertIsNone(request.data["count"])
+        self.assertEqual(2, len(request.data["results"]))
+        self.assertIn("offset=4", request.data["next"])
+
+        request = self.client.get("/api/v1/playbooks?limit=2&offset=4&count=false")
+        self.assertEqual(1, len(request.data["results"]))
+        self.assertIsNone(request.data["next"])
+
+    def test_cursor(self):
+        playbook = factories.PlaybookFactory()
+        expected = [factories.ResultFactory(playbook=playbook).id for _ in range(5)]
+
+        request = self.client.get("/api/v1/results?cursor=&limit=2")
+        self.assertEqual(5, request.data["count"])
+        self.assertEqual(2, len(request.data["results"]))
+        self.assertIsNone(request.data["previous"])
+
+        self.assertEqual(sorted(expected, reverse=True), self.walk("/api/v1/results?cursor=&limit=2"))
+        self.assertEqual(sorted(expected), self.walk("/api/v1/results?cursor=&limit=2&order=id"))
+
+    def test_cursor_is_stable(self):
+        first = factories.TaskFactory()
+        second = factories.TaskFactory()
+        request = self.client.get("/api/v1/tasks?cursor=&limit=1")
+        self.assertEqual([second.id], [task["id"] for task in request.data["results"]])
+
+        # Objects created meanwhile don't shift the next pages
+        factories.TaskFactory(playbook=first.playbook, play=first.play, file=first.file)
+        request = self.client.get(request.data["next"])
+        self.assertEqual([first.id], [task["id"] for task in request.data["results"]])
+
+    def test_cursor_ordered_by_started(self):
+        now = timezone.now()
+        expected = []
+        for minutes in [3, 1, 2, 1]:
+            playbook = factories.PlaybookFactory(started=now - datetime.timedelta(minutes=minutes))
+            expected.append((playbook.started, playbook.id))
+
+        ids = self.walk("/api/v1/playbooks?cursor=&limit=1&order=started")
+        self.assertEqual([id for started, id in sorted(expected)], ids)
+        ids = self.walk("/api/v1/playbooks?cursor=&limit=1&order=-started")
+        self.assertEqual([id for started, id in sorted(expected, reverse=True)], ids)
+
+    def test_cursor_without_count(self):
+        factories.PlaybookFactory()
+        request = self.client.get("/api/v1/playbooks?cursor=&count=false")
+        self.assertIsNone(request.data["count"])
+        self.assertEqual(1, len(request.data["results"]))
+
+    def test_cursor_with_unsupported_order(self):
+        request = self.client.get("/api/v1/playbooks?cursor=&order=duration")
+        self.assertEqual(400, request.status_code)
+        request = self.client.get("/api/v1/hosts?cursor=&order=started")
+        self.assertEqual(400, request.status_code)
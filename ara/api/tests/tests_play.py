@@ -95,6 +95,19 @@ class PlayTestCase(APITestCase):
         play_updated = models.Play.objects.get(id=play.id)
         self.assertEqual("expired", play_updated.status)
 
+    def test_get_plays_item_counts(self):
+        play = factories.PlayFactory()
+        factories.ResultFactory(play=play, task__play=play)
+        for _ in range(5):
+            factories.PlayFactory()
+
+        # Items are counted in the query that retrieves the page, not for each play
+        with self.assertNumQueries(2):
+            request = self.client.get("/api/v1/plays")
+        self.assertEqual(6, len(request.data["results"]))
+        self.assertEqual(dict(tasks=1, results=1), request.data["results"][-1]["items"])
+        self.assertEqual(dict(tasks=0, results=0), request.data["results"][0]["items"])
+
     def test_get_play(self):
         play = factories.PlayFactory()
         request = self.client.get("/api/v1/plays/%s" % play.id)
@@ -17,6 +17,8 @@
 
 import datetime
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.utils.dateparse import parse_duration
 from rest_framework.test import APITestCase
@@ -80,6 +82,22 @@ class PlaybookTestCase(APITestCase):
         self.assertEqual(204, request.status_code)
         self.assertEqual(0, models.Playbook.objects.all().count())
 
+    def test_delete_playbook_with_contents(self):
+        playbook = factories.PlaybookFactory()
+        facts = factories.ContentFactory(sha1="0" * 40, contents=utils.compressed_obj({"facts": True}))
+        host = factories.HostFactory(playbook=playbook, facts=facts)
+        unique = factories.ContentFactory(sha1="1" * 40, contents=utils.compressed_obj({"unique": True}))
+        shared = factories.ContentFactory()
+        factories.ResultFactory(playbook=playbook, host=host, content=unique)
+        factories.ResultFactory(playbook=playbook, host=host, content=shared)
+        factories.ResultFactory(content=shared)
+
+        # The contents that only the results and hosts of the playbook referenced are deleted with it
+        request = self.client.delete("/api/v1/playbooks/%s" % playbook.id)
+        self.assertEqual(204, request.status_code)
+        self.assertFalse(models.Content.objects.filter(id__in=[facts.id, unique.id]).exists())
+        self.assertTrue(models.Content.objects.filter(id=shared.id).exists())
+
     def test_create_playbook(self):
         self.assertEqual(0, models.Playbook.objects.count())
         request = self.client.post(
@@ -126,6 +144,39 @@ class PlaybookTestCase(APITestCase):
         playbook_updated = models.Playbook.objects.get(id=playbook.id)
         self.assertEqual("expired", playbook_updated.status)
 
+    def test_get_playbooks_item_counts(self):
+        playbook = factories.PlaybookFactory()
+        play = factories.PlayFactory(playbook=playbook)
+        task = factories.TaskFactory(playbook=playbook, play=play, file__playbook=playbook)
+        factories.ResultFactory(playbook=playbook, play=play, task=task, host__playbook=playbook)
+        factories.RecordFactory(playbook=playbook)
+        playbook.labels.add(factories.LabelFactory())
+
+        # Items are counted in the query that retrieves the page, not for each playbook
+        with self.assertNumQueries(3):
+            request = self.client.get("/api/v1/playbooks")
+        self.assertEqual(
+            dict(plays=1, tasks=1, results=1, hosts=1, files=1, records=1), request.data["results"][0]["items"]
+        )
+
+        for index in range(5):
+            factories.PlaybookFactory().labels.add(factories.LabelFactory(name="label %s" % index))
+        with self.assertNumQueries(3):
+            request = self.client.get("/api/v1/playbooks")
+        self.assertEqual(6, len(request.data["results"]))
+        self.assertEqual(
+            dict(plays=0, tasks=0, results=0, hosts=0, files=0, records=0), request.data["results"][0]["items"]
+        )
+
+    def test_get_playbooks_with_fields(self):
+        factories.PlaybookFactory()
+        # Neither the compressed arguments nor the items and labels are retrieved if they aren't returned
+        with CaptureQueriesContext(connection) as queries:
+            request = self.client.get("/api/v1/playbooks?fields=id,status,started,arguments&exclude=arguments")
+        self.assertEqual(["id", "started", "status"], sorted(request.data["results"][0].keys()))
+        self.assertEqual(2, len(queries))
+        self.assertNotIn('"arguments"', queries[-1]["sql"])
+
     def test_get_playbook(self):
         playbook = factories.PlaybookFactory()
         request = self.client.get("/api/v1/playbooks/%s" % playbook.id)
@@ -17,6 +17,8 @@
 
 import datetime
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 
 from ara.api import models, serializers
@@ -50,6 +52,17 @@ class RecordTestCase(APITestCase):
         self.assertEqual(1, len(request.data["results"]))
         self.assertEqual(record.key, request.data["results"][0]["key"])
 
+    def test_get_records_without_value(self):
+        factories.RecordFactory()
+        with CaptureQueriesContext(connection) as queries:
+            request = self.client.get("/api/v1/records")
+        self.assertNotIn('"value"', queries[-1]["sql"])
+        self.assertNotIn("value", request.data["results"][0])
+
+        # The value is still returned for a single record
+        request = self.client.get("/api/v1/records/%s" % request.data["results"][0]["id"])
+        self.assertIn("value", request.data)
+
     def test_delete_record(self):
         record = factories.RecordFactory()
         self.assertEqual(1, models.Record.objects.all().count())
@@ -16,13 +16,16 @@
 #  along with ARA.  If not, see <http://www.gnu.org/licenses/>.
 
 import datetime
+from unittest import mock
 
+from django.db.models import ProtectedError
 from django.utils import timezone
 from django.utils.dateparse import parse_duration
 from rest_framework.test import APITestCase
 
 from ara.api import models, serializers
 from ara.api.tests import factories, utils
+from ara.utils import json
 
 
 class ResultTestCase(APITestCase):
@@ -69,13 +72,46 @@ class ResultTestCase(APITestCase):
         serializer.is_valid()
         result = serializer.save()
         result.refresh_from_db()
-        self.assertEqual(result.content, utils.compressed_obj(factories.RESULT_CONTENTS))
+        self.assertEqual(result.content.contents, utils.compressed_obj(factories.RESULT_CONTENTS))
+        self.assertEqual(result.content.sha1, utils.sha1(json.dumps(factories.RESULT_CONTENTS)))
 
     def test_result_serializer_decompress_content(self):
-        result = factories.ResultFactory(content=utils.compressed_obj(factories.RESULT_CONTENTS))
+        result = factories.ResultFactory(content=factories.ContentFactory())
         serializer = serializers.ResultSerializer(instance=result)
         self.assertEqual(serializer.data["content"], factories.RESULT_CONTENTS)
 
+    def test_result_serializer_default_content(self):
+        task = factories.TaskFactory()
+        host = factories.HostFactory()
+        serializer = serializers.ResultSerializer(
+            data={"host": host.id, "task": task.id, "play": task.play.id, "playbook": task.playbook.id}
+        )
+        serializer.is_valid(raise_exception=True)
+        result = serializer.save()
+        self.assertEqual(result.content.contents, utils.compressed_obj({}))
+
+    def test_result_content_is_stored_once(self):
+        host = factories.HostFactory()
+        task = factories.TaskFactory()
+        result = {
+            "content": factories.RESULT_CONTENTS,
+            "host": host.id,
+            "task": task.id,
+            "play": task.play.id,
+            "playbook": task.playbook.id,
+        }
+        for _ in range(2):
+            request = self.client.post("/api/v1/results", result)
+            self.assertEqual(201, request.status_code)
+            self.assertEqual(factories.RESULT_CONTENTS, request.data["content"])
+        request = self.client.post("/api/v1/results/bulk", [result, result, dict(result, content={"other": True})])
+        self.assertEqual(201, request.status_code)
+
+        self.assertEqual(5, models.Result.objects.count())
+        self.assertEqual(2, models.Content.objects.filter(results__isnull=False).distinct().count())
+        content = models.Content.objects.get(sha1=utils.sha1(json.dumps(factories.RESULT_CONTENTS)))
+        self.assertEqual(4, content.results.count())
+
     def test_get_no_results(self):
         request = self.client.get("/api/v1/results")
         self.assertEqual(0, len(request.data["results"]))
@@ -86,6 +122,33 @@ class ResultTestCase(APITestCase):
         self.assertEqual(1, len(request.data["results"]))
         self.assertEqual(result.status, request.data["results"][0]["status"])
 
+    def test_get_results_expanded(self):
+        result = factories.ResultFactory()
+        request = self.client.get("/api/v1/results?expand=task,host")
+        self.assertEqual(result.task.name, request.data["results"][0]["task"]["name"])
+        self.assertEqual(result.task.file.path, request.data["results"][0]["task"]["path"])
+        self.assertEqual(dict(results=1), request.data["results"][0]["task"]["items"])
+        self.assertEqual(result.host.name, request.data["results"][0]["host"]["name"])
+        self.assertEqual(result.play.id, request.data["results"][0]["play"])
+
+        # Related objects are retrieved with a query for each relation, not for each result
+        for index in range(5):
+            factories.ResultFactory(task=result.task, host=factories.HostFactory(name="host %s" % index))
+        with self.assertNumQueries(4):
+            request = self.client.get("/api/v1/results?expand=task,host,unknown")
+        self.assertEqual(6, len(request.data["results"]))
+        self.assertEqual(dict(results=6), request.data["results"][0]["task"]["items"])
+
+    def test_get_results_with_fields(self):
+        result = factories.ResultFactory()
+        request = self.client.get("/api/v1/results?fields=id,status,started")
+        self.assertEqual(["id", "started", "status"], sorted(request.data["results"][0].keys()))
+
+        request = self.client.get("/api/v1/results/%s?exclude=content,playbook" % result.id)
+        self.assertNotIn("content", request.data)
+        self.assertNotIn("playbook", request.data)
+        self.assertEqual(result.task.id, request.data["task"]["id"])
+
     def test_delete_result(self):
         result = factories.ResultFactory()
         self.assertEqual(1, models.Result.objects.all().count())
@@ -93,6 +156,40 @@ class ResultTestCase(APITestCase):
         self.assertEqual(204, request.status_code)
         self.assertEqual(0, models.Result.objects.all().count())
 
+    def test_referenced_content_is_protected(self):
+        result = factories.ResultFactory()
+        with self.assertRaises(ProtectedError):
+            result.content.delete()
+
+    def test_delete_orphans_skips_referenced_contents(self):
+        result = factories.ResultFactory()
+        orphan = factories.ContentFactory(sha1="0" * 40, contents=utils.compressed_obj({"unique": True}))
+        delete_orphans = models.ContentQuerySet._delete_orphans
+
+        # i.e, a result referencing the content was created while it was being deleted
+        def _delete_orphans(queryset, ids):
+            if result.content.id in ids:
+                raise ProtectedError("referenced", [result])
+            return delete_orphans(queryset, ids)
+
+        with mock.patch.object(models.ContentQuerySet, "_delete_orphans", _delete_orphans):
+            self.assertEqual(1, models.Content.objects.delete_orphans([result.content.id, orphan.id]))
+        self.assertTrue(models.Content.objects.filter(id=result.content.id).exists())
+        self.assertFalse(models.Content.objects.filter(id=orphan.id).exists())
+
+    def test_delete_result_with_contents(self):
+        shared = factories.ContentFactory()
+        unique = factories.ContentFactory(sha1="0" * 40, contents=utils.compressed_obj({"unique": True}))
+        result = factories.ResultFactory(content=unique)
+        factories.ResultFactory(content=shared)
+        factories.ResultFactory(content=shared)
+
+        # The content of a result is deleted with it unless other results reference it
+        self.client.delete("/api/v1/results/%s" % result.id)
+        self.assertFalse(models.Content.objects.filter(id=unique.id).exists())
+        self.client.delete("/api/v1/results/%s" % models.Result.objects.first().id)
+        self.assertTrue(models.Content.objects.filter(id=shared.id).exists())
+
     def test_create_result(self):
         host = factories.HostFactory()
         task = factories.TaskFactory()
@@ -289,3 +386,75 @@ class ResultTestCase(APITestCase):
         result = factories.ResultFactory()
         request = self.client.get("/api/v1/results/%s" % result.id)
         self.assertIn("inventory", request.data["playbook"]["arguments"])
+
+    def test_bulk_create_results(self):
+        host = factories.HostFactory()
+        task = factories.TaskFactory()
+        started = timezone.now()
+        ended = started + datetime.timedelta(seconds=5)
+        result = {
+            "content": factories.RESULT_CONTENTS,
+            "status": "ok",
+            "host": host.id,
+            "task": task.id,
+            "play": task.play.id,
+            "playbook": task.playbook.id,
+            "started": started.isoformat(),
+            "ended": ended.isoformat(),
+        }
+        self.assertEqual(0, models.Result.objects.count())
+        request = self.client.post("/api/v1/results/bulk", [result, dict(result, status="failed")])
+        self.assertEqual(201, request.status_code)
+        self.assertEqual(2, request.data["count"])
+        self.assertEqual(2, models.Result.objects.count())
+        self.assertEqual(1, models.Result.objects.filter(status="failed").count())
+
+        # Durations are computed even though save() is bypassed
+        for created in models.Result.objects.all():
+            self.assertEqual(created.duration, ended - started)
+            self.assertEqual(created.content.contents, utils.compressed_obj(factories.RESULT_CONTENTS))
+
+    def test_bulk_create_results_queries(self):
+        host = factories.HostFactory()
+        task = factories.TaskFactory()
+        result = {"status": "ok", "host": host.id, "task": task.id, "play": task.play.id, "playbook": task.playbook.id}
+        # The related objects of the results are retrieved with a query for each model, whatever the number
+        # of results, and the content shared by the results is stored once
+        with self.assertNumQueries(11):
+            request = self.client.post("/api/v1/results/bulk", [dict(result, content={"msg": "bulk"})] * 50)
+        self.assertEqual(201, request.status_code)
+        self.assertEqual(50, models.Result.objects.count())
+
+    def test_bulk_create_results_with_unknown_relation(self):
+        host = factories.HostFactory()
+        task = factories.TaskFactory()
+        result = {"status": "ok", "host": host.id, "task": task.id, "play": task.play.id, "playbook": task.playbook.id}
+        request = self.client.post("/api/v1/results/bulk", [result, dict(result, task=task.id + 1, host="invalid")])
+        self.assertEqual(400, request.status_code)
+        self.assertIn("does not exist", str(request.data[1]["task"]))
+        self.assertIn("Incorrect type", str(request.data[1]["host"]))
+
+    def test_bulk_create_results_with_results_key(self):
+        host = factories.HostFactory()
+        task = factories.TaskFactory()
+        result = {"status": "ok", "host": host.id, "task": task.id, "play": task.play.id, "playbook": task.playbook.id}
+        request = self.client.post("/api/v1/results/bulk", {"results": [result, result, result]})
+        self.assertEqual(201, request.status_code)
+        self.assertEqual(3, request.data["count"])
+        self.assertEqual(3, models.Result.objects.count())
+
+    def test_bulk_create_results_is_atomic(self):
+        host = factories.HostFactory()
+        task = factories.TaskFactory()
+        result = {"status": "ok", "host": host.id, "task": task.id, "play": task.play.id, "playbook": task.playbook.id}
+        invalid = dict(result, host=host.id + 1, content={"invalid": True})
+        request = self.client.post("/api/v1/results/bulk", [result, invalid])
+        self.assertEqual(400, request.status_code)
+        self.assertEqual(0, models.Result.objects.count())
+        # Contents are only stored with the results that reference them
+        sha1 = utils.sha1(json.dumps({"invalid": True}))
+        self.assertFalse(models.Content.objects.filter(sha1=sha1).exists())
+
+    def test_bulk_create_results_without_list(self):
+        request = self.client.post("/api/v1/results/bulk", {"status": "ok"})
+        self.assertEqual(400, request.status_code)
@@ -0,0 +1,133 @@
+#  Copyright (c) 2018 Red Hat, Inc.
+#
+#  This file is part of ARA Records Ansible.
+#
+#  ARA is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  ARA is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with ARA.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import zlib
+
+from django.test import LiveServerTestCase
+
+from ara.api import models
+from ara.api.tests import factories
+from ara.cli.spool import SpoolReplay
+from ara.clients.http import HttpClient
+from ara.clients.spool import AraSpoolClient, SpoolSender, read_journal
+from ara.clients.utils import active_client
+from ara.utils import json
+
+
+class SpoolClientTestCase(LiveServerTestCase):
+    def setUp(self):
+        self.spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spool_dir)
+
+    def _record_playbook(self, client):
+        playbook = client.post(
+            "/api/v1/playbooks",
+            ansible_version="2.9.7",
+            arguments=factories.PLAYBOOK_ARGUMENTS,
+            status="running",
+            path="/path/playbook.yml",
+        )
+        self.assertEqual("spool:1", playbook["id"])
+        play = client.post(
+            "/api/v1/plays", name="play", uuid="5c5f67b9-e63c-6297-80da-000000000005", playbook=playbook["id"]
+        )
+        self.assertEqual("spool:2", play["id"])
+        updated = client.patch("/api/v1/playbooks/%s" % playbook["id"], status="completed")
+        self.assertEqual(dict(id="spool:1", status="completed"), updated)
+
+    def _assert_recorded(self):
+        playbook = models.Playbook.objects.get()
+        self.assertEqual("completed", playbook.status)
+        self.assertEqual(playbook, models.Play.objects.get().playbook)
+
+    def test_spool_client(self):
+        client = AraSpoolClient(endpoint=self.live_server_url, spool_dir=self.spool_dir)
+        self.assertIs(active_client(), client)
+        self._record_playbook(client)
+
+        self.assertTrue(client.close(timeout=10))
+        self._assert_recorded()
+        # The journal is removed once it has been sent
+        self.assertEqual([], os.listdir(self.spool_dir))
+
+    def test_replay(self):
+        # Nothing is listening on the discard port
+        client = AraSpoolClient(endpoint="http://127.0.0.1:9", spool_dir=self.spool_dir, retries=0)
+        self._record_playbook(client)
+        self.assertFalse(client.close(timeout=10))
+        self.assertEqual(0, models.Playbook.objects.count())
+
+        records = list(read_journal(client.journal))
+        self.assertEqual(["post", "post", "patch"], [record["method"] for record in records])
+
+        sender = SpoolSender(HttpClient(endpoint=self.live_server_url), client.journal)
+        self.assertTrue(sender.replay())
+        self.assertEqual(3, sender.sent)
+        self._assert_recorded()
+
+    def test_sender_gave_up(self):
+        client = AraSpoolClient(endpoint="http://127.0.0.1:9", spool_dir=self.spool_dir, retries=0)
+        client.post("/api/v1/labels", name="first")
+        client.sender_thread.join(10)
+        self.assertFalse(client.sender_thread.is_alive())
+
+        # Once the sender has given up, requests are only written to the journal instead of piling up in memory
+        client.post("/api/v1/labels", name="second")
+        client.post("/api/v1/labels", name="third")
+        self.assertEqual(0, client.queue.qsize())
+        self.assertEqual(3, len(list(read_journal(client.journal))))
+        self.assertFalse(client.close(timeout=10))
+
+    def test_read_journal_with_partial_record(self):
+        client = AraSpoolClient(endpoint="http://127.0.0.1:9", spool_dir=self.spool_dir, retries=0)
+        self._record_playbook(client)
+        client.close(timeout=10)
+
+        # A record that was being written when the process was interrupted is ignored
+        with open(client.journal, "ab") as fd:
+            fd.write(b"\x00\x00\x01\x00\x78")
+        self.assertEqual(3, len(list(read_journal(client.journal))))
+
+    def test_replay_command_with_spool_client(self):
+        client = AraSpoolClient(endpoint="http://127.0.0.1:9", spool_dir=self.spool_dir, retries=0)
+        self._record_playbook(client)
+        client.close(timeout=10)
+
+        command = SpoolReplay(None, None)
+        args = command.get_parser("ara spool replay").parse_args(
+            ["--client", "spool", "--server", self.live_server_url, "--spool-dir", self.spool_dir]
+        )
+        command.take_action(args)
+        self._assert_recorded()
+        # The journal was replayed over HTTP rather than spooled in a new journal
+        self.assertEqual([], os.listdir(self.spool_dir))
+
+    def test_replay_keeps_data_that_looks_like_placeholders(self):
+        client = AraSpoolClient(endpoint="http://127.0.0.1:9", spool_dir=self.spool_dir, retries=0)
+        self._record_playbook(client)
+        client.post("/api/v1/records", playbook="spool:1", key="spool:2", value="spool:1", type="text")
+        client.close(timeout=10)
+
+        sender = SpoolSender(HttpClient(endpoint=self.live_server_url), client.journal)
+        self.assertTrue(sender.replay())
+        record = models.Record.objects.get()
+        self.assertEqual(models.Playbook.objects.get(), record.playbook)
+        self.assertEqual("spool:2", record.key)
+        self.assertEqual("spool:1", json.loads(zlib.decompress(record.value)))
@@ -131,6 +131,20 @@ class TaskTestCase(APITestCase):
         task_updated = models.Task.objects.get(id=task.id)
         self.assertEqual("expired", task_updated.status)
 
+    def test_get_tasks_item_counts(self):
+        task = factories.TaskFactory()
+        factories.ResultFactory(task=task)
+        factories.ResultFactory(task=task)
+        for _ in range(5):
+            factories.TaskFactory()
+
+        # Items are counted in the query that retrieves the page, not for each task
+        with self.assertNumQueries(2):
+            request = self.client.get("/api/v1/tasks")
+        self.assertEqual(6, len(request.data["results"]))
+        self.assertEqual(dict(results=2), request.data["results"][-1]["items"])
+        self.assertEqual(dict(results=0), request.data["results"][0]["items"])
+
     def test_get_task(self):
         task = factories.TaskFactory()
         request = self.client.get("/api/v1/tasks/%s" % task.id)
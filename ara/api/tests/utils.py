@@ -16,15 +16,16 @@
 #  along with ARA.  If not, see <http://www.gnu.org/licenses/>.
 
 import hashlib
-import json
 import zlib
 
+from ara.utils import json
+
 
 def compressed_obj(obj):
     """
     Returns a zlib compressed representation of an object
     """
-    return zlib.compress(json.dumps(obj).encode("utf-8"))
+    return zlib.compress(json.dumps(obj))
 
 
 def compressed_str(obj):
@@ -36,6 +37,8 @@ def compressed_str(obj):
 
 def sha1(obj):
     """
-    Returns the sha1 of a compressed string or an object
+    Returns the sha1 of a string or of bytes
     """
-    return hashlib.sha1(obj.encode("utf8")).hexdigest()
+    if isinstance(obj, str):
+        obj = obj.encode("utf8")
+    return hashlib.sha1(obj).hexdigest()
@@ -15,12 +15,74 @@
 #  You should have received a copy of the GNU General Public License
 #  along with ARA.  If not, see <http://www.gnu.org/licenses/>.
 
-from rest_framework import viewsets
+from django.db import transaction
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 
 from ara.api import filters, models, serializers
 
 
-class LabelViewSet(viewsets.ModelViewSet):
+class OptimizedQuerySetMixin(object):
+    """
+    Leaves out of the queries what the serializer of the action doesn't need, see serializers.optimize_queryset.
+    Objects can be listed or retrieved with only some of their fields, i.e. ?fields=id,status,started, or
+    without some of them, i.e. ?exclude=content, and with the related objects in expandable_fields embedded
+    instead of their id, i.e. ?expand=task,host.
+    """
+
+    # Related objects that can be embedded with ?expand= and the serializer they are embedded with
+    expandable_fields = {}
+
+    def get_query_param_list(self, name):
+        # i.e, ?fields=id,status&fields=started
+        values = self.request.query_params.getlist(name)
+        return [item.strip() for value in values for item in value.split(",") if item.strip()]
+
+    def get_expanded_fields(self):
+        if self.action not in ["list", "retrieve"]:
+            return {}
+        return {
+            name: self.expandable_fields[name]
+            for name in self.get_query_param_list("expand")
+            if name in self.expandable_fields
+        }
+
+    def get_requested_fields(self):
+        if self.action not in ["list", "retrieve"]:
+            return None
+        return serializers.requested_fields(
+            self.get_serializer_class(),
+            self.get_query_param_list("fields"),
+            self.get_query_param_list("exclude"),
+            self.get_expanded_fields(),
+        )
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return serializers.optimize_queryset(
+            queryset, self.get_serializer_class(), self.get_requested_fields(), self.get_expanded_fields()
+        )
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        return serializers.select_fields(serializer, self.get_requested_fields(), self.get_expanded_fields())
+
+
+class DeleteContentsMixin(object):
+    """
+    Contents are shared by results and hosts so they aren't deleted along with them: when an
+    object is deleted, the contents that only its results and hosts referenced are deleted as well.
+    """
+
+    def perform_destroy(self, instance):
+        contents = models.Content.objects.referenced_by(instance)
+        with transaction.atomic():
+            instance.delete()
+            models.Content.objects.delete_orphans(contents)
+
+
+class LabelViewSet(OptimizedQuerySetMixin, viewsets.ModelViewSet):
     queryset = models.Label.objects.all()
     filterset_class = filters.LabelFilter
 
@@ -34,14 +96,15 @@ class LabelViewSet(viewsets.ModelViewSet):
             return serializers.LabelSerializer
 
 
-class PlaybookViewSet(viewsets.ModelViewSet):
+class PlaybookViewSet(DeleteContentsMixin, OptimizedQuerySetMixin, viewsets.ModelViewSet):
     filterset_class = filters.PlaybookFilter
 
     def get_queryset(self):
+        queryset = models.Playbook.objects.all()
         statuses = self.request.GET.getlist("status")
         if statuses:
-            return models.Playbook.objects.filter(status__in=statuses).order_by("-id")
-        return models.Playbook.objects.all().order_by("-id")
+            queryset = queryset.filter(status__in=statuses)
+        return queryset.order_by("-id")
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -53,14 +116,15 @@ class PlaybookViewSet(viewsets.ModelViewSet):
             return serializers.PlaybookSerializer
 
 
-class PlayViewSet(viewsets.ModelViewSet):
+class PlayViewSet(DeleteContentsMixin, OptimizedQuerySetMixin, viewsets.ModelViewSet):
     filterset_class = filters.PlayFilter
 
     def get_queryset(self):
+        queryset = models.Play.objects.all()
         statuses = self.request.GET.getlist("status")
         if statuses:
-            return models.Play.objects.filter(status__in=statuses).order_by("-id")
-        return models.Play.objects.all().order_by("-id")
+            queryset = queryset.filter(status__in=statuses)
+        return queryset.order_by("-id")
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -72,14 +136,15 @@ class PlayViewSet(viewsets.ModelViewSet):
             return serializers.PlaySerializer
 
 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(DeleteContentsMixin, OptimizedQuerySetMixin, viewsets.ModelViewSet):
     filterset_class = filters.TaskFilter
 
     def get_queryset(self):
+        queryset = models.Task.objects.all()
         statuses = self.request.GET.getlist("status")
         if statuses:
-            return models.Task.objects.filter(status__in=statuses).order_by("-id")
-        return models.Task.objects.all().order_by("-id")
+            queryset = queryset.filter(status__in=statuses)
+        return queryset.order_by("-id")
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -91,7 +156,7 @@ class TaskViewSet(viewsets.ModelViewSet):
             return serializers.TaskSerializer
 
 
-class HostViewSet(viewsets.ModelViewSet):
+class HostViewSet(DeleteContentsMixin, OptimizedQuerySetMixin, viewsets.ModelViewSet):
     queryset = models.Host.objects.all()
     filterset_class = filters.HostFilter
 
@@ -100,19 +165,59 @@ class HostViewSet(viewsets.ModelViewSet):
             return serializers.ListHostSerializer
         elif self.action == "retrieve":
             return serializers.DetailedHostSerializer
+        elif self.action == "bulk":
+            return serializers.BulkHostSerializer
+        elif self.action == "stats":
+            return serializers.HostStatsSerializer
         else:
             # create/update/destroy
             return serializers.HostSerializer
 
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        """
+        Gets or creates the hosts of a playbook by name in a single request.
+        The payload is an object with the id of the playbook under the "playbook"
+        key and a list of host names under the "hosts" key.
+        Returns the id of every host by name under the "hosts" key.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # Creating hosts that already exist is a no-op so this doesn't need a transaction, which would be held
+        # from the first read and prevent waiting on other writers with sqlite ("database is locked").
+        hosts = serializer.save()
+        return Response({"count": len(hosts), "hosts": hosts}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["post"])
+    def stats(self, request):
+        """
+        Updates the statistics of the hosts of a playbook in a single request and transaction.
+        The payload is an object with the id of the playbook under the "playbook" key and
+        the statistics of each host by name under the "stats" key, i.e.
+        {"playbook": 1, "stats": {"localhost": {"changed": 1, "failures": 0, "ok": 2, "skipped": 0, "unreachable": 0}}}
+        Hosts that don't exist yet are created. Returns the id of every host by name under the "hosts" key.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        hosts = serializer.save()
+        return Response({"count": len(hosts), "hosts": hosts}, status=status.HTTP_200_OK)
+
 
-class ResultViewSet(viewsets.ModelViewSet):
+class ResultViewSet(DeleteContentsMixin, OptimizedQuerySetMixin, viewsets.ModelViewSet):
     filterset_class = filters.ResultFilter
+    expandable_fields = {
+        "playbook": serializers.SimplePlaybookSerializer,
+        "play": serializers.SimplePlaySerializer,
+        "task": serializers.SimpleTaskSerializer,
+        "host": serializers.SimpleHostSerializer,
+    }
 
     def get_queryset(self):
+        queryset = models.Result.objects.all()
         statuses = self.request.GET.getlist("status")
         if statuses:
-            return models.Result.objects.filter(status__in=statuses).order_by("-id")
-        return models.Result.objects.all().order_by("-id")
+            queryset = queryset.filter(status__in=statuses)
+        return queryset.order_by("-id")
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -120,11 +225,28 @@ class ResultViewSet(viewsets.ModelViewSet):
         elif self.action == "retrieve":
             return serializers.DetailedResultSerializer
         else:
-            # create/update/destroy
+            # create/update/destroy/bulk
             return serializers.ResultSerializer
 
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        """
+        Creates many results in a single request and transaction.
+        The payload is either a list of results or an object with a list of
+        results under the "results" key.
+        """
+        data = request.data
+        if isinstance(data, dict):
+            data = data.get("results")
+
+        serializer = self.get_serializer(data=data, many=True)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            results = serializer.save()
+        return Response({"count": len(results)}, status=status.HTTP_201_CREATED)
 
-class FileViewSet(viewsets.ModelViewSet):
+
+class FileViewSet(DeleteContentsMixin, OptimizedQuerySetMixin, viewsets.ModelViewSet):
     queryset = models.File.objects.all()
     filterset_class = filters.FileFilter
 
@@ -133,12 +255,25 @@ class FileViewSet(viewsets.ModelViewSet):
             return serializers.ListFileSerializer
         elif self.action == "retrieve":
             return serializers.DetailedFileSerializer
+        elif self.action == "sha1":
+            return serializers.FileContentSha1Serializer
         else:
             # create/update/destroy
             return serializers.FileSerializer
 
+    @action(detail=False, methods=["post"])
+    def sha1(self, request):
+        """
+        Returns which of the file content sha1s given under the "sha1" key are known by the server
+        under the "sha1" key. Files with a known content can be created with "content_sha1" instead
+        of their content.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({"sha1": serializer.save()}, status=status.HTTP_200_OK)
+
 
-class RecordViewSet(viewsets.ModelViewSet):
+class RecordViewSet(OptimizedQuerySetMixin, viewsets.ModelViewSet):
     queryset = models.Record.objects.all()
     filterset_class = filters.RecordFilter
 
@@ -5,11 +5,12 @@ import logging
 import os
 import sys
 
-import pbr.version
 from cliff.app import App
 from cliff.commandmanager import CommandManager
 
-CLIENT_VERSION = pbr.version.VersionInfo("ara").release_string()
+from ara.utils.version import get_version
+
+CLIENT_VERSION = get_version()
 log = logging.getLogger(__name__)
 
 
@@ -19,7 +20,7 @@ def global_arguments(parser):
         "--client",
         metavar="<client>",
         default=os.environ.get("ARA_API_CLIENT", "offline"),
-        help=("API client to use, defaults to ARA_API_CLIENT or 'offline'"),
+        help=("API client to use ('offline', 'direct' or 'http'), defaults to ARA_API_CLIENT or 'offline'"),
     )
     parser.add_argument(
         "--server",
@@ -0,0 +1,74 @@
+# Copyright (c) 2020 The ARA Records Ansible authors
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import glob
+import logging
+import os
+import sys
+
+from cliff.command import Command
+
+from ara.cli.base import global_arguments
+from ara.clients.spool import DEFAULT_SPOOL_DIR, SpoolSender, lock_journal
+from ara.clients.utils import get_client
+
+
+class SpoolReplay(Command):
+    """ Sends the journals left in the spool directory to the API server """
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super(SpoolReplay, self).get_parser(prog_name)
+        parser = global_arguments(parser)
+        # fmt: off
+        parser.add_argument(
+            "journals",
+            metavar="<journal>",
+            nargs="*",
+            help="Journals to replay, defaults to every journal in the spool directory",
+        )
+        parser.add_argument(
+            "--spool-dir",
+            metavar="<directory>",
+            default=os.environ.get("ARA_SPOOL_DIR", DEFAULT_SPOOL_DIR),
+            help=("Directory where journals are spooled, defaults to ARA_SPOOL_DIR or '%s'" % DEFAULT_SPOOL_DIR),
+        )
+        # fmt: on
+        return parser
+
+    def take_action(self, args):
+        # The records are sent as-is so we need a client that talks HTTP to the API.
+        # With the spool client, they are sent with the http client rather than spooled again.
+        client_name = "http" if args.client == "spool" else args.client
+        if client_name not in ("offline", "http"):
+            self.log.error("Journals can only be replayed with the 'offline', 'http' or 'spool' clients")
+            sys.exit(1)
+
+        client = get_client(
+            client=client_name,
+            endpoint=args.server,
+            timeout=args.timeout,
+            username=args.username,
+            password=args.password,
+            verify=False if args.insecure else True,
+        )
+
+        journals = args.journals or sorted(glob.glob(os.path.join(os.path.expanduser(args.spool_dir), "*.journal")))
+        for journal in journals:
+            with open(journal, "rb") as fd:
+                # The journal is still being written to or replayed by someone else
+                if not lock_journal(fd):
+                    self.log.info("Skipping %s, it is in use" % journal)
+                    continue
+
+                sender = SpoolSender(client.client, journal)
+                start = sender.sent
+                if not sender.replay():
+                    self.log.error(
+                        "Stopped replaying %s after %s record(s), the API server could not be reached"
+                        % (journal, sender.sent)
+                    )
+                    sys.exit(1)
+                sender.remove()
+            self.log.info("Replayed %s record(s) from %s" % (sender.sent - start, journal))
@@ -0,0 +1,204 @@
+#  Copyright (c) 2018 Red Hat, Inc.
+#
+#  This file is part of ARA: Ansible Run Analysis.
+#
+#  ARA is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  ARA is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with ARA.  If not, see <http://www.gnu.org/licenses/>.
+
+# This is an API client that calls the API views in-process: like the "offline"
+# client, it does not require standing up an API server and, unlike it, it does
+# not involve HTTP at all so it doesn't need requests either.
+
+import base64
+import logging
+import os
+import pkgutil
+import weakref
+from collections import namedtuple
+
+from ara.clients.utils import active_client, decode_raw_json
+from ara.setup.exceptions import MissingDjangoException
+
+try:
+    import django  # noqa: F401
+except ImportError as e:
+    raise MissingDjangoException from e
+
+# The credentials of the direct client, like the requests.auth.HTTPBasicAuth the other clients take
+Credentials = namedtuple("Credentials", ["username", "password"])
+
+
+def setup_django(run_sql_migrations=True):
+    from django import setup as django_setup
+    from django.core.management import execute_from_command_line
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ara.server.settings")
+
+    # Set up the things Django needs
+    django_setup()
+
+    if run_sql_migrations and not migrations_applied():
+        # Automatically create the database and run migrations
+        execute_from_command_line(["django", "migrate"])
+
+
+def migrations_applied():
+    """
+    Returns whether the migrations found on disk for the installed apps are all recorded as applied
+    in the database. This is much faster than loading every migration like the migrate command does.
+    """
+    from django.apps import apps
+    from django.db import DatabaseError, connection
+    from django.db.migrations.recorder import MigrationRecorder
+
+    expected = set()
+    for app_config in apps.get_app_configs():
+        path = os.path.join(app_config.path, "migrations")
+        if not os.path.isdir(path):
+            continue
+        # Migrations are the modules that don't start with "_" or "~", like for Django's MigrationLoader
+        for _, name, is_pkg in pkgutil.iter_modules([path]):
+            if not is_pkg and name[0] not in "_~":
+                expected.add((app_config.label, name))
+
+    try:
+        applied = set(MigrationRecorder(connection).applied_migrations())
+    except DatabaseError:
+        return False
+    return expected <= applied
+
+
+class AraDirectClient(object):
+    """
+    An offline client that dispatches requests to the API views in-process.
+    Unlike AraOfflineClient, there is no loopback HTTP server involved: payloads
+    are handed to the views as python objects and responses are returned
+    before they are rendered so there is no JSON encoding or decoding either.
+    """
+
+    def __init__(self, auth=None, run_sql_migrations=True):
+        self.log = logging.getLogger(__name__)
+        self.auth = auth
+        setup_django(run_sql_migrations=run_sql_migrations)
+
+        self.headers = {}
+        if self.auth is not None:
+            credentials = "%s:%s" % (self.auth.username, self.auth.password)
+            token = base64.b64encode(credentials.encode("utf8")).decode("ascii")
+            self.headers["HTTP_AUTHORIZATION"] = "Basic %s" % token
+
+        self.pid = os.getpid()
+        self.views = {}
+        self.inherited_connections = []
+        active_client._instance = weakref.ref(self)
+
+    def _get_view(self, match):
+        # Wraps the viewset resolved from the URL so the payload is given to the view as-is instead of being parsed
+        key = (match.func.cls, tuple(sorted(match.func.actions.items())))
+        if key not in self.views:
+            viewset = type("Direct%s" % match.func.cls.__name__, (DirectPayloadMixin, match.func.cls), {})
+            self.views[key] = viewset.as_view(match.func.actions, **match.func.initkwargs)
+        return self.views[key]
+
+    def _set_aside_inherited_connections(self):
+        """
+        Ansible forks worker processes which can end up using this client (i.e, ara_record).
+        Database connections can't be shared across processes: set the ones inherited from the
+        parent process aside without closing them so the parent can keep using them.
+        """
+        from django.db import connections
+
+        for connection in connections.all():
+            if connection.connection is not None:
+                self.inherited_connections.append(connection.connection)
+                connection.connection = None
+        self.pid = os.getpid()
+
+    def _dispatch(self, request):
+        from django.urls import resolve
+
+        match = resolve(request.path_info)
+        return self._get_view(match)(request, *match.args, **match.kwargs)
+
+    def _request(self, method, url, params=None, payload=None):
+        from django.core.handlers.exception import convert_exception_to_response
+        from django.http import HttpRequest, QueryDict
+
+        if os.getpid() != self.pid:
+            self._set_aside_inherited_connections()
+
+        path, _, query = url.partition("?")
+        request = HttpRequest()
+        request.method = method.upper()
+        request.path = request.path_info = path
+        request.META.update(SERVER_NAME="localhost", SERVER_PORT="80", **self.headers)
+        request.GET = QueryDict(query, mutable=True)
+        for key, value in (params or {}).items():
+            if isinstance(value, (list, tuple)):
+                request.GET.setlist(key, [str(item) for item in value])
+            else:
+                request.GET[key] = str(value)
+        request.payload = decode_raw_json(payload) if payload is not None else None
+
+        # Unhandled exceptions are logged and turned into responses like they would be by the API server
+        response = convert_exception_to_response(self._dispatch)(request)
+
+        if response.status_code >= 500:
+            self.log.error("Failed to {method} on {url}: {content}".format(method=method, url=url, content=payload))
+
+        self.log.debug("HTTP {status}: {method} on {url}".format(status=response.status_code, method=method, url=url))
+
+        if response.status_code not in [200, 201, 204]:
+            self.log.error("Failed to {method} on {url}: {content}".format(method=method, url=url, content=payload))
+
+        if response.status_code == 204:
+            return response
+
+        # Errors that don't come from the API views (i.e, unhandled exceptions) are plain Django responses
+        return to_builtins(getattr(response, "data", None))
+
+    def get(self, endpoint, **kwargs):
+        return self._request("get", endpoint, params=kwargs)
+
+    def patch(self, endpoint, **kwargs):
+        return self._request("patch", endpoint, payload=kwargs)
+
+    def post(self, endpoint, **kwargs):
+        return self._request("post", endpoint, payload=kwargs)
+
+    def put(self, endpoint, **kwargs):
+        return self._request("put", endpoint, payload=kwargs)
+
+    def delete(self, endpoint, **kwargs):
+        return self._request("delete", endpoint)
+
+
+def to_builtins(data):
+    """
+    Converts the ReturnDict, ReturnList and OrderedDict instances of unrendered
+    responses to the dicts and lists one would get from decoding JSON.
+    """
+    if isinstance(data, dict):
+        return {key: to_builtins(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [to_builtins(value) for value in data]
+    return data
+
+
+class DirectPayloadMixin(object):
+    def initialize_request(self, request, *args, **kwargs):
+        drf_request = super().initialize_request(request, *args, **kwargs)
+        if request.payload is not None:
+            # The payload is already a python object, skip parsing the (empty) request body
+            drf_request._full_data = request.payload
+        return drf_request
@@ -18,43 +18,101 @@
 # This is an "offline" API client that does not require standing up
 # an API server and does not execute actual HTTP calls.
 
-import json
+import gzip
 import logging
+import threading
 import weakref
+import zlib
 
-import pbr.version
 import requests
 
-from ara.clients.utils import active_client
-
-CLIENT_VERSION = pbr.version.VersionInfo("ara").release_string()
+from ara.clients.utils import active_client, encode_json
+from ara.utils import json
+from ara.utils.version import get_version
 
 
 class HttpClient(object):
-    def __init__(self, endpoint="http://127.0.0.1:8000", auth=None, timeout=30, verify=True):
+    def __init__(
+        self,
+        endpoint="http://127.0.0.1:8000",
+        auth=None,
+        timeout=30,
+        verify=True,
+        pool_connections=10,
+        pool_maxsize=10,
+        pool_block=False,
+        keep_alive=True,
+        compression=None,
+        compression_threshold=1024,
+    ):
         self.log = logging.getLogger(__name__)
 
         self.endpoint = endpoint.rstrip("/")
         self.auth = auth
         self.timeout = int(timeout)
         self.verify = verify
+        self.pool_maxsize = int(pool_maxsize)
+        if compression not in (None, "gzip", "deflate"):
+            raise ValueError("Unsupported compression: %s (use 'gzip' or 'deflate')" % compression)
+        self.compression = compression
+        self.compression_threshold = int(compression_threshold)
         self.headers = {
-            "User-Agent": "ara-http-client_%s" % CLIENT_VERSION,
+            "User-Agent": "ara-http-client_%s" % get_version(),
             "Accept": "application/json",
             "Content-Type": "application/json",
         }
+        if not keep_alive:
+            self.headers["Connection"] = "close"
         self.http = requests.Session()
         self.http.headers.update(self.headers)
         if self.auth is not None:
             self.http.auth = self.auth
         self.http.verify = self.verify
 
+        # pool_connections is the number of hosts to keep a pool of connections for
+        # and pool_maxsize is the number of connections kept for each of them.
+        # When pool_block is enabled, no more than pool_maxsize connections are opened to a host at once.
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=int(pool_connections), pool_maxsize=self.pool_maxsize, pool_block=pool_block
+        )
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+
+        # Counters to help figure out if the connection pool is large enough.
+        # A request is counted in pool_exhausted when every pooled connection was already in use:
+        # it had to wait for one (pool_block) or to use a connection that is discarded afterwards.
+        self.stats = dict(requests=0, in_flight=0, max_in_flight=0, pool_exhausted=0)
+        self._stats_lock = threading.Lock()
+
     def _request(self, method, url, **payload):
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            self.stats["in_flight"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+            if self.stats["in_flight"] > self.pool_maxsize:
+                self.stats["pool_exhausted"] += 1
+
         # Use requests.Session to do the query
         # The actual endpoint is:
         # <endpoint>              <url>
         # http://127.0.0.1:8000 / api/v1/playbooks
-        return self.http.request(method, self.endpoint + url, timeout=self.timeout, **payload)
+        try:
+            return self.http.request(method, self.endpoint + url, timeout=self.timeout, **payload)
+        finally:
+            with self._stats_lock:
+                self.stats["in_flight"] -= 1
+
+    def _encode(self, payload):
+        # Bodies above the threshold are compressed when compression is enabled
+        data = encode_json(payload)
+        if self.compression is None or len(data) < self.compression_threshold:
+            return dict(data=data)
+
+        if self.compression == "gzip":
+            data = gzip.compress(data)
+        else:
+            data = zlib.compress(data)
+        return dict(data=data, headers={"Content-Encoding": self.compression})
 
     def get(self, url, **payload):
         if payload:
@@ -63,28 +121,55 @@ class HttpClient(object):
             return self._request("get", url)
 
     def patch(self, url, **payload):
-        return self._request("patch", url, data=json.dumps(payload))
+        return self._request("patch", url, **self._encode(payload))
 
     def post(self, url, **payload):
-        return self._request("post", url, data=json.dumps(payload))
+        return self._request("post", url, **self._encode(payload))
 
     def put(self, url, **payload):
-        return self._request("put", url, data=json.dumps(payload))
+        return self._request("put", url, **self._encode(payload))
 
     def delete(self, url):
         return self._request("delete", url)
 
 
 class AraHttpClient(object):
-    def __init__(self, endpoint="http://127.0.0.1:8000", auth=None, timeout=30, verify=True):
+    def __init__(
+        self,
+        endpoint="http://127.0.0.1:8000",
+        auth=None,
+        timeout=30,
+        verify=True,
+        pool_connections=10,
+        pool_maxsize=10,
+        pool_block=False,
+        keep_alive=True,
+        compression=None,
+        compression_threshold=1024,
+    ):
         self.log = logging.getLogger(__name__)
         self.endpoint = endpoint
         self.auth = auth
         self.timeout = int(timeout)
         self.verify = verify
-        self.client = HttpClient(endpoint=self.endpoint, timeout=self.timeout, auth=self.auth, verify=self.verify)
+        self.client = HttpClient(
+            endpoint=self.endpoint,
+            timeout=self.timeout,
+            auth=self.auth,
+            verify=self.verify,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            keep_alive=keep_alive,
+            compression=compression,
+            compression_threshold=compression_threshold,
+        )
         active_client._instance = weakref.ref(self)
 
+    @property
+    def stats(self):
+        return dict(self.client.stats)
+
     def _request(self, method, url, **kwargs):
         func = getattr(self.client, method)
         if method == "delete":
@@ -103,7 +188,7 @@ class AraHttpClient(object):
         if response.status_code == 204:
             return response
 
-        return response.json()
+        return json.loads(response.content)
 
     def get(self, endpoint, **kwargs):
         return self._request("get", endpoint, params=kwargs)
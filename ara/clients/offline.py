@@ -19,9 +19,12 @@
 # an API server and does not execute actual HTTP calls.
 
 import logging
-import os
+import queue
 import threading
+import time
+from concurrent.futures import Future
 
+from ara.clients.direct import setup_django
 from ara.clients.http import AraHttpClient
 from ara.setup.exceptions import MissingDjangoException
 
@@ -33,26 +36,21 @@ except ImportError as e:
 
 
 class AraOfflineClient(AraHttpClient):
-    def __init__(self, auth=None, run_sql_migrations=True):
+    def __init__(self, auth=None, run_sql_migrations=True, transaction_size=0, transaction_timeout=1000, **kwargs):
         self.log = logging.getLogger(__name__)
+        setup_django(run_sql_migrations=run_sql_migrations)
 
-        from django import setup as django_setup
-        from django.core.management import execute_from_command_line
-
-        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ara.server.settings")
-
-        if run_sql_migrations:
-            # Automatically create the database and run migrations (is there a better way?)
-            execute_from_command_line(["django", "migrate"])
-
-        # Set up the things Django needs
-        django_setup()
+        # When transaction_size is set, requests are handled by a single writer that groups them in transactions
+        self.writer = None
+        if transaction_size:
+            self.writer = SingleWriter(transaction_size, transaction_timeout)
 
         self._start_server()
-        super().__init__(endpoint="http://localhost:%d" % self.server_thread.port, auth=auth)
+        # kwargs are connection pool and compression settings for the HTTP client, see AraHttpClient
+        super().__init__(endpoint="http://localhost:%d" % self.server_thread.port, auth=auth, **kwargs)
 
     def _start_server(self):
-        self.server_thread = ServerThread("localhost")
+        self.server_thread = ServerThread("localhost", writer=self.writer)
         self.server_thread.start()
 
         # Wait for the live server to be ready
@@ -60,11 +58,156 @@ class AraOfflineClient(AraHttpClient):
         if self.server_thread.error:
             raise self.server_thread.error
 
+    def commit(self):
+        """
+        Commits the requests that have been handled so far so that other processes can see them.
+        """
+        if self.writer is not None:
+            self.writer.commit()
+
+    def close(self):
+        """
+        Commits the requests that have been handled so far and stops the single writer, if any.
+        Requests that come after are handled one transaction at a time.
+        """
+        if self.writer is not None:
+            self.writer.close()
+
+
+class SingleWriter(object):
+    """
+    Handles requests one at a time in a thread of its own so that there is a single
+    connection writing to the database, i.e. no "database is locked" with sqlite
+    when the callback uses threads. Requests are grouped in a transaction that is
+    committed every <size> requests or <timeout> milliseconds after the first one,
+    whichever comes first, instead of one transaction per request.
+    Each request gets a savepoint so that a request that fails doesn't affect the others:
+    it is rolled back when the request raises or marks it for rollback, see SingleWriterWSGIHandler.
+    """
+
+    # Put on the queue to commit right away
+    COMMIT = object()
+
+    def __init__(self, size, timeout=1000):
+        self.log = logging.getLogger(__name__)
+        self.size = size
+        self.timeout = timeout / 1000
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Runs func in the writer thread and returns its result once it has run, before it is committed.
+        """
+        if not self.thread.is_alive():
+            return func(*args, **kwargs)
+        future = Future()
+        self.queue.put((future, func, args, kwargs))
+        return future.result()
+
+    def commit(self):
+        if self.thread.is_alive():
+            future = Future()
+            self.queue.put((future, self.COMMIT, (), {}))
+            future.result()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        from django.db import DatabaseError, connection, transaction
+
+        if connection.vendor == "sqlite":
+            # Lets other processes (i.e, the API server) read the database while the writer has a transaction open
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA journal_mode=WAL")
+
+            # Transactions take the write lock as they begin so that other writers wait for it instead of failing
+            # with "database is locked" when they try to write after reading, like "transaction_mode" in Django 5.1.
+            def begin_immediate():
+                connection.cursor().execute("BEGIN IMMEDIATE")
+
+            connection._start_transaction_under_autocommit = begin_immediate
+
+        closed = False
+        while not closed:
+            item = self.queue.get()
+            if item is None:
+                break
+            committed = None
+            try:
+                with transaction.atomic():
+                    closed, committed = self._run_transaction(item)
+            except DatabaseError as e:
+                self.log.error("Failed to commit the requests of the offline client: %s" % e)
+            if committed is not None:
+                committed.set_result(None)
+
+        if connection.vendor == "sqlite":
+            # Once the writer is done, the database can be copied and read without the WAL files
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode=DELETE")
+            except DatabaseError as e:
+                self.log.debug("Unable to leave WAL mode: %s" % e)
+        connection.close()
+
+    def _run_transaction(self, item):
+        # Returns whether the writer was closed during the transaction and the future of a commit request, if any
+        from django.db import transaction
+
+        deadline = time.monotonic() + self.timeout
+        for count in range(self.size):
+            if count:
+                try:
+                    item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    return True, None
+
+            future, func, args, kwargs = item
+            if func is self.COMMIT:
+                return False, future
+            try:
+                with transaction.atomic():
+                    result = func(*args, **kwargs)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+        return False, None
+
+
+class SingleWriterWSGIHandler(WSGIHandler):
+    def __init__(self, writer, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.writer = writer
+
+    def get_response(self, request):
+        # Only the response is made by the writer: the request_started signal that closes database
+        # connections which are in a transaction is sent from the thread of the request.
+        return self.writer.submit(self._get_response_or_roll_back, request)
+
+    def _get_response_or_roll_back(self, request):
+        from django.db import transaction
+
+        # Exceptions are turned into server errors by Django before they reach the writer: roll back
+        # the savepoint of the request so that what it did, or a database error that aborted the
+        # transaction (i.e, with PostgreSQL), doesn't end up in the transaction of the other requests.
+        response = super().get_response(request)
+        if response.status_code >= 500:
+            transaction.set_rollback(True)
+        return response
+
 
 class ServerThread(threading.Thread):
-    def __init__(self, host, port=0):
+    def __init__(self, host, port=0, writer=None):
         self.host = host
         self.port = port
+        self.writer = writer
         self.is_ready = threading.Event()
         self.error = None
         super().__init__(daemon=True)
@@ -80,7 +223,10 @@ class ServerThread(threading.Thread):
             # If binding to port zero, assign the port allocated by the OS.
             if self.port == 0:
                 self.port = self.httpd.server_address[1]
-            self.httpd.set_app(WSGIHandler())
+            if self.writer is not None:
+                self.httpd.set_app(SingleWriterWSGIHandler(self.writer))
+            else:
+                self.httpd.set_app(WSGIHandler())
             self.is_ready.set()
             self.httpd.serve_forever()
         except Exception as e:
@@ -0,0 +1,286 @@
+# Copyright (c) 2020 The ARA Records Ansible authors
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# This is an API client that doesn't wait on the API server: requests are
+# appended to a journal on disk and sent to the server by a background thread.
+# Journals that could not be sent entirely are left in the spool directory
+# where they can be sent later with "ara spool replay".
+
+import datetime
+import fcntl
+import logging
+import os
+import queue
+import re
+import struct
+import threading
+import time
+import weakref
+import zlib
+
+import requests
+
+from ara.clients.http import AraHttpClient
+from ara.clients.utils import active_client, encode_json
+from ara.utils import json
+
+DEFAULT_SPOOL_DIR = os.path.expanduser("~/.ara/spool")
+
+# Objects created through the spool client get a placeholder id until the
+# server has assigned them a real one, i.e. "spool:12" for the 12th record.
+# Placeholders are only resolved in the path of urls and in the fields that refer to
+# other objects: the data that is recorded is sent as-is even if it looks like one.
+PLACEHOLDER = re.compile(r"spool:(\d+)")
+PLACEHOLDER_SEGMENT = re.compile(r"(?<=/)spool:(\d+)(?=/|$)")
+RELATED_FIELDS = ("playbook", "play", "task", "host", "file")
+
+# Records are stored as a 4-byte length followed by zlib-compressed JSON
+RECORD_HEADER = struct.Struct(">I")
+
+
+def write_record(fd, record):
+    data = zlib.compress(encode_json(record))
+    fd.write(RECORD_HEADER.pack(len(data)) + data)
+
+
+def read_journal(path):
+    """
+    Yields the records of a journal in the order they were written.
+    A record at the end of the journal that was only partially written is ignored.
+    """
+    with open(path, "rb") as fd:
+        while True:
+            header = fd.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            (length,) = RECORD_HEADER.unpack(header)
+            data = fd.read(length)
+            if len(data) < length:
+                return
+            yield json.loads(zlib.decompress(data))
+
+
+def lock_journal(fd):
+    """
+    Journals are locked while they are written to or replayed so they are never sent twice at once.
+    Returns False if the journal is already locked.
+    """
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+class SpoolSender(object):
+    """
+    Sends the records of a journal to the API server, in order.
+    The ids assigned by the server to the objects created by the records are
+    kept so that the placeholders in the records that follow can be resolved.
+    Progress is saved next to the journal so it can be resumed where it stopped.
+    """
+
+    def __init__(self, client, journal, retries=3):
+        self.log = logging.getLogger(__name__)
+        self.client = client
+        self.journal = journal
+        self.progress = journal + ".progress"
+        self.retries = retries
+        self.lock = threading.Lock()
+
+        self.sent = 0
+        self.ids = {}
+        if os.path.exists(self.progress):
+            with open(self.progress, "rb") as fd:
+                progress = json.loads(fd.read())
+            self.sent = progress["sent"]
+            self.ids = progress["ids"]
+
+    def save_progress(self):
+        with self.lock:
+            progress = json.dumps(dict(sent=self.sent, ids=self.ids))
+        with open(self.progress + ".tmp", "wb") as fd:
+            fd.write(progress)
+        os.replace(self.progress + ".tmp", self.progress)
+
+    def remove(self):
+        for path in [self.journal, self.progress]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _resolve(self, value):
+        match = PLACEHOLDER.fullmatch(value) if isinstance(value, str) else None
+        if match is not None:
+            return self.ids.get(match.group(1), value)
+        return value
+
+    def _resolve_payload(self, payload):
+        # Bulk results refer to other objects the same way single results do
+        resolved = dict(payload)
+        for field in RELATED_FIELDS:
+            if field in resolved:
+                resolved[field] = self._resolve(resolved[field])
+        if isinstance(resolved.get("results"), list):
+            resolved["results"] = [
+                self._resolve_payload(item) if isinstance(item, dict) else item for item in resolved["results"]
+            ]
+        return resolved
+
+    def send(self, record):
+        """
+        Sends a record to the server and returns True when the record has been dealt with.
+        Records that are refused by the server (4xx) are logged and skipped.
+        Returns False if the server could not be reached or returned errors (5xx) after retrying.
+        """
+        url = PLACEHOLDER_SEGMENT.sub(lambda match: str(self.ids.get(match.group(1), match.group(0))), record["url"])
+        payload = self._resolve_payload(record["payload"])
+        func = getattr(self.client, record["method"])
+
+        response = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(2 ** (attempt - 1))
+            try:
+                response = func(url) if record["method"] == "delete" else func(url, **payload)
+            except requests.exceptions.RequestException as e:
+                self.log.warning("Failed to {method} on {url}: {error}".format(error=e, **record))
+                continue
+            if response.status_code < 500:
+                break
+            self.log.warning("HTTP {status}: {method} on {url}".format(status=response.status_code, **record))
+        else:
+            return False
+
+        self.log.debug("HTTP {status}: {method} on {url}".format(status=response.status_code, **record))
+        created = None
+        if response.status_code >= 400:
+            self.log.error("Skipping spooled {method} on {url}: {content}".format(content=response.text, **record))
+        elif record["method"] == "post" and response.status_code != 204:
+            created = json.loads(response.content).get("id")
+
+        with self.lock:
+            if created is not None:
+                self.ids[str(record["id"])] = created
+            self.sent += 1
+        return True
+
+    def replay(self):
+        """
+        Sends the records that haven't been sent yet.
+        Returns True if the whole journal was sent, otherwise progress is saved and False is returned.
+        """
+        for index, record in enumerate(read_journal(self.journal)):
+            if index < self.sent:
+                continue
+            if not self.send(record):
+                self.save_progress()
+                return False
+        return True
+
+
+class AraSpoolClient(object):
+    """
+    An HTTP client that appends write requests (post, patch, put and delete)
+    to a journal in the spool directory and returns right away while a
+    background thread sends them to the API server.
+    Read requests (get) are sent to the API server directly and only see what
+    has already been sent.
+    """
+
+    def __init__(
+        self, endpoint="http://127.0.0.1:8000", auth=None, timeout=30, verify=True, spool_dir=None, retries=3, **kwargs
+    ):
+        self.log = logging.getLogger(__name__)
+        # kwargs are connection pool and compression settings for the HTTP client, see AraHttpClient
+        self.http = AraHttpClient(endpoint=endpoint, auth=auth, timeout=timeout, verify=verify, **kwargs)
+
+        self.spool_dir = os.path.expanduser(spool_dir or DEFAULT_SPOOL_DIR)
+        os.makedirs(self.spool_dir, exist_ok=True)
+        timestamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S.%f")
+        self.journal = os.path.join(self.spool_dir, "%s-%s.journal" % (timestamp, os.getpid()))
+        self.journal_fd = open(self.journal, "ab")
+        lock_journal(self.journal_fd)
+
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.sequence = 0
+        self.sending = True
+        self.queue = queue.Queue()
+        self.sender = SpoolSender(self.http.client, self.journal, retries=retries)
+        self.sender_thread = threading.Thread(target=self._send, daemon=True)
+        self.sender_thread.start()
+        active_client._instance = weakref.ref(self)
+
+    def _send(self):
+        saved = time.monotonic()
+        while True:
+            record = self.queue.get()
+            if record is None:
+                return
+            if not self.sender.send(record):
+                self.log.error("Unable to send spooled requests to the API server, they are kept in %s" % self.journal)
+                # The records that weren't sent are in the journal, let go of those that are queued and stop queueing
+                with self.lock:
+                    self.sending = False
+                    self.queue = queue.Queue()
+                return
+            # Save progress once in a while so a run that is interrupted doesn't have to be replayed from the start
+            if self.queue.empty() and time.monotonic() - saved > 5:
+                self.sender.save_progress()
+                saved = time.monotonic()
+
+    def _write(self, method, url, payload):
+        if os.getpid() != self.pid:
+            # Forked processes (i.e, ara_record) don't have the sender thread, send their requests directly
+            return getattr(self.http, method)(url, **payload)
+
+        with self.lock:
+            self.sequence += 1
+            record = dict(id=self.sequence, method=method, url=url, payload=payload)
+            write_record(self.journal_fd, record)
+            self.journal_fd.flush()
+            if self.sending:
+                self.queue.put(record)
+
+        if method == "post":
+            return dict(payload, id="spool:%s" % record["id"])
+        if method == "delete":
+            return None
+        return dict(payload, id=url.rstrip("/").split("/")[-1])
+
+    def close(self, timeout=30):
+        """
+        Waits up to <timeout> seconds for the journal to be sent to the API server.
+        If it couldn't be sent entirely, it is left in the spool directory for "ara spool replay".
+        """
+        with self.lock:
+            self.queue.put(None)
+        self.sender_thread.join(timeout)
+
+        if not self.sender_thread.is_alive() and self.sender.sent == self.sequence:
+            self.journal_fd.close()
+            self.sender.remove()
+            return True
+
+        self.sender.save_progress()
+        self.journal_fd.close()
+        self.log.warning(
+            "%s of %s spooled requests were sent to the API server, "
+            "use 'ara spool replay' to send the rest from %s" % (self.sender.sent, self.sequence, self.journal)
+        )
+        return False
+
+    def get(self, endpoint, **kwargs):
+        return self.http.get(endpoint, **kwargs)
+
+    def patch(self, endpoint, **kwargs):
+        return self._write("patch", endpoint, kwargs)
+
+    def post(self, endpoint, **kwargs):
+        return self._write("post", endpoint, kwargs)
+
+    def put(self, endpoint, **kwargs):
+        return self._write("put", endpoint, kwargs)
+
+    def delete(self, endpoint, **kwargs):
+        return self._write("delete", endpoint, {})
@@ -15,7 +15,53 @@
 #  You should have received a copy of the GNU General Public License
 #  along with ARA.  If not, see <http://www.gnu.org/licenses/>.
 
-from requests.auth import HTTPBasicAuth
+import re
+import uuid
+
+from ara.utils import json
+
+
+class RawJSON(bytes):
+    """
+    A value that is already encoded as UTF-8 JSON, i.e. the content of a result
+    serialized by the callback. encode_json inserts it as-is instead of encoding it again.
+    """
+
+
+def encode_json(obj):
+    """
+    Returns obj encoded as UTF-8 JSON where RawJSON values are inserted without being decoded and encoded again.
+    """
+    raw = []
+    marker = "\x00ara-raw-%s" % uuid.uuid4().hex
+
+    def default(value):
+        if isinstance(value, RawJSON):
+            raw.append(value)
+            return "%s-%s" % (marker, len(raw) - 1)
+        raise TypeError("Object of type %s is not JSON serializable" % type(value).__name__)
+
+    data = json.dumps(obj, default=default)
+    if not raw:
+        return data
+    # The markers are strings so they were encoded with quotes and an escaped null character
+    pattern = re.compile(b'"\\\\u0000' + marker[1:].encode("ascii") + b'-(\\d+)"')
+    return pattern.sub(lambda match: raw[int(match.group(1))], data)
+
+
+def decode_raw_json(payload):
+    """
+    Returns a copy of payload where RawJSON values, including those of nested objects such as
+    bulk results, are decoded for the clients that don't encode payloads.
+    """
+    decoded = {}
+    for key, value in payload.items():
+        if isinstance(value, RawJSON):
+            value = json.loads(value)
+        elif isinstance(value, list):
+            value = [decode_raw_json(item) if isinstance(item, dict) else item for item in value]
+        decoded[key] = value
+    return decoded
 
 
 def get_client(
@@ -26,24 +72,66 @@ def get_client(
     password=None,
     verify=True,
     run_sql_migrations=True,
+    pool_connections=10,
+    pool_maxsize=10,
+    pool_block=False,
+    keep_alive=True,
+    compression=None,
+    compression_threshold=1024,
+    spool_dir=None,
+    transaction_size=0,
+    transaction_timeout=1000,
 ):
     """
     Returns a specified client configuration or one with sane defaults.
+    The connection pool and compression settings apply to the clients that use HTTP ('offline', 'http' and 'spool').
+    The transaction settings only apply to the 'offline' client, see ara.clients.offline.SingleWriter.
     """
     auth = None
-    if username is not None and password is not None:
+    if username is not None and password is not None and client == "direct":
+        # requests is only imported when it is needed, the direct client only needs the credentials
+        from ara.clients.direct import Credentials
+
+        auth = Credentials(username, password)
+    elif username is not None and password is not None:
+        from requests.auth import HTTPBasicAuth
+
         auth = HTTPBasicAuth(username, password)
 
+    http_options = dict(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=pool_block,
+        keep_alive=keep_alive,
+        compression=compression,
+        compression_threshold=compression_threshold,
+    )
     if client == "offline":
         from ara.clients.offline import AraOfflineClient
 
-        return AraOfflineClient(auth=auth, run_sql_migrations=run_sql_migrations)
+        return AraOfflineClient(
+            auth=auth,
+            run_sql_migrations=run_sql_migrations,
+            transaction_size=transaction_size,
+            transaction_timeout=transaction_timeout,
+            **http_options
+        )
+    elif client == "direct":
+        from ara.clients.direct import AraDirectClient
+
+        return AraDirectClient(auth=auth, run_sql_migrations=run_sql_migrations)
     elif client == "http":
         from ara.clients.http import AraHttpClient
 
-        return AraHttpClient(endpoint=endpoint, timeout=timeout, auth=auth, verify=verify)
+        return AraHttpClient(endpoint=endpoint, timeout=timeout, auth=auth, verify=verify, **http_options)
+    elif client == "spool":
+        from ara.clients.spool import AraSpoolClient
+
+        return AraSpoolClient(
+            endpoint=endpoint, timeout=timeout, auth=auth, verify=verify, spool_dir=spool_dir, **http_options
+        )
     else:
-        raise ValueError("Unsupported API client: %s (use 'http' or 'offline')" % client)
+        raise ValueError("Unsupported API client: %s (use 'http', 'offline', 'direct' or 'spool')" % client)
 
 
 def active_client():
@@ -18,18 +18,26 @@
 from __future__ import absolute_import, division, print_function
 
 import datetime
-import json
+import hashlib
 import logging
+import multiprocessing
 import os
+import pickle
+import re
 import socket
-from concurrent.futures import ThreadPoolExecutor
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, wait
 
 from ansible import __version__ as ansible_version
 from ansible.parsing.ajson import AnsibleJSONEncoder
 from ansible.plugins.callback import CallbackBase
-from ansible.vars.clean import module_response_deepcopy, strip_internal_keys
 
 from ara.clients import utils as client_utils
+from ara.utils import json
 
 # Ansible CLI options are now in ansible.context in >= 2.8
 # https://github.com/ansible/ansible/commit/afdbb0d9d5bebb91f632f0d4a1364de5393ba17a
@@ -58,14 +66,17 @@ description:
   - Sends playbook execution data to the ARA API internally or over HTTP
 options:
   api_client:
-    description: The client to use for communicating with the API
+    description:
+      - The client to use for communicating with the API
+      - The direct client is an offline client that records data in-process without a loopback HTTP server
+      - The spool client writes to a journal in spool_dir that is sent to the API server in the background
     default: offline
     env:
       - name: ARA_API_CLIENT
     ini:
       - section: ara
         key: api_client
-    choices: ['offline', 'http']
+    choices: ['offline', 'http', 'direct', 'spool']
   api_server:
     description: When using the HTTP client, the base URL to the ARA API server
     default: http://127.0.0.1:8000
@@ -108,6 +119,102 @@ options:
     ini:
       - section: ara
         key: api_timeout
+  api_pool_maxsize:
+    description:
+      - The number of connections to the API server kept by the HTTP connection pool
+      - Defaults to one more than callback_threads (the callback sends requests too), with a minimum of 10
+      - callback_threads is reduced to fit in the pool if it is set lower
+    type: integer
+    default: null
+    env:
+      - name: ARA_API_POOL_MAXSIZE
+    ini:
+      - section: ara
+        key: api_pool_maxsize
+  api_pool_block:
+    description:
+      - Can be enabled to never open more than api_pool_maxsize connections to the API server at once
+      - Otherwise, connections opened beyond the size of the pool are discarded after their request
+    type: bool
+    default: false
+    env:
+      - name: ARA_API_POOL_BLOCK
+    ini:
+      - section: ara
+        key: api_pool_block
+  api_keep_alive:
+    description: Can be disabled to close the connection to the API server after each request
+    type: bool
+    default: true
+    env:
+      - name: ARA_API_KEEP_ALIVE
+    ini:
+      - section: ara
+        key: api_keep_alive
+  api_compression:
+    description:
+      - Can be set to compress the body of requests to the API server with gzip or deflate
+      - Useful when bandwidth is limited, requires an API server that accepts compressed requests
+    default: null
+    env:
+      - name: ARA_API_COMPRESSION
+    ini:
+      - section: ara
+        key: api_compression
+    choices: ['gzip', 'deflate']
+  api_compression_threshold:
+    description: When api_compression is set, the size in bytes above which request bodies are compressed
+    type: integer
+    default: 1024
+    env:
+      - name: ARA_API_COMPRESSION_THRESHOLD
+    ini:
+      - section: ara
+        key: api_compression_threshold
+  spool_dir:
+    description:
+      - When using the spool client, the directory where journals are written
+      - Journals that could not be sent to the API server are left there, use 'ara spool replay' to send them
+    default: ~/.ara/spool
+    env:
+      - name: ARA_SPOOL_DIR
+    ini:
+      - section: ara
+        key: spool_dir
+  spool_timeout:
+    description:
+      - When using the spool client, the number of seconds to wait at the end of the playbook for the journal to be sent
+      - Whatever is left once the timeout expires stays in spool_dir
+    type: integer
+    default: 30
+    env:
+      - name: ARA_SPOOL_TIMEOUT
+    ini:
+      - section: ara
+        key: spool_timeout
+  api_transaction_size:
+    description:
+      - When using the offline client, the number of requests to group in a single database transaction
+      - Requests are then handled one at a time by a single connection so callback_threads can be used with sqlite
+      - When set to 0, every request is committed on its own (default)
+    type: integer
+    default: 0
+    env:
+      - name: ARA_API_TRANSACTION_SIZE
+    ini:
+      - section: ara
+        key: api_transaction_size
+  api_transaction_timeout:
+    description:
+      - Maximum amount of time, in milliseconds, before the requests grouped in a transaction are committed
+      - Only used when api_transaction_size is greater than 0
+    type: integer
+    default: 1000
+    env:
+      - name: ARA_API_TRANSACTION_TIMEOUT
+    ini:
+      - section: ara
+        key: api_transaction_timeout
   argument_labels:
     description: |
         A list of CLI arguments that, if set, will be automatically applied to playbooks as labels.
@@ -135,7 +242,10 @@ options:
       - section: ara
         key: default_labels
   ignored_facts:
-    description: List of host facts that will not be saved by ARA
+    description:
+      - List of host facts that will not be saved by ARA
+      - Identical facts are only stored and sent once, ignoring facts that change on every run such as ansible_date_time
+        lets hosts whose facts otherwise didn't change share them
     type: list
     default: ["ansible_env"]
     env:
@@ -161,11 +271,45 @@ options:
     ini:
       - section: ara
         key: ignored_files
+  result_content_statuses:
+    description:
+      - The statuses of the results whose content is saved, the content of other results is not saved
+      - Results are saved regardless, with their status and timing, so they are still counted
+    type: list
+    default: ["changed", "failed", "ignored", "ok", "skipped", "unreachable"]
+    env:
+      - name: ARA_RESULT_CONTENT_STATUSES
+    ini:
+      - section: ara
+        key: result_content_statuses
+  result_content_actions:
+    description:
+      - When set, only the content of the results of these actions (i.e, command, ansible.builtin.shell) is saved
+      - Results are saved regardless, with their status and timing, so they are still counted
+    type: list
+    default: []
+    env:
+      - name: ARA_RESULT_CONTENT_ACTIONS
+    ini:
+      - section: ara
+        key: result_content_actions
+  result_content_ignored_actions:
+    description:
+      - The content of the results of these actions (i.e, debug, ansible.builtin.stat) is not saved
+      - Results are saved regardless, with their status and timing, so they are still counted
+    type: list
+    default: []
+    env:
+      - name: ARA_RESULT_CONTENT_IGNORED_ACTIONS
+    ini:
+      - section: ara
+        key: result_content_ignored_actions
   callback_threads:
     description:
-      - The number of threads to use in API client thread pools
+      - The number of threads to use in the API client thread pool
       - When set to 0, no threading will be used (default) which is appropriate for usage with sqlite
       - Using threads is recommended when the server is using MySQL or PostgreSQL
+      - With sqlite, threads can be used along with the offline client when api_transaction_size is set
     type: integer
     default: 0
     env:
@@ -173,8 +317,275 @@ options:
     ini:
       - section: ara
         key: callback_threads
+  result_batch_size:
+    description:
+      - The number of results to buffer before sending them to the API in a single bulk request
+      - When set to 0, no buffering will be used (default) and results are sent one at a time
+      - Requires an API server that provides the /api/v1/results/bulk endpoint
+    type: integer
+    default: 0
+    env:
+      - name: ARA_RESULT_BATCH_SIZE
+    ini:
+      - section: ara
+        key: result_batch_size
+  result_batch_timeout:
+    description:
+      - Maximum amount of time, in milliseconds, before buffered results are sent to the API
+      - Buffered results are also sent at the end of the playbook regardless of this value
+      - Only used when result_batch_size is greater than 0
+    type: integer
+    default: 1000
+    env:
+      - name: ARA_RESULT_BATCH_TIMEOUT
+    ini:
+      - section: ara
+        key: result_batch_timeout
+  callback_queue_policy:
+    description:
+      - What to do with results once the results waiting for a thread reach callback_queue_high_items or
+        callback_queue_high_bytes, until they are back under the low watermarks
+      - block waits for threads to catch up before returning control to Ansible
+      - spill writes the content of the results to a temporary file instead of keeping it in memory
+      - drop doesn't save the content of the results, their status is saved regardless
+      - Only used when callback_threads is greater than 0
+    type: string
+    default: block
+    env:
+      - name: ARA_CALLBACK_QUEUE_POLICY
+    ini:
+      - section: ara
+        key: callback_queue_policy
+    choices: ['block', 'spill', 'drop']
+  callback_queue_high_items:
+    description: The number of results waiting for a thread at which callback_queue_policy is applied
+    type: integer
+    default: 1000
+    env:
+      - name: ARA_CALLBACK_QUEUE_HIGH_ITEMS
+    ini:
+      - section: ara
+        key: callback_queue_high_items
+  callback_queue_low_items:
+    description: The number of results waiting for a thread under which callback_queue_policy stops being applied
+    type: integer
+    default: 500
+    env:
+      - name: ARA_CALLBACK_QUEUE_LOW_ITEMS
+    ini:
+      - section: ara
+        key: callback_queue_low_items
+  callback_queue_high_bytes:
+    description: The size, in bytes, of the results waiting for a thread at which callback_queue_policy is applied
+    type: integer
+    default: 268435456
+    env:
+      - name: ARA_CALLBACK_QUEUE_HIGH_BYTES
+    ini:
+      - section: ara
+        key: callback_queue_high_bytes
+  callback_queue_low_bytes:
+    description:
+      - The size, in bytes, of the results waiting for a thread under which callback_queue_policy stops being applied
+    type: integer
+    default: 134217728
+    env:
+      - name: ARA_CALLBACK_QUEUE_LOW_BYTES
+    ini:
+      - section: ara
+        key: callback_queue_low_bytes
+  callback_queue_spill_dir:
+    description:
+      - Directory where the content of results is written when callback_queue_policy is spill
+      - Defaults to the system's temporary directory, the file is removed at the end of the playbook
+    type: path
+    env:
+      - name: ARA_CALLBACK_QUEUE_SPILL_DIR
+    ini:
+      - section: ara
+        key: callback_queue_spill_dir
+  callback_process:
+    description:
+      - Handles the events of the playbook in a separate process forked at the start of the playbook
+      - Ansible's process only sends the events to it, the worker process serializes results and sends them to the API
+      - This keeps the callback from competing with Ansible for the CPU on busy controllers with many forks
+      - callback_threads and result_batch_size apply to the worker process
+    type: boolean
+    default: false
+    env:
+      - name: ARA_CALLBACK_PROCESS
+    ini:
+      - section: ara
+        key: callback_process
+  callback_profile:
+    description:
+      - Measures where the time is spent by the callback, i.e. in each hook, serializing results or waiting on the API
+      - A summary is displayed at the end of the playbook, it includes the peak memory usage traced by tracemalloc
+      - Tracing memory allocations slows down the callback, it should only be enabled when troubleshooting
+    type: boolean
+    default: false
+    env:
+      - name: ARA_CALLBACK_PROFILE
+    ini:
+      - section: ara
+        key: callback_profile
+  callback_profile_record:
+    description:
+      - Saves the summary of callback_profile as a record named "ara_callback_profile" on the playbook
+      - Only used when callback_profile is enabled
+    type: boolean
+    default: false
+    env:
+      - name: ARA_CALLBACK_PROFILE_RECORD
+    ini:
+      - section: ara
+        key: callback_profile_record
 """
 
+IGNORED_FACT = "Not saved by ARA as configured by 'ignored_facts'"
+IGNORED_RESULT_CONTENT = dict(msg="Not saved by ARA as configured by the result_content options")
+ANSIBLE_JSON_ENCODER = AnsibleJSONEncoder()
+
+
+def _sorted_keys(mapping):
+    # Internal keys (_ansible_*) are left out
+    keys = [key for key in mapping if not (isinstance(key, str) and key.startswith("_ansible_"))]
+    try:
+        keys.sort()
+    except TypeError:
+        # Python 3 can't sort non-homogenous keys.
+        # https://bugs.python.org/issue25457
+        pass
+    return keys
+
+
+def _sanitize(value, ignored=()):
+    if value is None or isinstance(value, (str, int, float)):
+        # Note: AnsibleUnsafeText is a str, it is encoded as a string like before
+        return value
+    if isinstance(value, Mapping):
+        return {key: IGNORED_FACT if key in ignored else _sanitize(value[key]) for key in _sorted_keys(value)}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_sanitize(item) for item in value]
+    if isinstance(value, bytes) and not getattr(value, "__UNSAFE__", False):
+        # Like ara.utils.json, invalid UTF-8 is replaced: surrogates can't be encoded
+        return value.decode("utf8", errors="replace")
+    # Vaulted and unsafe values, dates, hostvars, etc.
+    return _sanitize(ANSIBLE_JSON_ENCODER.default(value))
+
+
+def sanitize_result(result, ignored_facts=()):
+    """
+    Returns a copy of a result made of standard types in a single pass over the
+    result: internal keys are left out, ignored facts are replaced without being
+    looked at and Ansible types are converted like AnsibleJSONEncoder does.
+    Keys are sorted so that the copy can be encoded without sort_keys.
+    """
+    return {
+        key: _sanitize(result[key], ignored_facts if key == "ansible_facts" else ()) for key in _sorted_keys(result)
+    }
+
+
+# Ids in API endpoints are replaced so that requests are profiled by endpoint, i.e. "patch /api/v1/tasks/<id>"
+PROFILE_ENDPOINT_ID = re.compile(r"/(\d+|spool:\d+)(?=/|$)")
+
+
+class CallbackProfiler(object):
+    """
+    Keeps track of how many times the profiled functions were called, for how
+    long and how many submissions were waiting in the thread pool.
+    """
+
+    # Helpers profiled in addition to the v2_* hooks of the callback
+    METHODS = [
+        "_load_result",
+        "_get_or_create_file",
+        "_get_or_create_files",
+        "_get_or_create_host",
+        "_get_or_create_hosts",
+        "_get_or_create_task",
+        "_set_host_facts",
+        "_set_host_stats",
+        "_flush_results",
+        "_complete_task",
+        "_complete_play",
+    ]
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.queue_depth = dict(samples=0, total=0, max=0)
+        self.tracing = not tracemalloc.is_tracing()
+        if self.tracing:
+            tracemalloc.start()
+
+    def record(self, name, elapsed):
+        with self.lock:
+            timing = self.timings.setdefault(name, dict(calls=0, total=0.0, max=0.0))
+            timing["calls"] += 1
+            timing["total"] += elapsed
+            timing["max"] = max(timing["max"], elapsed)
+
+    def sample_queue_depth(self, depth):
+        with self.lock:
+            self.queue_depth["samples"] += 1
+            self.queue_depth["total"] += depth
+            self.queue_depth["max"] = max(self.queue_depth["max"], depth)
+
+    def wrap(self, func, name):
+        def profiled(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - started)
+
+        return profiled
+
+    def wrap_client(self, client):
+        for method in ["get", "post", "patch", "put", "delete"]:
+            setattr(client, method, self._wrap_request(getattr(client, method), method))
+
+    def _wrap_request(self, func, method):
+        def profiled(endpoint, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(endpoint, *args, **kwargs)
+            finally:
+                name = "request: %s %s" % (method, PROFILE_ENDPOINT_ID.sub("/<id>", endpoint.split("?")[0]))
+                self.record(name, time.perf_counter() - started)
+
+        return profiled
+
+    def summary(self):
+        with self.lock:
+            timings = {
+                name: dict(timing, mean=timing["total"] / timing["calls"]) for name, timing in self.timings.items()
+            }
+            samples = self.queue_depth["samples"]
+            queue_depth = dict(max=self.queue_depth["max"], mean=self.queue_depth["total"] / samples if samples else 0)
+        _, memory_peak = tracemalloc.get_traced_memory()
+        return dict(timings=timings, queue_depth=queue_depth, memory_peak=memory_peak)
+
+    def stop(self):
+        # Only stop tracing memory if we were the ones who started it
+        if self.tracing:
+            tracemalloc.stop()
+
+
+class CachedTask(object):
+    """
+    What the callback keeps about a task it has created: its ids and what its results are saved with.
+    """
+
+    __slots__ = ("id", "play", "action", "started")
+
+    def __init__(self, id, play, action, started):
+        self.id = id
+        self.play = play
+        self.action = action
+        self.started = started
+
 
 class CallbackModule(CallbackBase):
     """
@@ -189,22 +600,49 @@ class CallbackModule(CallbackBase):
         super(CallbackModule, self).__init__()
         self.log = logging.getLogger("ara.plugins.callback.default")
         # These are configured in self.set_options
+        self.api_client = None
         self.client = None
+        self.client_options = None
         self.callback_threads = None
+        self.callback_process = None
+        self.callback_profile = None
+        self.result_batch_size = None
+        self.result_batch_timeout = None
+        self.profiler = None
+
+        # Results waiting for a thread, see self._queue_result
+        self.queue_condition = threading.Condition()
+        self.queue_items = 0
+        self.queue_bytes = 0
+        self.queue_full = False
+        self.spill_file = None
+        self.spill_lock = threading.Lock()
+
+        # The process events are sent to when callback_process is enabled, see self._dispatch
+        self.worker = None
+        self.worker_pipe = None
 
         self.ignored_facts = []
         self.ignored_arguments = []
         self.ignored_files = []
 
-        self.result = None
+        self.result_buffer = []
+        self.result_buffer_started = None
+        self.result_buffer_lock = threading.Lock()
+        self.result_flush_lock = threading.Lock()
         self.result_started = {}
-        self.result_ended = {}
+        self.completed_tasks = []
+        self.task_futures = {}
+        self.play_futures = []
         self.task = None
+        self.task_uuid = None
         self.play = None
         self.playbook = None
         self.stats = None
+        # Only the ids of files and hosts are kept, tasks are let go at the end of their play
         self.file_cache = {}
         self.host_cache = {}
+        self.host_cache_lock = threading.Lock()
         self.task_cache = {}
 
     def set_options(self, task_keys=None, var_options=None, direct=None):
@@ -215,54 +653,207 @@ class CallbackModule(CallbackBase):
         self.ignored_facts = self.get_option("ignored_facts")
         self.ignored_arguments = self.get_option("ignored_arguments")
         self.ignored_files = self.get_option("ignored_files")
+        self.result_content_statuses = self.get_option("result_content_statuses")
+        self.result_content_actions = self.get_option("result_content_actions")
+        self.result_content_ignored_actions = self.get_option("result_content_ignored_actions")
+        self.ignored_result_content = client_utils.RawJSON(json.dumps(IGNORED_RESULT_CONTENT))
 
-        client = self.get_option("api_client")
+        self.api_client = client = self.get_option("api_client")
         endpoint = self.get_option("api_server")
         timeout = self.get_option("api_timeout")
         username = self.get_option("api_username")
         password = self.get_option("api_password")
         insecure = self.get_option("api_insecure")
-        self.client = client_utils.get_client(
+
+        # Size the connection pool so every thread, as well as the callback itself, has a connection of its own.
+        # Otherwise we can hit "urllib3.connectionpool: Connection pool is full"
+        self.callback_threads = self.get_option("callback_threads")
+        pool_maxsize = self.get_option("api_pool_maxsize")
+        if pool_maxsize is None:
+            pool_maxsize = max(10, self.callback_threads + 1)
+        elif client != "direct" and self.callback_threads >= pool_maxsize:
+            self.log.warning(
+                "Reducing callback_threads from %s to %s to fit in api_pool_maxsize"
+                % (self.callback_threads, pool_maxsize - 1)
+            )
+            self.callback_threads = pool_maxsize - 1
+
+        self.client_options = dict(
             client=client,
             endpoint=endpoint,
             timeout=timeout,
             username=username,
             password=password,
             verify=False if insecure else True,
+            pool_maxsize=pool_maxsize,
+            pool_block=self.get_option("api_pool_block"),
+            keep_alive=self.get_option("api_keep_alive"),
+            compression=self.get_option("api_compression"),
+            compression_threshold=self.get_option("api_compression_threshold"),
+            spool_dir=self.get_option("spool_dir"),
+            transaction_size=self.get_option("api_transaction_size"),
+            transaction_timeout=self.get_option("api_transaction_timeout"),
         )
+        # Ansible's process keeps a client even with callback_process for ara_record, ara_playbook and ara_api
+        self.client = client_utils.get_client(**self.client_options)
+        self.spool_timeout = self.get_option("spool_timeout")
+
+        self.result_batch_size = self.get_option("result_batch_size")
+        self.result_batch_timeout = self.get_option("result_batch_timeout")
+
+        self.queue_policy = self.get_option("callback_queue_policy")
+        self.queue_high_items = self.get_option("callback_queue_high_items")
+        self.queue_low_items = min(self.get_option("callback_queue_low_items"), self.queue_high_items)
+        self.queue_high_bytes = self.get_option("callback_queue_high_bytes")
+        self.queue_low_bytes = min(self.get_option("callback_queue_low_bytes"), self.queue_high_bytes)
+        self.queue_spill_dir = self.get_option("callback_queue_spill_dir")
+
+        self.callback_process = self.get_option("callback_process")
+        self.callback_profile = self.get_option("callback_profile")
+        self.callback_profile_record = self.get_option("callback_profile_record")
+        # With callback_process, the worker process profiles itself once it is started
+        if self.callback_profile and not self.callback_process and self.profiler is None:
+            self._start_profiler()
+
+    def _start_profiler(self):
+        # Profiled functions are wrapped on the instance so there is no overhead when profiling isn't enabled
+        self.profiler = CallbackProfiler()
+        names = [name for name in vars(CallbackModule) if name.startswith(("v2_", "_handle_"))]
+        names += CallbackProfiler.METHODS
+        for name in names:
+            setattr(self, name, self.profiler.wrap(getattr(self, name), name))
+        self.profiler.wrap_client(self.client)
+
+    def _save_profile(self):
+        summary = self.profiler.summary()
+        client_stats = getattr(self.client, "stats", None)
+        if client_stats is not None:
+            summary["client"] = client_stats
+
+        lines = ["ARA callback profile (calls, total, mean and max in seconds):"]
+        timings = sorted(summary["timings"].items(), key=lambda item: item[1]["total"], reverse=True)
+        for name, timing in timings:
+            line = "  {0}: {calls} calls, {total:.4f} total, {mean:.4f} mean, {max:.4f} max"
+            lines.append(line.format(name, **timing))
+        lines.append("  thread pool queue depth: {max} max, {mean:.2f} mean".format(**summary["queue_depth"]))
+        lines.append("  tracemalloc peak memory: %.2f MiB" % (summary["memory_peak"] / 1024 / 1024))
+        self._display.display("\n".join(lines))
+
+        if self.callback_profile_record:
+            self.client.post(
+                "/api/v1/records", playbook=self.playbook["id"], key="ara_callback_profile", value=summary, type="json"
+            )
+        self.profiler.stop()
 
-        # TODO: Consider un-hardcoding this and plumbing pool_maxsize to requests.adapters.HTTPAdapter.
-        #       In the meantime default to 4 so we don't go above requests.adapters.DEFAULT_POOLSIZE.
-        #       Otherwise we can hit "urllib3.connectionpool: Connection pool is full"
-        self.callback_threads = self.get_option("callback_threads")
-        if self.callback_threads > 4:
-            self.callback_threads = 4
-
-    def _submit_thread(self, threadpool, func, *args, **kwargs):
+    def _submit_thread(self, func, *args, **kwargs):
         # Manages whether or not the function should be threaded to keep things DRY
+        # When threaded, the future is returned so that work depending on it can wait for it
         if self.callback_threads:
-            # Pick from one of two thread pools (global or task)
-            threads = getattr(self, threadpool + "_threads")
-            threads.submit(func, *args, **kwargs)
-        else:
-            func(*args, **kwargs)
+            if self.profiler is not None:
+                # There is no public interface to know how many submissions are waiting for a thread
+                self.profiler.sample_queue_depth(self.threads._work_queue.qsize())
+            return self.threads.submit(func, *args, **kwargs)
+        func(*args, **kwargs)
+
+    def _dispatch(self, event, *args):
+        # With callback_process, events are handled by the worker process rather than in Ansible's process
+        if self.worker is None:
+            getattr(self, "_handle_%s" % event)(*args)
+            return
+        self._send_event(event, args)
+        if event == "play_start":
+            # Wait for the play to be created: ara_record and ara_playbook look it up from Ansible's forks
+            try:
+                self.play = self.worker_pipe.recv()
+            except EOFError:
+                self.log.error("The callback worker process exited unexpectedly")
+
+    def _start_worker(self):
+        # The worker is forked so that it inherits the configuration of the callback
+        context = multiprocessing.get_context("fork")
+        pipe, self.worker_pipe = context.Pipe()
+        self.worker = context.Process(target=self._run_worker, args=(pipe,), name="ara-callback", daemon=True)
+        self.worker.start()
+        pipe.close()
+        self.log.debug("Callback worker process started: %s" % self.worker.pid)
+
+    def _run_worker(self, pipe):
+        """
+        Handles the events sent by Ansible's process until the end of the playbook.
+        """
+        self.worker = None
+        self.worker_pipe.close()
+        self.worker_pipe = None
+
+        # The threads of the offline and spool clients don't survive the fork, the worker needs a client of its own.
+        # The direct client sets aside the database connections it inherited by itself.
+        if self.api_client != "direct":
+            self.client = client_utils.get_client(run_sql_migrations=False, **self.client_options)
+        if self.callback_profile:
+            self._start_profiler()
+
+        while True:
+            try:
+                event = pipe.recv()
+            except EOFError:
+                # Ansible's process is gone
+                break
+            if event is None:
+                break
+            event, args = event
+            try:
+                getattr(self, "_handle_%s" % event)(*args)
+            except Exception as e:
+                self.log.exception("Failure handling %s in the callback worker process: %s" % (event, e))
+            if event == "play_start":
+                if self.api_client == "offline":
+                    # ara_record and ara_playbook use the client of Ansible's process, the play must be committed
+                    self.client.commit()
+                pipe.send(self.play)
+
+    def _send_event(self, event, args):
+        try:
+            self.worker_pipe.send((event, args))
+        except (pickle.PicklingError, TypeError, AttributeError):
+            if event != "result":
+                raise
+            # Results that can't be pickled are sanitized first
+            args[0]["result"] = sanitize_result(args[0]["result"])
+            self.worker_pipe.send((event, args))
+
+    def _stop_worker(self):
+        # Everything must be saved before the playbook ends: wait for the worker to handle the remaining events
+        self.log.debug("waiting for the callback worker process...")
+        self.worker_pipe.send(None)
+        self.worker_pipe.close()
+        self.worker.join()
+        if self.worker.exitcode != 0:
+            self.log.error("The callback worker process exited with code %s" % self.worker.exitcode)
+        self.worker = None
+        self.worker_pipe = None
 
     def v2_playbook_on_start(self, playbook):
         self.log.debug("v2_playbook_on_start")
+        if self.callback_process and self.worker is None:
+            self._start_worker()
+        self._dispatch("playbook_start", playbook._file_name)
+        return self.playbook
 
+    def _handle_playbook_start(self, file_name):
         if self.callback_threads:
-            self.global_threads = ThreadPoolExecutor(max_workers=self.callback_threads)
-            self.log.debug("Global thread pool initialized with %s thread(s)" % self.callback_threads)
+            # A single thread pool is used for the whole playbook, it is only waited for in v2_playbook_on_stats
+            self.threads = ThreadPoolExecutor(max_workers=self.callback_threads)
+            self.log.debug("Thread pool initialized with %s thread(s)" % self.callback_threads)
 
         content = None
 
-        if playbook._file_name == "__adhoc_playbook__":
+        if file_name == "__adhoc_playbook__":
             content = cli_options["module_name"]
             if cli_options["module_args"]:
                 content = "{0}: {1}".format(content, cli_options["module_args"])
             path = "Ad-Hoc: {0}".format(content)
         else:
-            path = os.path.abspath(playbook._file_name)
+            path = os.path.abspath(file_name)
 
         # Potentially sanitize some user-specified keys
         for argument in self.ignored_arguments:
@@ -299,21 +890,14 @@ class CallbackModule(CallbackBase):
         )
 
         # Record the playbook file
-        self._submit_thread("global", self._get_or_create_file, path, content)
-
-        return self.playbook
+        self._submit_thread(self._get_or_create_file, path, content)
 
     def v2_playbook_on_play_start(self, play):
         self.log.debug("v2_playbook_on_play_start")
-        self._end_task()
-        self._end_play()
 
         # Load variables to verify if there is anything relevant for ara
         play_vars = play._variable_manager.get_vars(play=play)["vars"]
-        if "ara_playbook_name" in play_vars:
-            self._submit_thread("global", self._set_playbook_name, play_vars["ara_playbook_name"])
-
-        labels = self.default_labels + self.argument_labels
+        labels = []
         if "ara_playbook_labels" in play_vars:
             # ara_playbook_labels can be supplied as a list inside a playbook
             # but it might also be specified as a comma separated string when
@@ -324,27 +908,50 @@ class CallbackModule(CallbackBase):
                 labels.extend(play_vars["ara_playbook_labels"].split(","))
             else:
                 raise TypeError("ara_playbook_labels must be a list or a comma-separated string")
-        if labels:
-            self._submit_thread("global", self._set_playbook_labels, labels)
-
-        # Record all the files involved in the play
-        for path in play._loader._FILE_CACHE.keys():
-            self._submit_thread("global", self._get_or_create_file, path)
 
+        hosts = play._variable_manager._inventory.get_hosts(play.hosts)
         # Note: ansible-runner suffixes play UUIDs when running in serial so 34cff6f4-9f8e-6137-3461-000000000005 can
         # end up being 34cff6f4-9f8e-6137-3461-000000000005_2. Remove anything beyond standard 36 character UUIDs.
         # https://github.com/ansible-community/ara/issues/211
+        self._dispatch(
+            "play_start",
+            dict(
+                name=play.name,
+                uuid=play._uuid[:36],
+                playbook_name=play_vars.get("ara_playbook_name"),
+                labels=labels,
+                files=list(play._loader._FILE_CACHE.keys()),
+                hosts=[host.get_name() for host in hosts],
+            ),
+        )
+        return self.play
+
+    def _handle_play_start(self, play):
+        self._end_task()
+        self._end_play()
+
+        if play["playbook_name"] is not None:
+            self._submit_thread(self._set_playbook_name, play["playbook_name"])
+
+        labels = self.default_labels + self.argument_labels + play["labels"]
+        if labels:
+            self._submit_thread(self._set_playbook_labels, labels)
+
+        # Record all the files involved in the play, the contents that the server already has aren't sent again
+        self._submit_thread(self._get_or_create_files, play["files"])
+
         # Create the play
         self.play = self.client.post(
             "/api/v1/plays",
-            name=play.name,
+            name=play["name"],
             status="running",
-            uuid=play._uuid[:36],
+            uuid=play["uuid"],
             playbook=self.playbook["id"],
             started=datetime.datetime.now(datetime.timezone.utc).isoformat(),
         )
 
-        return self.play
+        # Register the hosts of the play up front rather than as each of them reports its first result
+        self._get_or_create_hosts(play["hosts"])
 
     def v2_playbook_on_handler_task_start(self, task):
         self.log.debug("v2_playbook_on_handler_task_start")
@@ -353,15 +960,27 @@ class CallbackModule(CallbackBase):
 
     def v2_playbook_on_task_start(self, task, is_conditional, handler=False):
         self.log.debug("v2_playbook_on_task_start")
-        self._end_task()
+        self._dispatch(
+            "task_start",
+            dict(
+                uuid=str(task._uuid)[:36],
+                name=task.get_name(),
+                action=task.action,
+                tags=task.tags,
+                path=task.get_path(),
+                handler=handler,
+            ),
+        )
+        return self.task
 
-        if self.callback_threads:
-            self.task_threads = ThreadPoolExecutor(max_workers=self.callback_threads)
-            self.log.debug("Task thread pool initialized with %s thread(s)" % self.callback_threads)
+    def _handle_task_start(self, task):
+        self._end_task()
+        # Don't hold on to buffered results longer than necessary if the previous task was slow
+        if self.result_batch_size:
+            self._submit_thread(self._flush_results)
 
-        pathspec = task.get_path()
-        if pathspec:
-            path, lineno = pathspec.split(":", 1)
+        if task["path"]:
+            path, lineno = task["path"].split(":", 1)
             lineno = int(lineno)
         else:
             # Task doesn't have a path, default to "something"
@@ -369,211 +988,476 @@ class CallbackModule(CallbackBase):
             lineno = 1
 
         # Get task file
-        task_file = self._get_or_create_file(path)
+        file_id = self._get_or_create_file(path)
 
         # Get task
-        self.task = self._get_or_create_task(task, task_file["id"], lineno, handler)
-
-        return self.task
+        self.task = self._get_or_create_task(task, file_id, lineno)
+        self.task_uuid = task["uuid"]
 
     def v2_runner_on_start(self, host, task):
         # v2_runner_on_start was added in 2.8 so this doesn't get run for Ansible 2.7 and below.
-        self.result_started[host.get_name()] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        self._dispatch("runner_start", host.get_name(), datetime.datetime.now(datetime.timezone.utc).isoformat())
+
+    def _handle_runner_start(self, hostname, started):
+        self.result_started[hostname] = started
 
     def v2_runner_on_ok(self, result, **kwargs):
-        self._submit_thread("task", self._load_result, result, "ok", **kwargs)
+        self._submit_result(result, "ok", **kwargs)
 
     def v2_runner_on_unreachable(self, result, **kwargs):
-        self._submit_thread("task", self._load_result, result, "unreachable", **kwargs)
+        self._submit_result(result, "unreachable", **kwargs)
 
     def v2_runner_on_failed(self, result, **kwargs):
-        self._submit_thread("task", self._load_result, result, "failed", **kwargs)
+        self._submit_result(result, "failed", **kwargs)
 
     def v2_runner_on_skipped(self, result, **kwargs):
-        self._submit_thread("task", self._load_result, result, "skipped", **kwargs)
+        self._submit_result(result, "skipped", **kwargs)
 
     def v2_playbook_on_stats(self, stats):
         self.log.debug("v2_playbook_on_stats")
+        host_stats = {hostname: stats.summarize(hostname) for hostname in sorted(stats.processed.keys())}
+        failed = len(stats.failures) >= 1 or len(stats.dark) >= 1
+        self._dispatch("stats", host_stats, failed)
+
+        if self.worker is not None:
+            self._stop_worker()
+            if self.api_client == "spool":
+                # Nothing was written to the journal of Ansible's process, this removes it
+                self.client.close(timeout=self.spool_timeout)
+            elif self.api_client == "offline":
+                self.client.close()
+
+    def _handle_stats(self, host_stats, failed):
         self._end_task()
         self._end_play()
-        self._load_stats(stats)
-        self._end_playbook(stats)
+        self._load_stats(host_stats)
+
+        # This is the only place where we wait for threads: everything must be saved before the playbook ends
+        if self.callback_threads:
+            self.log.debug("waiting for threads...")
+            self.threads.shutdown(wait=True)
+        self._flush_results(force=True)
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+
+        self._end_playbook(failed)
+
+        if self.profiler is not None:
+            self._save_profile()
+
+        if self.api_client == "spool":
+            self.client.close(timeout=self.spool_timeout)
+        elif self.api_client == "offline":
+            # Commits what the single writer has left, if any
+            self.client.close()
+
+        client_stats = getattr(self.client, "stats", None)
+        if client_stats is not None:
+            self.log.debug("API client statistics: %s" % client_stats)
+
+    def _submit_result(self, result, status, **kwargs):
+        # Timestamps are taken now: by the time the result is handled, the host may be running another task
+        # Note: ignore_errors might be None instead of a boolean
+        self._dispatch(
+            "result",
+            dict(
+                host=result._host.get_name(),
+                task=str(result._task._uuid)[:36],
+                result=result._result,
+                status=status,
+                ended=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                ignore_errors=kwargs.get("ignore_errors", False) or False,
+            ),
+        )
+
+    def _handle_result(self, result):
+        """
+        Turns a result into the payload sent to the API right away so that
+        the Ansible result isn't kept in memory while it waits for a thread.
+        """
+        hostname = result["host"]
+        started = self.result_started.pop(hostname, None)
+
+        # The task was created in v2_playbook_on_task_start, this comes from the cache
+        task = self._get_or_create_task(dict(uuid=result["task"]))
+        changed = result["result"].get("changed", False)
+        ignore_errors = result["ignore_errors"]
+        status = result["status"]
+
+        # Host facts are saved even when the content of the result isn't
+        keep_content = self._keep_result_content(task.action, status, changed, ignore_errors)
+        gathers_facts = task.action.split(".")[-1] in ["setup", "gather_facts"]
+        content = self._serialize_result(result["result"]) if keep_content or gathers_facts else None
+        facts = content if gathers_facts else None
+
+        payload = dict(
+            playbook=self.playbook["id"],
+            task=task.id,
+            play=task.play,
+            content=content if keep_content else self.ignored_result_content,
+            status=status,
+            started=started if started is not None else task.started,
+            ended=result["ended"],
+            changed=changed,
+            ignore_errors=ignore_errors,
+        )
+
+        if not self.callback_threads:
+            self._load_result(hostname, payload, facts)
+            return
+
+        payload, size = self._queue_result(payload, facts)
+        future = self._submit_thread(self._load_result, hostname, payload, facts)
+        future.add_done_callback(lambda future: self._dequeue_result(size))
+        self.task_futures.setdefault(result["task"], []).append(future)
+
+    def _keep_result_content(self, action, status, changed, ignore_errors):
+        """
+        Returns whether the content of a result is saved according to the result_content options.
+        Actions match by their full (ansible.builtin.command) or short (command) name.
+        """
+        if status == "ok" and changed:
+            status = "changed"
+        elif status == "failed" and ignore_errors:
+            status = "ignored"
+        if status not in self.result_content_statuses:
+            return False
+
+        actions = [action, action.split(".")[-1]]
+        if self.result_content_actions and not any(name in self.result_content_actions for name in actions):
+            return False
+        return not any(name in self.result_content_ignored_actions for name in actions)
+
+    def _queue_result(self, payload, facts=None):
+        """
+        Keeps track of the number and size of the results waiting for a thread.
+        Once they reach the high watermarks, callback_queue_policy is applied
+        until they are back under the low watermarks.
+        Returns the payload to submit and its size.
+        """
+        size = len(payload["content"])
+        if facts is not None and facts is not payload["content"]:
+            size += len(facts)
+        with self.queue_condition:
+            if self.queue_items >= self.queue_high_items or self.queue_bytes + size > self.queue_high_bytes:
+                if not self.queue_full:
+                    self.log.warning(
+                        "%s result(s) (%s bytes) are waiting to be sent, applying callback_queue_policy: %s"
+                        % (self.queue_items, self.queue_bytes, self.queue_policy)
+                    )
+                self.queue_full = True
+
+            if self.queue_full and self.queue_policy == "block":
+                self.queue_condition.wait_for(self._queue_drained)
+                self.queue_full = False
+            elif self.queue_full and self.queue_policy == "drop":
+                content = dict(msg="Not saved by ARA: too many results were waiting to be sent to the API")
+                payload["content"] = client_utils.RawJSON(json.dumps(content))
+                size = len(payload["content"])
+            elif self.queue_full and self.queue_policy == "spill":
+                payload["content"] = self._spill_content(payload["content"])
+                size = 0
+
+            self.queue_items += 1
+            self.queue_bytes += size
+        return payload, size
+
+    def _dequeue_result(self, size):
+        with self.queue_condition:
+            self.queue_items -= 1
+            self.queue_bytes -= size
+            if self._queue_drained():
+                self.queue_full = False
+            self.queue_condition.notify_all()
+
+    def _queue_drained(self):
+        return self.queue_items <= self.queue_low_items and self.queue_bytes <= self.queue_low_bytes
+
+    def _spill_content(self, content):
+        # Spilled content is replaced by its location in the spill file
+        with self.spill_lock:
+            if self.spill_file is None:
+                self.spill_file = tempfile.TemporaryFile(prefix="ara-spill-", dir=self.queue_spill_dir)
+            offset = self.spill_file.seek(0, os.SEEK_END)
+            self.spill_file.write(content)
+            self.spill_file.flush()
+        return (offset, len(content))
+
+    def _read_content(self, content):
+        if isinstance(content, tuple):
+            offset, length = content
+            content = client_utils.RawJSON(os.pread(self.spill_file.fileno(), length, offset))
+        return content
 
     def _end_task(self):
         if self.task is not None:
-            self._submit_thread(
-                "task",
-                self.client.patch,
-                "/api/v1/tasks/%s" % self.task["id"],
-                status="completed",
-                ended=datetime.datetime.now(datetime.timezone.utc).isoformat(),
-            )
-            if self.callback_threads:
-                # Flush threads before moving on to next task to make sure all results are saved
-                self.log.debug("waiting for task threads...")
-                self.task_threads.shutdown(wait=True)
-                self.task_threads = None
+            # Don't wait for the results here, a thread completes the task once they have been saved
+            futures = self.task_futures.pop(self.task_uuid, [])
+            ended = datetime.datetime.now(datetime.timezone.utc).isoformat()
+            future = self._submit_thread(self._complete_task, self.task.id, ended, futures)
+            if future is not None:
+                self.play_futures.append(future)
             self.task = None
+            self.task_uuid = None
+
+    def _complete_task(self, task_id, ended, futures):
+        wait(futures)
+        if self.result_batch_size:
+            # Wait for a flush in progress and leave the task to the next flush if its results are still buffered
+            with self.result_flush_lock:
+                with self.result_buffer_lock:
+                    if self.result_buffer:
+                        self.completed_tasks.append((task_id, ended))
+                        return
+        self.client.patch("/api/v1/tasks/%s" % task_id, status="completed", ended=ended)
 
     def _end_play(self):
         if self.play is not None:
-            self._submit_thread(
-                "global",
-                self.client.patch,
-                "/api/v1/plays/%s" % self.play["id"],
-                status="completed",
-                ended=datetime.datetime.now(datetime.timezone.utc).isoformat(),
-            )
+            # The play is completed once its tasks have been, including the results that are still coming in
+            futures = self.play_futures + [future for pending in self.task_futures.values() for future in pending]
+            self.play_futures = []
+            ended = datetime.datetime.now(datetime.timezone.utc).isoformat()
+            self._submit_thread(self._complete_play, self.play["id"], ended, futures)
             self.play = None
 
-    def _end_playbook(self, stats):
-        status = "unknown"
-        if len(stats.failures) >= 1 or len(stats.dark) >= 1:
-            status = "failed"
-        else:
-            status = "completed"
-
-        self._submit_thread(
-            "global",
-            self.client.patch,
+            # Every result of the play has been received by now, what is left about its tasks is no longer needed.
+            # Note: with the free strategy, results can come in after the next task has started so tasks can't be
+            # let go any earlier.
+            self.task_cache.clear()
+            self.task_futures.clear()
+            self.result_started.clear()
+
+    def _complete_play(self, play_id, ended, futures):
+        wait(futures)
+        if self.result_batch_size:
+            # Buffered results and the tasks waiting on them are sent before the play is completed
+            self._flush_results(force=True)
+        self.client.patch("/api/v1/plays/%s" % play_id, status="completed", ended=ended)
+
+    def _end_playbook(self, failed):
+        status = "failed" if failed else "completed"
+        self.client.patch(
             "/api/v1/playbooks/%s" % self.playbook["id"],
             status=status,
             ended=datetime.datetime.now(datetime.timezone.utc).isoformat(),
         )
 
-        if self.callback_threads:
-            self.log.debug("waiting for global threads...")
-            self.global_threads.shutdown(wait=True)
-
+    # Note: the spool client doesn't wait on the API server so it replies with the fields that were sent instead
+    # of the resulting object, i.e. no "name" if there wasn't one and labels are the names of the labels.
     def _set_playbook_name(self, name):
-        if self.playbook["name"] != name:
-            self.playbook = self.client.patch("/api/v1/playbooks/%s" % self.playbook["id"], name=name)
+        if self.playbook.get("name") != name:
+            self.playbook.update(self.client.patch("/api/v1/playbooks/%s" % self.playbook["id"], name=name))
 
     def _set_playbook_labels(self, labels):
         # Only update labels if our cache doesn't match
-        current_labels = [label["name"] for label in self.playbook["labels"]]
+        current_labels = self.playbook.get("labels", [])
+        current_labels = [label["name"] if isinstance(label, dict) else label for label in current_labels]
         if sorted(current_labels) != sorted(labels):
             self.log.debug("Updating playbook labels to match: %s" % ",".join(labels))
-            self.playbook = self.client.patch("/api/v1/playbooks/%s" % self.playbook["id"], labels=labels)
+            self.playbook.update(self.client.patch("/api/v1/playbooks/%s" % self.playbook["id"], labels=labels))
 
     def _get_or_create_file(self, path, content=None):
         if path not in self.file_cache:
+            self._get_or_create_files([path], content)
+        return self.file_cache[path]
+
+    def _get_or_create_files(self, paths, content=None):
+        """
+        Gets or creates the files that are not in the cache yet. The server is asked which of their contents
+        it already has, by sha1, so that only the contents it doesn't have are sent.
+        content, if provided, is used instead of reading the files (i.e, ad-hoc commands).
+        """
+        contents = {}
+        for path in paths:
+            if path in self.file_cache or path in contents:
+                continue
             self.log.debug("File not in cache, getting or creating: %s" % path)
-            for ignored_file_pattern in self.ignored_files:
-                if ignored_file_pattern in path:
-                    self.log.debug("Ignoring file {1}, matched pattern: {0}".format(ignored_file_pattern, path))
-                    content = "Not saved by ARA as configured by 'ignored_files'"
-            if content is None:
-                try:
-                    with open(path, "r") as fd:
-                        content = fd.read()
-                except IOError as e:
-                    self.log.error("Unable to open {0} for reading: {1}".format(path, str(e)))
-                    content = """ARA was not able to read this file successfully.
+            contents[path] = self._read_file(path) if content is None else content
+        if not contents:
+            return
+
+        sha1s = {path: hashlib.sha1(contents[path].encode("utf8")).hexdigest() for path in contents}
+        known = set()
+        # The spool client doesn't wait for the server's answer so it can't know which contents the server has
+        if self.api_client != "spool":
+            response = self.client.post("/api/v1/files/sha1", sha1=sorted(set(sha1s.values())))
+            # i.e, the API server doesn't provide /api/v1/files/sha1, every content is sent
+            known = set(response.get("sha1", []))
+
+        for path, file_content in contents.items():
+            response = None
+            if sha1s[path] in known:
+                response = self.client.post(
+                    "/api/v1/files", playbook=self.playbook["id"], path=path, content_sha1=sha1s[path]
+                )
+            if response is None or "id" not in response:
+                response = self.client.post(
+                    "/api/v1/files", playbook=self.playbook["id"], path=path, content=file_content
+                )
+            self.file_cache[path] = response["id"]
+
+    def _read_file(self, path):
+        for ignored_file_pattern in self.ignored_files:
+            if ignored_file_pattern in path:
+                self.log.debug("Ignoring file {1}, matched pattern: {0}".format(ignored_file_pattern, path))
+                return "Not saved by ARA as configured by 'ignored_files'"
+        try:
+            with open(path, "r") as fd:
+                return fd.read()
+        except IOError as e:
+            self.log.error("Unable to open {0} for reading: {1}".format(path, str(e)))
+            return """ARA was not able to read this file successfully.
                             Refer to the logs for more information"""
 
-            self.file_cache[path] = self.client.post(
-                "/api/v1/files", playbook=self.playbook["id"], path=path, content=content
-            )
-
-        return self.file_cache[path]
-
     def _get_or_create_host(self, host):
         # Note: The get_or_create is handled through the serializer of the API server.
-        if host not in self.host_cache:
-            self.log.debug("Host not in cache, getting or creating: %s" % host)
-            self.host_cache[host] = self.client.post("/api/v1/hosts", name=host, playbook=self.playbook["id"])
-        return self.host_cache[host]
-
-    def _get_or_create_task(self, task, file_id=None, lineno=None, handler=None):
+        # The lock prevents threads from creating the same host at the same time.
+        with self.host_cache_lock:
+            if host not in self.host_cache:
+                self.log.debug("Host not in cache, getting or creating: %s" % host)
+                response = self.client.post("/api/v1/hosts", name=host, playbook=self.playbook["id"])
+                self.host_cache[host] = response["id"]
+            return self.host_cache[host]
+
+    def _get_or_create_hosts(self, hosts):
+        # The spool client doesn't wait for the server's answer so it can't know the ids of the hosts,
+        # they are created one at a time instead.
+        if self.api_client == "spool":
+            return
+
+        with self.host_cache_lock:
+            hosts = [host for host in hosts if host not in self.host_cache]
+            if not hosts:
+                return
+            self.log.debug("Getting or creating %s host(s)" % len(hosts))
+            response = self.client.post("/api/v1/hosts/bulk", playbook=self.playbook["id"], hosts=hosts)
+            if "hosts" not in response:
+                # i.e, the API server doesn't provide /api/v1/hosts/bulk, hosts are created one at a time instead
+                return
+            self.host_cache.update(response["hosts"])
+
+    def _get_or_create_task(self, task, file_id=None, lineno=None):
         # Note: The get_or_create is handled through the serializer of the API server.
-        task_uuid = str(task._uuid)[:36]
+        task_uuid = task["uuid"]
         if task_uuid not in self.task_cache:
-            if None in (file_id, lineno, handler):
+            if None in (file_id, lineno, task.get("handler")):
                 raise ValueError("file_id, lineno, and handler are required to create a task")
 
-            self.log.debug("Task not in cache, getting or creating: %s" % task)
-            self.task_cache[task_uuid] = self.client.post(
+            self.log.debug("Task not in cache, getting or creating: %s" % task["name"])
+            response = self.client.post(
                 "/api/v1/tasks",
-                name=task.get_name(),
+                name=task["name"],
                 status="running",
-                action=task.action,
+                action=task["action"],
                 play=self.play["id"],
                 playbook=self.playbook["id"],
                 file=file_id,
-                tags=task.tags,
+                tags=task["tags"],
                 lineno=lineno,
-                handler=handler,
+                handler=task["handler"],
                 started=datetime.datetime.now(datetime.timezone.utc).isoformat(),
             )
+            self.task_cache[task_uuid] = CachedTask(
+                response["id"], response["play"], response["action"], response["started"]
+            )
 
         return self.task_cache[task_uuid]
 
-    def _load_result(self, result, status, **kwargs):
+    def _serialize_result(self, result):
+        """
+        Returns the content of a result encoded as JSON, ready to be sent as-is by the API client.
+        """
+        serialization_started = time.perf_counter()
+        content = sanitize_result(result, self.ignored_facts)
+        content = client_utils.RawJSON(json.dumps(content))
+        if self.profiler is not None:
+            self.profiler.record("serialization", time.perf_counter() - serialization_started)
+        return content
+
+    def _load_result(self, hostname, payload, facts=None):
         """
         This method is called when an individual task instance on a single
         host completes. It is responsible for logging a single result to the
         database.
         """
-        hostname = result._host.get_name()
-        self.result_ended[hostname] = datetime.datetime.now(datetime.timezone.utc).isoformat()
-
         # Retrieve the host so we can associate the result to the host id
-        host = self._get_or_create_host(hostname)
-
-        # Retrieve the task so we can associate the result to the task id
-        task = self._get_or_create_task(result._task)
-
-        results = strip_internal_keys(module_response_deepcopy(result._result))
-
-        # Round-trip through JSON to sort keys and convert Ansible types
-        # to standard types
-        try:
-            jsonified = json.dumps(results, cls=AnsibleJSONEncoder, ensure_ascii=False, sort_keys=True)
-        except TypeError:
-            # Python 3 can't sort non-homogenous keys.
-            # https://bugs.python.org/issue25457
-            jsonified = json.dumps(results, cls=AnsibleJSONEncoder, ensure_ascii=False, sort_keys=False)
-        results = json.loads(jsonified)
-
-        # Sanitize facts
-        if "ansible_facts" in results:
-            for fact in self.ignored_facts:
-                if fact in results["ansible_facts"]:
-                    self.log.debug("Ignoring fact: %s" % fact)
-                    results["ansible_facts"][fact] = "Not saved by ARA as configured by 'ignored_facts'"
-
-        self.result = self.client.post(
-            "/api/v1/results",
-            playbook=self.playbook["id"],
-            task=task["id"],
-            host=host["id"],
-            play=task["play"],
-            content=results,
-            status=status,
-            started=self.result_started[hostname] if hostname in self.result_started else task["started"],
-            ended=self.result_ended[hostname],
-            changed=result._result.get("changed", False),
-            # Note: ignore_errors might be None instead of a boolean
-            ignore_errors=kwargs.get("ignore_errors", False) or False,
-        )
+        host_id = self._get_or_create_host(hostname)
+        payload = dict(payload, host=host_id, content=self._read_content(payload["content"]))
 
-        if task["action"] in ["setup", "gather_facts"] and "ansible_facts" in results:
-            self.client.patch("/api/v1/hosts/%s" % host["id"], facts=results["ansible_facts"])
-
-    def _load_stats(self, stats):
-        hosts = sorted(stats.processed.keys())
-        for hostname in hosts:
-            host = self._get_or_create_host(hostname)
-            host_stats = stats.summarize(hostname)
-
-            self._submit_thread(
-                "global",
-                self.client.patch,
-                "/api/v1/hosts/%s" % host["id"],
-                changed=host_stats["changed"],
-                unreachable=host_stats["unreachable"],
-                failed=host_stats["failures"],
-                ok=host_stats["ok"],
-                skipped=host_stats["skipped"],
+        if self.result_batch_size:
+            self._buffer_result(payload)
+        else:
+            # The response isn't kept, it repeats the content of the result
+            self.client.post("/api/v1/results", **payload)
+
+        if facts is not None:
+            # The content is only decoded for the results that can have facts
+            content = json.loads(facts)
+            if "ansible_facts" in content:
+                self._set_host_facts(host_id, content["ansible_facts"])
+
+    def _set_host_facts(self, host_id, facts):
+        # Facts don't change much from one playbook to the next: if the server already has the same facts, refer to
+        # them by sha1 instead of sending them again.
+        # The spool client doesn't wait for the server's answer so it can't know whether the facts were found.
+        if self.api_client != "spool":
+            sha1 = hashlib.sha1(json.dumps(facts)).hexdigest()
+            response = self.client.patch("/api/v1/hosts/%s" % host_id, facts_sha1=sha1)
+            if response.get("facts_sha1") == sha1:
+                return
+        self.client.patch("/api/v1/hosts/%s" % host_id, facts=facts)
+
+    def _buffer_result(self, payload):
+        with self.result_buffer_lock:
+            if not self.result_buffer:
+                self.result_buffer_started = time.monotonic()
+            self.result_buffer.append(payload)
+        self._flush_results()
+
+    def _flush_results(self, force=False):
+        """
+        Sends buffered results to the API in a single request once the buffer
+        is full or once the oldest buffered result has waited long enough.
+        Tasks that ended while their results were buffered are completed
+        once the results have been sent.
+        """
+        # Flushes are sent one at a time so that results are saved before their task is completed
+        with self.result_flush_lock:
+            with self.result_buffer_lock:
+                if not self.result_buffer:
+                    return
+                if not force:
+                    waited = (time.monotonic() - self.result_buffer_started) * 1000
+                    if len(self.result_buffer) < self.result_batch_size and waited < self.result_batch_timeout:
+                        return
+                results = self.result_buffer
+                self.result_buffer = []
+                completed_tasks = self.completed_tasks
+                self.completed_tasks = []
+
+            self.log.debug("Sending %s buffered result(s)" % len(results))
+            self.client.post("/api/v1/results/bulk", results=results)
+            for task_id, ended in completed_tasks:
+                self.client.patch("/api/v1/tasks/%s" % task_id, status="completed", ended=ended)
+
+    def _load_stats(self, host_stats):
+        self._submit_thread(self._set_host_stats, host_stats)
+
+    def _set_host_stats(self, host_stats):
+        # The statistics of every host are sent in a single request, hosts that don't exist yet are created
+        response = self.client.post("/api/v1/hosts/stats", playbook=self.playbook["id"], stats=host_stats)
+        # The spool client doesn't wait for the server's answer so it can't know whether the request worked
+        if self.api_client == "spool" or "hosts" in (response or {}):
+            return
+
+        # i.e, the API server doesn't provide /api/v1/hosts/stats, the statistics are sent one host at a time instead
+        for hostname, stats in host_stats.items():
+            self.client.patch(
+                "/api/v1/hosts/%s" % self._get_or_create_host(hostname),
+                changed=stats["changed"],
+                unreachable=stats["unreachable"],
+                failed=stats["failures"],
+                ok=stats["ok"],
+                skipped=stats["skipped"],
             )
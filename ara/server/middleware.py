@@ -0,0 +1,59 @@
+# Copyright (c) 2021 The ARA Records Ansible authors
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import io
+import zlib
+
+from django.conf import settings
+from django.http import JsonResponse
+
+# wbits for zlib.decompress, see https://docs.python.org/3/library/zlib.html#zlib.decompress
+CONTENT_ENCODINGS = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}
+
+
+class RequestDecompressionMiddleware(object):
+    """
+    Decompresses the body of API requests sent with a "Content-Encoding: gzip" or
+    "Content-Encoding: deflate" header so that the views receive them as-is.
+    Like uncompressed bodies, decompressed bodies can't be larger than DATA_UPLOAD_MAX_MEMORY_SIZE.
+    """
+
+    methods = ["POST", "PUT", "PATCH"]
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        encoding = request.META.get("HTTP_CONTENT_ENCODING", "identity").strip().lower()
+        if encoding == "identity" or request.method not in self.methods or not request.path_info.startswith("/api/"):
+            return self.get_response(request)
+
+        if encoding not in CONTENT_ENCODINGS:
+            return JsonResponse({"detail": "Unsupported Content-Encoding: %s" % encoding}, status=415)
+
+        # Decompress up to one byte more than the limit to find out if the body exceeds it without
+        # decompressing the whole of it: a small compressed body can expand to gigabytes.
+        limit = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        decompressor = zlib.decompressobj(CONTENT_ENCODINGS[encoding])
+        try:
+            if limit is None:
+                body = decompressor.decompress(request.body)
+            else:
+                body = decompressor.decompress(request.body, limit + 1)
+        except zlib.error as e:
+            return JsonResponse({"detail": "Unable to decompress %s request body: %s" % (encoding, e)}, status=400)
+
+        if limit is not None and len(body) > limit:
+            return JsonResponse(
+                {"detail": "Decompressed request body exceeds DATA_UPLOAD_MAX_MEMORY_SIZE (%s bytes)" % limit},
+                status=413,
+            )
+        if not decompressor.eof:
+            return JsonResponse({"detail": "Unable to decompress %s request body: truncated" % encoding}, status=400)
+
+        # Replace the body that was read so that it can be read again, decompressed
+        request._body = body
+        request._stream = io.BytesIO(body)
+        request.META["CONTENT_LENGTH"] = str(len(body))
+        del request.META["HTTP_CONTENT_ENCODING"]
+        return self.get_response(request)
@@ -17,19 +17,20 @@
 
 import urllib.parse
 
-import pbr.version
 from django.contrib import admin
 from django.urls import include, path
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from ara.utils.version import get_version
+
 
 # fmt: off
 class APIIndex(APIView):
     def get(self, request):
         return Response({
             "kind": "ara",
-            "version": pbr.version.VersionInfo("ara").release_string(),
+            "version": get_version(),
             "api": list(map(lambda x: urllib.parse.urljoin(
                 request.build_absolute_uri(), x),
                 [
@@ -45,7 +45,7 @@ class Command(BaseCommand):
         self.create_dirs(path)
 
         # TODO: Leverage ui views directly instead of duplicating logic here
-        query = models.Playbook.objects.all().order_by("-id")
+        query = models.Playbook.objects.with_item_counts().prefetch_related("labels").order_by("-id")
         serializer = serializers.ListPlaybookSerializer(query, many=True)
 
         print("[ara] Generating static files for %s playbooks at %s..." % (query.count(), path))
@@ -64,23 +64,25 @@ class Command(BaseCommand):
             hosts = serializers.ListHostSerializer(
                 models.Host.objects.filter(playbook=playbook.data["id"]).order_by("name").all(), many=True
             )
+            files_queryset = models.File.objects.filter(playbook=playbook.data["id"])
             files = serializers.ListFileSerializer(
-                models.File.objects.filter(playbook=playbook.data["id"]).all(), many=True
+                serializers.optimize_queryset(files_queryset, serializers.ListFileSerializer), many=True
             )
+            records_queryset = models.Record.objects.filter(playbook=playbook.data["id"])
             records = serializers.ListRecordSerializer(
-                models.Record.objects.filter(playbook=playbook.data["id"]).all(), many=True
+                serializers.optimize_queryset(records_queryset, serializers.ListRecordSerializer), many=True
             )
-            results = serializers.ListResultSerializer(
-                models.Result.objects.filter(playbook=playbook.data["id"]).all(), many=True
+            # Tasks and hosts are embedded in the results rather than retrieved for each result
+            expand = {"task": serializers.SimpleTaskSerializer, "host": serializers.SimpleHostSerializer}
+            results_queryset = models.Result.objects.filter(playbook=playbook.data["id"])
+            results = serializers.select_fields(
+                serializers.ListResultSerializer(
+                    serializers.optimize_queryset(results_queryset, serializers.ListResultSerializer, expand=expand),
+                    many=True,
+                ),
+                expand=expand,
             )
 
-            # Backfill task and host data into results
-            for result in results.data:
-                task_id = result["task"]
-                result["task"] = serializers.SimpleTaskSerializer(models.Task.objects.get(pk=task_id)).data
-                host_id = result["host"]
-                result["host"] = serializers.SimpleHostSerializer(models.Host.objects.get(pk=host_id)).data
-
             # Results are paginated in the dynamic version and the template expects data in a specific format
             formatted_results = {"count": len(results.data), "results": results.data}
 
@@ -113,16 +115,16 @@ class Command(BaseCommand):
             destination = os.path.join(path, "hosts/%s.html" % host.id)
             serializer = serializers.DetailedHostSerializer(host)
 
-            # fmt: off
-            host_results = serializers.ListResultSerializer(
-                models.Result.objects.filter(host=host.id).all(), many=True
+            # Tasks are embedded in the results rather than retrieved for each result
+            expand = {"task": serializers.SimpleTaskSerializer}
+            results_queryset = models.Result.objects.filter(host=host.id)
+            host_results = serializers.select_fields(
+                serializers.ListResultSerializer(
+                    serializers.optimize_queryset(results_queryset, serializers.ListResultSerializer, expand=expand),
+                    many=True,
+                ),
+                expand=expand,
             )
-            # fmt: on
-
-            # Backfill task data into results
-            for result in host_results.data:
-                task_id = result["task"]
-                result["task"] = serializers.SimpleTaskSerializer(models.Task.objects.get(pk=task_id)).data
 
             # Results are paginated in the dynamic version and the template expects data in a specific format
             formatted_results = {"count": len(host_results.data), "results": host_results.data}
@@ -2,10 +2,11 @@
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 
 import difflib
-import json
 
 from django import template
 
+from ara.utils import json
+
 register = template.Library()
 
 
@@ -17,8 +18,8 @@ def render_diff(before="", after="", before_header="before", after_header="after
     # Some modules, such as file, might provide a diff in a dict format
     if isinstance(before, dict) and isinstance(after, dict):
         return difflib.unified_diff(
-            json.dumps(before, indent=4).splitlines(),
-            json.dumps(after, indent=4).splitlines(),
+            json.dumps(before, indent=True).decode("utf8").splitlines(),
+            json.dumps(after, indent=True).decode("utf8").splitlines(),
             fromfile=before_header,
             tofile=after_header
         )
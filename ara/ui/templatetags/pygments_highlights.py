@@ -15,14 +15,14 @@
 #  You should have received a copy of the GNU General Public License
 #  along with ARA.  If not, see <http://www.gnu.org/licenses/>.
 
-import json
-
 from django import template
 from pygments import highlight
 from pygments.formatters import HtmlFormatter
 from pygments.lexers import JsonLexer, YamlLexer
 from pygments.lexers.special import TextLexer
 
+from ara.utils import json
+
 register = template.Library()
 
 
@@ -49,12 +49,12 @@ def format_data(data):
         return highlight(str(data), TextLexer(), formatter)
     elif isinstance(data, str):
         try:
-            data = json.dumps(json.loads(data), indent=4, sort_keys=True)
+            data = json.dumps(json.loads(data), indent=True, sort_keys=True).decode("utf8")
             lexer = JsonLexer()
         except (ValueError, TypeError):
             lexer = TextLexer()
     elif isinstance(data, dict) or isinstance(data, list):
-        data = json.dumps(data, indent=4, sort_keys=True)
+        data = json.dumps(data, indent=True, sort_keys=True).decode("utf8")
         lexer = JsonLexer()
     else:
         lexer = TextLexer()
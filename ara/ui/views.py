@@ -14,7 +14,7 @@ class Index(generics.ListAPIView):
     Returns a list of playbook summaries
     """
 
-    queryset = models.Playbook.objects.all()
+    queryset = models.Playbook.objects.with_item_counts().prefetch_related("labels")
     filterset_class = filters.PlaybookFilter
     renderer_classes = [TemplateHTMLRenderer]
     pagination_class = LimitOffsetPaginationWithLinks
@@ -68,11 +68,13 @@ class Playbook(generics.RetrieveAPIView):
         hosts = serializers.ListHostSerializer(
             models.Host.objects.filter(playbook=playbook.data["id"]).order_by("name").all(), many=True
         )
+        files_queryset = models.File.objects.filter(playbook=playbook.data["id"])
         files = serializers.ListFileSerializer(
-            models.File.objects.filter(playbook=playbook.data["id"]).all(), many=True
+            serializers.optimize_queryset(files_queryset, serializers.ListFileSerializer), many=True
         )
+        records_queryset = models.Record.objects.filter(playbook=playbook.data["id"])
         records = serializers.ListRecordSerializer(
-            models.Record.objects.filter(playbook=playbook.data["id"]).all(), many=True
+            serializers.optimize_queryset(records_queryset, serializers.ListRecordSerializer), many=True
         )
 
         order = "-started"
@@ -81,17 +83,16 @@ class Playbook(generics.RetrieveAPIView):
         result_queryset = models.Result.objects.filter(playbook=playbook.data["id"]).order_by(order).all()
         result_filter = filters.ResultFilter(request.GET, queryset=result_queryset)
 
-        page = self.paginate_queryset(result_filter.qs)
+        # Tasks and hosts are embedded in the results rather than retrieved for each result
+        expand = {"task": serializers.SimpleTaskSerializer, "host": serializers.SimpleHostSerializer}
+        results = serializers.optimize_queryset(result_filter.qs, serializers.ListResultSerializer, expand=expand)
+
+        page = self.paginate_queryset(results)
         if page is not None:
             serializer = serializers.ListResultSerializer(page, many=True)
         else:
-            serializer = serializers.ListResultSerializer(result_filter, many=True)
-
-        for result in serializer.data:
-            task_id = result["task"]
-            result["task"] = serializers.SimpleTaskSerializer(models.Task.objects.get(pk=task_id)).data
-            host_id = result["host"]
-            result["host"] = serializers.SimpleHostSerializer(models.Host.objects.get(pk=host_id)).data
+            serializer = serializers.ListResultSerializer(results, many=True)
+        serializers.select_fields(serializer, expand=expand)
         paginated_results = self.get_paginated_response(serializer.data)
 
         if self.paginator.count > (self.paginator.offset + self.paginator.limit):
@@ -141,15 +142,16 @@ class Host(generics.RetrieveAPIView):
         result_queryset = models.Result.objects.filter(host=host_serializer.data["id"]).order_by(order).all()
         result_filter = filters.ResultFilter(request.GET, queryset=result_queryset)
 
-        page = self.paginate_queryset(result_filter.qs)
+        # Tasks are embedded in the results rather than retrieved for each result
+        expand = {"task": serializers.SimpleTaskSerializer}
+        results = serializers.optimize_queryset(result_filter.qs, serializers.ListResultSerializer, expand=expand)
+
+        page = self.paginate_queryset(results)
         if page is not None:
             result_serializer = serializers.ListResultSerializer(page, many=True)
         else:
-            result_serializer = serializers.ListResultSerializer(result_filter, many=True)
-
-        for result in result_serializer.data:
-            task_id = result["task"]
-            result["task"] = serializers.SimpleTaskSerializer(models.Task.objects.get(pk=task_id)).data
+            result_serializer = serializers.ListResultSerializer(results, many=True)
+        serializers.select_fields(result_serializer, expand=expand)
         paginated_results = self.get_paginated_response(result_serializer.data)
 
         if self.paginator.count > (self.paginator.offset + self.paginator.limit):
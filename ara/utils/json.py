@@ -0,0 +1,145 @@
+# Copyright (c) 2020 The ARA Records Ansible authors
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# JSON is encoded and decoded with orjson when it is installed (pip install ara[orjson]) and with the
+# json module of the standard library otherwise.
+# The output of both backends is made the same for the data handled by ara so that, for example, the sha1 of
+# the contents of results and host facts doesn't depend on which one the client or server uses:
+# - NaN and infinite floats, which aren't valid JSON, are encoded as null
+# - the floats that orjson doesn't format like the standard library (i.e, 1e16 instead of 1e+16 and
+#   0.00001 instead of 1e-05) are encoded by the standard library
+# - integers that don't fit in 64 bits are encoded and decoded by the standard library, orjson refuses
+#   to encode them and decodes them as floats
+
+import datetime
+import json
+import math
+import re
+from collections.abc import Mapping
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "json" if orjson is None else "orjson"
+
+
+def _numbers():
+    # Returns the table that keeps what numbers are made of: 0, the other digits as 1, the exponent,
+    # the decimal point and what ends a number, as a comma
+    table = bytearray(b"x" * 256)
+    for characters, translated in [(b"0e.", None), (b"123456789-", b"1"), (b",]}\n", b",")]:
+        for character in characters:
+            table[character] = character if translated is None else translated[0]
+    return bytes(table)
+
+
+# The numbers that orjson formats or decodes differently than the standard library are looked for in two steps:
+# the document is translated so that candidates can be found quickly, i.e. 1e16 becomes 1e11, and only then (for
+# large floats or strings that look like them) with a regular expression over the whole document.
+NUMBERS = _numbers()
+ORJSON_EXPONENT = re.compile(rb"1e1[01]*,")
+ORJSON_FLOAT = re.compile(rb"(?:^|[:,\[\s])-?(?:\d+(?:\.\d+)?e-?\d+|0\.0000\d+)(?=[,\]}\s]|$)")
+INTEGER_DIGITS = bytes.maketrans(b"123456789", b"000000000")
+STR_INTEGER_DIGITS = str.maketrans("123456789", "000000000")
+WIDE_INTEGER = b"0" * 19
+
+
+def _default(value):
+    # Converts the types that neither backend supports, such as the unsafe bytes and hostvars of Ansible
+    if isinstance(value, bytes):
+        return value.decode("utf8", errors="replace")
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError("Object of type %s is not JSON serializable" % type(value).__name__)
+
+
+def _finite(value):
+    # Replaces NaN and infinite floats by None like orjson does
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+def _orjson_float(encoded):
+    # Returns whether orjson encoded floats differently than the standard library would have,
+    # i.e. 1e16 (1e+16), 1.5e-7 (1.5e-07) or 0.00001 (1e-05)
+    numbers = encoded.translate(NUMBERS) + b","
+    if ORJSON_EXPONENT.search(numbers) is not None or b"0.00001" in numbers:
+        return ORJSON_FLOAT.search(encoded) is not None
+    return False
+
+
+def _wide_integer(data):
+    # Returns whether data may have integers that don't fit in 64 bits, including strings that look like them
+    if isinstance(data, str):
+        return WIDE_INTEGER.decode("ascii") in data.translate(STR_INTEGER_DIGITS)
+    return WIDE_INTEGER in bytes(data).translate(INTEGER_DIGITS)
+
+
+def dumps(obj, default=None, indent=False, sort_keys=False):
+    """
+    Returns obj encoded as UTF-8 JSON bytes.
+    default is called for the objects that can't be encoded before falling back to the conversions of ara.
+    indent pretty-prints the JSON with an indentation of two spaces.
+    """
+    if default is None:
+        encode_default = _default
+    else:
+
+        def encode_default(value):
+            try:
+                return default(value)
+            except TypeError:
+                return _default(value)
+
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            encoded = orjson.dumps(obj, default=encode_default, option=option)
+        except orjson.JSONEncodeError:
+            # i.e. integers that don't fit in 64 bits, let the standard library have a try
+            encoded = None
+        if encoded is not None and not _orjson_float(encoded):
+            return encoded
+
+    options = dict(
+        ensure_ascii=False,
+        indent=2 if indent else None,
+        separators=(",", ": ") if indent else (",", ":"),
+        sort_keys=sort_keys,
+    )
+    try:
+        encoded = json.dumps(obj, default=encode_default, allow_nan=False, **options)
+    except ValueError:
+        # NaN and infinite floats are encoded as null, including the ones returned by default
+        encoded = json.dumps(_finite(obj), default=lambda value: _finite(encode_default(value)), **options)
+    return encoded.encode("utf8")
+
+
+def loads(data):
+    """
+    Returns the object decoded from JSON bytes or text, raises ValueError if it isn't valid JSON.
+    """
+    if orjson is not None:
+        if not _wide_integer(data):
+            try:
+                # orjson only takes exact bytes, subclasses such as RawJSON are read through a memoryview instead
+                return orjson.loads(memoryview(data) if type(data) not in (bytes, str) else data)
+            except orjson.JSONDecodeError:
+                # i.e. NaN, which the standard library decodes, or invalid JSON, which it refuses as well
+                pass
+    return json.loads(data)
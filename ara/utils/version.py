@@ -0,0 +1,25 @@
+# Copyright (c) 2020 The ARA Records Ansible authors
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import functools
+
+
+@functools.lru_cache(maxsize=None)
+def get_version():
+    """
+    Returns the version of ara. It is looked up once from the metadata of the installed package,
+    pbr is only imported when the metadata isn't available (i.e, python < 3.8 or running from source).
+    """
+    try:
+        from importlib.metadata import PackageNotFoundError, version
+    except ImportError:
+        pass
+    else:
+        try:
+            return version("ara")
+        except PackageNotFoundError:
+            pass
+
+    import pbr.version
+
+    return pbr.version.VersionInfo("ara").release_string()
@@ -0,0 +1,66 @@
+# Copyright (c) 2020 The ARA Records Ansible authors
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Measures how long the ara_default callback adds to running an empty playbook, from loading the plugin to
+# recording the playbook, by timing ansible-playbook with and without the callback enabled.
+# The callback is configured from the environment as usual, i.e. ARA_API_CLIENT=direct.
+# A database is created in a temporary ARA_BASE_DIR unless one is set.
+# Usage: python tests/benchmarks/callback_startup.py [--iterations 10]
+
+import argparse
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+
+import ara.setup
+
+EMPTY_PLAYBOOK = """
+- name: Empty playbook
+  hosts: localhost
+  gather_facts: false
+  tasks: []
+"""
+
+
+def run(playbook, env):
+    started = time.perf_counter()
+    subprocess.run(["ansible-playbook", "-i", "localhost,", playbook], env=env, stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        playbook = os.path.join(tmpdir, "empty.yaml")
+        with open(playbook, "w") as fd:
+            fd.write(EMPTY_PLAYBOOK)
+
+        without_ara = dict(os.environ, ANSIBLE_LOCALHOST_WARNING="false")
+        with_ara = dict(
+            without_ara,
+            ANSIBLE_CALLBACK_PLUGINS=ara.setup.callback_plugins,
+            ANSIBLE_CALLBACKS_ENABLED="ara_default",
+            ARA_BASE_DIR=os.environ.get("ARA_BASE_DIR", os.path.join(tmpdir, "ara")),
+        )
+        # The first run creates the database, it isn't measured
+        run(playbook, with_ara)
+
+        timings = {"without ara": [], "with ara": []}
+        for _ in range(args.iterations):
+            # Alternate between the two so that they are equally affected by whatever else runs on the machine
+            timings["without ara"].append(run(playbook, without_ara))
+            timings["with ara"].append(run(playbook, with_ara))
+
+    for name, values in timings.items():
+        print("%s: %.3fs median, %.3fs min" % (name, statistics.median(values), min(values)))
+    added = statistics.median(timings["with ara"]) - statistics.median(timings["without ara"])
+    print("added by the callback: %.3fs (median)" % added)
+
+
+if __name__ == "__main__":
+    main()
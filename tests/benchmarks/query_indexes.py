@@ -0,0 +1,194 @@
+# Copyright (c) 2020 The ARA Records Ansible authors
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Compares the query plans and latency of the queries the API runs for common filters and orderings
+# (ara expire, ara playbook prune, the playbook and host pages, ...) without and with the indexes added
+# by the 0015_composite_indexes migration, on a database seeded with many playbooks and results.
+# The database is a sqlite database created in a temporary ARA_BASE_DIR unless ARA_BASE_DIR is set
+# in which case the database it is configured with is seeded and its indexes are left in place.
+# Usage: python tests/benchmarks/query_indexes.py [--playbooks 200] [--tasks 50] [--hosts 20] [--iterations 20]
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+
+BEFORE = "0014_host_facts_required"
+AFTER = "0015_composite_indexes"
+
+
+def seed(args):
+    from django.db import transaction
+    from django.utils import timezone
+
+    from ara.api import models
+
+    random.seed(0)
+    content = models.Content.objects.create(sha1="0" * 40, contents=b"")
+    file_content = models.FileContent.objects.create(sha1="0" * 40, contents=b"")
+    now = timezone.now()
+    statuses = [models.Result.OK] * 8 + [models.Result.FAILED, models.Result.SKIPPED]
+
+    for index in range(args.playbooks):
+        started = now - timedelta(hours=args.playbooks - index)
+        # A playbook out of ten is left running as if it had been interrupted
+        status = "running" if index % 10 == 0 else "completed"
+        with transaction.atomic():
+            playbook = models.Playbook.objects.create(
+                ansible_version="2.9.7", status=status, arguments=b"", path="/playbook.yml", started=started
+            )
+            play = models.Play.objects.create(uuid="%032x" % index, status=status, playbook=playbook, started=started)
+            file = models.File.objects.create(path="/playbook.yml", content=file_content, playbook=playbook)
+            hosts = models.Host.objects.bulk_create(
+                [models.Host(name="host%s" % i, facts=content, playbook=playbook) for i in range(args.hosts)]
+            )
+            tasks = models.Task.objects.bulk_create(
+                [
+                    models.Task(
+                        name="task %s" % i,
+                        action="command",
+                        lineno=i,
+                        tags=b"",
+                        handler=False,
+                        status=status,
+                        play=play,
+                        file=file,
+                        playbook=playbook,
+                        started=started + timedelta(seconds=i),
+                    )
+                    for i in range(args.tasks)
+                ]
+            )
+            # bulk_create doesn't set the ids of the objects on every database backend
+            if hosts[0].id is None:
+                hosts = list(playbook.hosts.all())
+                tasks = list(playbook.tasks.all())
+            models.Result.objects.bulk_create(
+                [
+                    models.Result(
+                        status=random.choice(statuses),
+                        changed=False,
+                        ignore_errors=False,
+                        content=content,
+                        host=host,
+                        task=task,
+                        play=play,
+                        playbook=playbook,
+                        started=task.started,
+                    )
+                    for task in tasks
+                    for host in hosts
+                ]
+            )
+
+
+def query_shapes():
+    """
+    Returns the querysets as built by the API viewsets and filters for each kind of query.
+    """
+    from django.utils import timezone
+
+    from ara.api import filters, models
+
+    playbook = models.Playbook.objects.order_by("-id")[10]
+    host = playbook.hosts.first()
+    task = playbook.tasks.first()
+    cutoff = (timezone.now() - timedelta(hours=24)).isoformat()
+
+    def results(**query):
+        queryset = models.Result.objects.order_by("-id")
+        if "status" in query:
+            queryset = queryset.filter(status__in=[query["status"]])
+        return filters.ResultFilter(query, queryset=queryset).qs
+
+    def expire(model, filterset):
+        queryset = model.objects.filter(status__in=["running"]).order_by("-id")
+        return filterset(dict(status="running", updated_before=cutoff, order="-started"), queryset=queryset).qs
+
+    return [
+        ("ara expire (playbooks)", expire(models.Playbook, filters.PlaybookFilter)),
+        ("ara expire (plays)", expire(models.Play, filters.PlayFilter)),
+        ("ara expire (tasks)", expire(models.Task, filters.TaskFilter)),
+        (
+            "ara playbook prune",
+            filters.PlaybookFilter(
+                dict(started_before=cutoff, order="-started"), queryset=models.Playbook.objects.order_by("-id")
+            ).qs,
+        ),
+        ("results of a playbook by status", results(playbook=playbook.id, status="failed")),
+        ("results of a playbook by date", results(playbook=playbook.id, order="-started")),
+        ("results of a host by date", results(host=host.id, order="-started")),
+        ("results of a task by status", results(task=task.id, status="failed")),
+        (
+            "tasks of a playbook by status",
+            filters.TaskFilter(
+                dict(playbook=playbook.id, status="completed"),
+                queryset=models.Task.objects.filter(status__in=["completed"]).order_by("-id"),
+            ).qs,
+        ),
+    ]
+
+
+def measure(iterations, limit):
+    measurements = {}
+    for name, queryset in query_shapes():
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            list(queryset[:limit])
+            timings.append(time.perf_counter() - started)
+        measurements[name] = (statistics.median(timings), queryset[:limit].explain())
+    return measurements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--playbooks", type=int, default=200)
+    parser.add_argument("--tasks", type=int, default=50, help="Number of tasks per playbook")
+    parser.add_argument("--hosts", type=int, default=20, help="Number of hosts per playbook")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=100, help="Number of objects per page")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory()
+    os.environ.setdefault("ARA_BASE_DIR", tmpdir.name)
+
+    from django.core.management import call_command
+    from django.db import connection
+
+    from ara.clients.direct import setup_django
+
+    setup_django(run_sql_migrations=False)
+    call_command("migrate", "api", BEFORE, verbosity=0)
+
+    from ara.api import models
+
+    if not models.Result.objects.exists():
+        started = time.perf_counter()
+        seed(args)
+        print(
+            "Seeded %s playbooks and %s results in %.1fs"
+            % (args.playbooks, models.Result.objects.count(), time.perf_counter() - started)
+        )
+    if connection.vendor == "sqlite":
+        connection.cursor().execute("ANALYZE")
+
+    before = measure(args.iterations, args.limit)
+    call_command("migrate", "api", AFTER, verbosity=0)
+    if connection.vendor == "sqlite":
+        connection.cursor().execute("ANALYZE")
+    after = measure(args.iterations, args.limit)
+
+    for name in before:
+        print("\n%s: %.2f ms before, %.2f ms after" % (name, before[name][0] * 1000, after[name][0] * 1000))
+        print("  before: %s" % before[name][1].replace("\n", "\n          "))
+        print("  after:  %s" % after[name][1].replace("\n", "\n          "))
+
+    tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
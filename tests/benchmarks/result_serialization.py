@@ -0,0 +1,95 @@
+# Copyright (c) 2020 The ARA Records Ansible authors
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Compares the CPU time and memory allocations needed by the ara_default callback to turn a large
+# result into the body of the request sent to the API, before and after the serialization was done
+# in a single pass.
+# Usage: python tests/benchmarks/result_serialization.py [--iterations 20] [--items 2000]
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from ansible.parsing.ajson import AnsibleJSONEncoder
+from ansible.utils.unsafe_proxy import wrap_var
+from ansible.vars.clean import module_response_deepcopy, strip_internal_keys
+
+from ara.clients.utils import RawJSON, encode_json
+from ara.plugins.callback.ara_default import IGNORED_FACT, sanitize_result
+from ara.utils import json as json_utils
+
+IGNORED_FACTS = ["ansible_env"]
+
+
+def large_result(items):
+    # Looks like the result of a loop that gathered facts, with internal keys and unsafe strings
+    facts = {
+        "ansible_env": {"VARIABLE_%s" % i: "value" * 10 for i in range(100)},
+        "ansible_mounts": [
+            {"device": "/dev/sda%s" % i, "mount": wrap_var("/mnt/%s" % i), "size_total": i * 4096} for i in range(50)
+        ],
+    }
+    return {
+        "_ansible_no_log": False,
+        "changed": True,
+        "ansible_facts": facts,
+        "results": [
+            {
+                "_ansible_item_label": i,
+                "item": i,
+                "stdout": wrap_var("line %s\n" % i * 20),
+                "stdout_lines": [wrap_var("line %s" % i)] * 20,
+                "rc": 0,
+            }
+            for i in range(items)
+        ],
+    }
+
+
+def before(result):
+    results = strip_internal_keys(module_response_deepcopy(result))
+    for fact in IGNORED_FACTS:
+        if fact in results["ansible_facts"]:
+            results["ansible_facts"][fact] = IGNORED_FACT
+    jsonified = json.dumps(results, cls=AnsibleJSONEncoder, ensure_ascii=False, sort_keys=True)
+    content = json.loads(jsonified)
+    # What the HTTP client did with the payload
+    return json.dumps(dict(status="ok", content=content)).encode("utf8")
+
+
+def after(result):
+    content = sanitize_result(result, IGNORED_FACTS)
+    content = RawJSON(json_utils.dumps(content))
+    return encode_json(dict(status="ok", content=content))
+
+
+def measure(func, result, iterations):
+    started = time.process_time()
+    for _ in range(iterations):
+        func(result)
+    cpu = (time.process_time() - started) / iterations
+
+    tracemalloc.start()
+    func(result)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--items", type=int, default=2000, help="Number of loop items in the result")
+    args = parser.parse_args()
+
+    result = large_result(args.items)
+    assert json.loads(before(result)) == json.loads(after(result))
+    print("Result of %.2f MiB" % (len(after(result)) / 1024 / 1024))
+    for name, func in [("before", before), ("after", after)]:
+        cpu, peak = measure(func, result, args.iterations)
+        print("%-6s: %8.2f ms CPU per result, %8.2f MiB allocated at peak" % (name, cpu * 1000, peak / 1024 / 1024))
+
+
+if __name__ == "__main__":
+    main()